@@ -0,0 +1,82 @@
+"""
+Login-storm benchmark.
+
+Fires a burst of concurrent password verifications while a probe coroutine
+stands in for other routes (e.g. /dashboard/quote), sleeping 10 ms at a time
+and recording how late the event loop wakes it up. Compares bcrypt run inline
+on the event loop with the offloaded services.auth path.
+
+Run from the app directory:
+    python -m benchmarks.login_throughput --logins 50
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+from services.auth import pwd_context, verify_and_update_password, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+PROBE_INTERVAL = 0.01
+
+
+async def _probe(stop: asyncio.Event, lags: List[float]):
+    while not stop.is_set():
+        expected = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _inline_login(password: str, hashed: str):
+    # What the routers used to do: bcrypt directly inside an async handler
+    return pwd_context.verify(password, hashed)
+
+
+async def _offloaded_login(password: str, hashed: str):
+    valid, _ = await verify_and_update_password(password, hashed)
+    return valid
+
+
+async def run_storm(login, logins: int, password: str, hashed: str) -> Dict[str, float]:
+    stop = asyncio.Event()
+    lags: List[float] = []
+    probe = asyncio.create_task(_probe(stop, lags))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started_at
+
+    stop.set()
+    await probe
+    assert all(results), "password verification failed"
+
+    ordered = sorted(lags) or [0.0]
+    return {
+        "logins_per_second": logins / elapsed,
+        "elapsed_seconds": elapsed,
+        "probe_samples": len(lags),
+        "probe_lag_p50_ms": ordered[len(ordered) // 2] * 1000,
+        "probe_lag_p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "probe_lag_max_ms": ordered[-1] * 1000,
+    }
+
+
+async def main(logins: int):
+    password = "correct horse battery staple"
+    hashed = pwd_context.hash(password)
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, hash workers={PASSWORD_HASH_WORKERS}, concurrent logins={logins}")
+
+    for name, login in (("inline", _inline_login), ("offloaded", _offloaded_login)):
+        result = await run_storm(login, logins, password, hashed)
+        print(
+            f"{name:>10}: {result['logins_per_second']:.1f} logins/s "
+            f"in {result['elapsed_seconds']:.2f}s | other-route lag "
+            f"p50={result['probe_lag_p50_ms']:.1f}ms p99={result['probe_lag_p99_ms']:.1f}ms "
+            f"max={result['probe_lag_max_ms']:.1f}ms ({result['probe_samples']} samples)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=50, help="Number of concurrent logins in the storm")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
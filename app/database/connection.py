@@ -33,31 +33,61 @@ CHAT_MESSAGES_COLLECTION = "chat_messages"
 HEALTH_DATA_COLLECTION = "health_data"
 HEALTH_ANALYSIS_COLLECTION = "health_analysis"
 HEALTH_QUOTES_COLLECTION = "health_quotes"
+NOTIFICATION_OUTBOX_COLLECTION = "notification_outbox"
+HEALTH_ROLLUPS_COLLECTION = "health_rollups"
+EMERGENCY_GUIDANCE_COLLECTION = "emergency_guidance"
+RATE_LIMITS_COLLECTION = "rate_limits"
+AI_USAGE_COLLECTION = "ai_usage"
+ANOMALY_WATERMARKS_COLLECTION = "anomaly_watermarks"
 
 
 def get_users_collection():
     """Get users collection"""
-    return db.database[USERS_COLLECTION] if db.database else None
+    return db.database[USERS_COLLECTION] if db.database is not None else None
 
 def get_chat_sessions_collection():
     """Get chat sessions collection"""
-    return db.database[CHAT_SESSIONS_COLLECTION] if db.database else None
+    return db.database[CHAT_SESSIONS_COLLECTION] if db.database is not None else None
 
 def get_chat_messages_collection():
     """Get chat messages collection"""
-    return db.database[CHAT_MESSAGES_COLLECTION] if db.database else None
+    return db.database[CHAT_MESSAGES_COLLECTION] if db.database is not None else None
 
 def get_health_data_collection():
     """Get health data collection"""
-    return db.database[HEALTH_DATA_COLLECTION] if db.database else None
+    return db.database[HEALTH_DATA_COLLECTION] if db.database is not None else None
 
 def get_health_analysis_collection():
     """Get health analysis collection"""
-    return db.database[HEALTH_ANALYSIS_COLLECTION] if db.database else None
+    return db.database[HEALTH_ANALYSIS_COLLECTION] if db.database is not None else None
 
 def get_health_quotes_collection():
     """Get health quotes collection"""
-    return db.database[HEALTH_QUOTES_COLLECTION] if db.database else None
+    return db.database[HEALTH_QUOTES_COLLECTION] if db.database is not None else None
+
+def get_notification_outbox_collection():
+    """Get n8n notification outbox collection"""
+    return db.database[NOTIFICATION_OUTBOX_COLLECTION] if db.database is not None else None
+
+def get_health_rollups_collection():
+    """Get health rollups collection"""
+    return db.database[HEALTH_ROLLUPS_COLLECTION] if db.database is not None else None
+
+def get_emergency_guidance_collection():
+    """Get pre-generated emergency guidance collection"""
+    return db.database[EMERGENCY_GUIDANCE_COLLECTION] if db.database is not None else None
+
+def get_rate_limits_collection():
+    """Get shared rate limit buckets collection"""
+    return db.database[RATE_LIMITS_COLLECTION] if db.database is not None else None
+
+def get_ai_usage_collection():
+    """Get per-user daily AI token usage collection"""
+    return db.database[AI_USAGE_COLLECTION] if db.database is not None else None
+
+def get_anomaly_watermarks_collection():
+    """Get per-user, per-vital last alerted reading dates"""
+    return db.database[ANOMALY_WATERMARKS_COLLECTION] if db.database is not None else None
 
 
 async def create_indexes():
@@ -65,48 +95,68 @@ async def create_indexes():
     try:
 
         users_collection = get_users_collection()
-        if users_collection:
+        if users_collection is not None:
             await users_collection.create_index("email", unique=True)
             await users_collection.create_index("username", unique=True)
             await users_collection.create_index("created_at")
         
 
         chat_sessions_collection = get_chat_sessions_collection()
-        if chat_sessions_collection:
+        if chat_sessions_collection is not None:
             await chat_sessions_collection.create_index("user_id")
             await chat_sessions_collection.create_index("created_at")
             await chat_sessions_collection.create_index("last_activity")
-            await chat_sessions_collection.create_index([("user_id", 1), ("last_activity", -1)])
+            await chat_sessions_collection.create_index([("user_id", 1), ("last_activity", -1), ("_id", -1)])
         
 
         chat_messages_collection = get_chat_messages_collection()
-        if chat_messages_collection:
+        if chat_messages_collection is not None:
             await chat_messages_collection.create_index("user_id")
             await chat_messages_collection.create_index("session_id")
             await chat_messages_collection.create_index("timestamp")
-            await chat_messages_collection.create_index([("session_id", 1), ("timestamp", -1)])
+            await chat_messages_collection.create_index([("session_id", 1), ("timestamp", -1), ("_id", -1)])
         
 
         health_data_collection = get_health_data_collection()
-        if health_data_collection:
+        if health_data_collection is not None:
             await health_data_collection.create_index("user_id")
             await health_data_collection.create_index("date_recorded")
             await health_data_collection.create_index([("user_id", 1), ("date_recorded", -1)])
         
 
         health_analysis_collection = get_health_analysis_collection()
-        if health_analysis_collection:
+        if health_analysis_collection is not None:
             await health_analysis_collection.create_index("user_id")
             await health_analysis_collection.create_index("analysis_type")
             await health_analysis_collection.create_index("created_at")
             await health_analysis_collection.create_index([("user_id", 1), ("analysis_type", 1)])
         
         health_quotes_collection = get_health_quotes_collection()
-        if health_quotes_collection:
+        if health_quotes_collection is not None:
             await health_quotes_collection.create_index("category")
             await health_quotes_collection.create_index("is_active")
             await health_quotes_collection.create_index([("category", 1), ("is_active", 1)])
         
+        health_rollups_collection = get_health_rollups_collection()
+        if health_rollups_collection is not None:
+            await health_rollups_collection.create_index([("user_id", 1), ("granularity", 1), ("period_start", 1)])
+        
+        notification_outbox_collection = get_notification_outbox_collection()
+        if notification_outbox_collection is not None:
+            await notification_outbox_collection.create_index([("status", 1), ("next_attempt_at", 1)])
+            # Delivered events are only kept for a week
+            await notification_outbox_collection.create_index("delivered_at", expireAfterSeconds=7 * 24 * 3600)
+        
+        rate_limits_collection = get_rate_limits_collection()
+        if rate_limits_collection is not None:
+            # Idle buckets are full again long before this; drop them
+            await rate_limits_collection.create_index("updated_at", expireAfterSeconds=24 * 3600)
+        
+        ai_usage_collection = get_ai_usage_collection()
+        if ai_usage_collection is not None:
+            await ai_usage_collection.create_index([("user_id", 1), ("day", -1)])
+            await ai_usage_collection.create_index([("day", -1), ("method", 1)])
+        
         print("✅ Database indexes created successfully")
     except Exception as e:
         print(f"❌ Failed to create indexes: {e}")
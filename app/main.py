@@ -1,12 +1,45 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routers import user, auth, dashboard, chat
+from routers import user, auth, dashboard, chat, health_data
+from database.connection import connect_to_mongo, close_mongo_connection, create_indexes
+from services.metrics import metrics
+from services.model_router import model_router
+from services.notifications import dispatcher
+from services.token_usage import usage_recorder
+from services.ai_service import AIUnavailableError
+from services.emergency_guidance import emergency_guidance_store
 import uvicorn
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    try:
+        await create_indexes()
+    except Exception:
+        print("⚠️ Continuing without MongoDB indexes")
+    dispatcher.start()
+    usage_recorder.start()
+    # HealthAIService is created lazily by services.ai_service.get_ai_service
+    app.state.ai_service = None
+    await emergency_guidance_store.start()
+    yield
+    await emergency_guidance_store.stop()
+    app.state.ai_service = None
+    # Flush queued n8n events and token usage, and release model worker threads
+    await dispatcher.stop()
+    await usage_recorder.stop()
+    model_router.shutdown()
+    await close_mongo_connection()
+
+
 app = FastAPI(
     title="HeaLLMe.ai API",
     description="24×7 Medical Guidance powered by AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Allow all origins for development
@@ -18,16 +51,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shed or failed-fast AI requests: 503 with the canned answer so clients still have something to show
+@app.exception_handler(AIUnavailableError)
+async def ai_unavailable_handler(request: Request, exc: AIUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={**exc.fallback, "detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Root route
 @app.get("/")
 def read_root():
     return {"message": "🚀 HeaLLMe.ai API is running!"}
 
+# In-process metrics (model queue waits, call latency, ...)
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
+
 # Register routers
-app.include_router(user.router, prefix="/users", tags=["Users"])
-app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
-app.include_router(chat.router, prefix="/chat", tags=["AI Chat"])
+# Routers declare their own prefixes
+app.include_router(user.router)
+app.include_router(auth.router)
+app.include_router(dashboard.router)
+app.include_router(chat.router)
+app.include_router(health_data.router)
 
 # Optional: For direct run
 if __name__ == "__main__":
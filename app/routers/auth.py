@@ -2,8 +2,8 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from auth import verify_password, create_access_token
-from db.fake_user_db import get_user_by_email  # function in fake_user_db 
+from services.auth import verify_and_update_password, create_access_token
+from services import user_repository
 from datetime import timedelta
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -13,17 +13,23 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Login a user and return an access token.
     """
-    user = get_user_by_email(form_data.username)  # OAuth2 uses username field for email
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    user = await user_repository.get_login_user(form_data.username)  # OAuth2 uses username field for email
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(form_data.password, user["hashed_password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await user_repository.update_password_hash(user["id"], new_hash)
 
     access_token_expires = timedelta(minutes=30)
+    # Same immutable subject as /users/login; emails and usernames can change or collide
     access_token = create_access_token(
-        data={"sub": user["username"]}, expires_delta=access_token_expires
+        data={"sub": user["id"]}, expires_delta=access_token_expires
     )
 
     return {
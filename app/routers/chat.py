@@ -1,45 +1,179 @@
 # routers/chat.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from typing import List, Dict
-from services.ai_service import HealthAIService
-from auth import verify_token
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Optional
+import json
+from services.ai_service import HealthAIService, AIUnavailableError, CHAT_FALLBACK_MESSAGE, get_ai_service
+from services.auth import verify_token
+from services import chat_sessions, chat_context, user_repository
+from services.profile_cache import get_cached_profile
+from services.rate_limit import rate_limit
+from schema.chat import ChatSessionCreate, ChatSessionResponse, ChatSessionPage, ChatMessagePage
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-ai_service = HealthAIService()
+MESSAGE_TYPE_PATTERN = "^(health_guidance|symptom_check|health_advice)$"
 
 
 async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
-    return verify_token(token)
+    profile = await get_cached_profile(verify_token(token), user_repository.get_user_by_subject)
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile.user.id
 
-@router.post("/ask")
+
+def _is_fallback(reply: str) -> bool:
+    """The AI service answers failed generations with the fallback text; such replies are never stored"""
+    return reply.startswith(CHAT_FALLBACK_MESSAGE)
+
+
+async def _load_context(session_id: Optional[str], user_id: str, chat_history: List[Dict]) -> Dict:
+    """Token-budgeted server-side context for a session, or the client-supplied history for session-less chats"""
+    if not session_id:
+        return {"session": None, "summary": None, "history": chat_history, "overflow": []}
+    session = await chat_sessions.get_session(session_id, user_id)
+    context = await chat_context.build_context(session)
+    context["session"] = session
+    return context
+
+
+@router.post("/sessions", response_model=ChatSessionResponse)
+async def create_chat_session(session: ChatSessionCreate, user_id: str = Depends(get_current_user_id)):
+    """Start a new chat session"""
+    doc = await chat_sessions.create_session(user_id, session.session_name)
+    return ChatSessionResponse(
+        id=doc["_id"],
+        user_id=doc["user_id"],
+        session_name=doc["session_name"],
+        created_at=doc["created_at"],
+        last_activity=doc["last_activity"]
+    )
+
+
+@router.get("/sessions", response_model=ChatSessionPage)
+async def list_chat_sessions(
+    limit: int = Query(chat_sessions.DEFAULT_PAGE_SIZE, ge=1, le=chat_sessions.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """List the user's sessions, most recently active first. Pass next_cursor as cursor for the next page."""
+    return await chat_sessions.list_sessions(user_id, limit, cursor)
+
+
+@router.get("/sessions/{session_id}", response_model=ChatSessionResponse)
+async def get_chat_session(session_id: str, user_id: str = Depends(get_current_user_id)):
+    """Get a session with its latest page of messages (chronological)"""
+    doc = await chat_sessions.get_session(session_id, user_id)
+    page = await chat_sessions.list_messages(session_id)
+    return ChatSessionResponse(
+        id=doc["_id"],
+        user_id=doc["user_id"],
+        session_name=doc["session_name"],
+        created_at=doc["created_at"],
+        last_activity=doc["last_activity"],
+        messages=list(reversed(page["messages"]))
+    )
+
+
+@router.get("/sessions/{session_id}/messages", response_model=ChatMessagePage)
+async def list_chat_messages(
+    session_id: str,
+    limit: int = Query(chat_sessions.DEFAULT_PAGE_SIZE, ge=1, le=chat_sessions.MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Page backwards through a session's messages, newest first. Pass next_cursor as before."""
+    await chat_sessions.get_session(session_id, user_id)
+    return await chat_sessions.list_messages(session_id, limit, before)
+
+
+@router.post("/ask", dependencies=[Depends(rate_limit("chat_with_ai"))])
 async def chat_with_ai(
-    message: str = Body(..., embed=True),
+    message: str = Body(..., embed=True, min_length=1, max_length=5000),
     chat_history: List[Dict] = Body([], embed=True),
-    token: str = Depends(oauth2_scheme)
+    session_id: Optional[str] = Body(None, embed=True),
+    message_type: str = Body("health_guidance", embed=True, pattern=MESSAGE_TYPE_PATTERN),
+    user_id: str = Depends(get_current_user_id),
+    ai_service: HealthAIService = Depends(get_ai_service)
 ):
     """
     Chat with HeaLLMe.ai's AI Assistant.
 
     Request body should include:
     - message: current user message
-    - chat_history: list of previous messages (optional)
+    - session_id: chat session to continue; history is loaded and the exchange stored server-side (optional)
+    - chat_history: list of previous messages, only used without a session_id (optional)
     """
-    user_id = verify_token(token)
     user_data = {"user_id": user_id}  # Can be expanded with more profile info later
+    context = await _load_context(session_id, user_id, chat_history)
 
     try:
-        response = await ai_service.chat_with_ai(message, chat_history, user_data)
-        return {
-            "user_message": message,
-            "ai_response": response
-        }
+        response = await ai_service.chat_with_ai(message, context["history"], user_data, context["summary"])
+    except AIUnavailableError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"AI chat failed: {str(e)}"
         )
+
+    if session_id and not _is_fallback(response):
+        await chat_sessions.add_message(session_id, user_id, message, response, message_type)
+        # Turns that no longer fit the budget are folded into the session summary off the request path
+        chat_context.schedule_fold(ai_service, context["session"], context["overflow"])
+    return {
+        "user_message": message,
+        "ai_response": response,
+        "session_id": session_id
+    }
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/ask/stream", dependencies=[Depends(rate_limit("chat_with_ai"))])
+async def stream_chat_with_ai(
+    message: str = Body(..., embed=True, min_length=1, max_length=5000),
+    chat_history: List[Dict] = Body([], embed=True),
+    session_id: Optional[str] = Body(None, embed=True),
+    message_type: str = Body("health_guidance", embed=True, pattern=MESSAGE_TYPE_PATTERN),
+    user_id: str = Depends(get_current_user_id),
+    ai_service: HealthAIService = Depends(get_ai_service)
+):
+    """
+    Chat with HeaLLMe.ai's AI Assistant, streaming the reply as Server-Sent Events.
+
+    Emits one `chunk` event per model chunk ({"text": ...}) followed by a
+    final `done` event carrying the full reply. With a session_id the
+    exchange is stored once the reply is complete, unless generation failed.
+    """
+    user_data = {"user_id": user_id}
+    # Shed before the 200 and the first byte go out; afterwards errors can only be sent in-band
+    ai_service.ensure_capacity("chat_with_ai")
+    context = await _load_context(session_id, user_id, chat_history)
+
+    async def event_stream():
+        chunks = []
+        failed = False
+        async for text in ai_service.stream_chat_with_ai(message, context["history"], user_data, context["summary"]):
+            # A failure mid-stream arrives as one last fallback chunk after any partial reply
+            failed = failed or _is_fallback(text)
+            chunks.append(text)
+            yield _sse_event("chunk", {"text": text})
+        ai_response = "".join(chunks)
+        if session_id and not failed:
+            await chat_sessions.add_message(session_id, user_id, message, ai_response, message_type)
+            chat_context.schedule_fold(ai_service, context["session"], context["overflow"])
+        yield _sse_event("done", {"user_message": message, "ai_response": ai_response, "session_id": session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
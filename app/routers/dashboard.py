@@ -1,53 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from typing import Dict, Any, Optional
 from schema.health_data import HealthInsightsResponse
 from schema.user import UserResponse
-from services.ai_service import HealthAIService
-from auth import verify_token
+from services.ai_service import HealthAIService, daily_health_quote, get_ai_service
+from services.auth import verify_token
+from services.profile_cache import get_cached_profile, CachedProfile
 from fastapi.security import OAuth2PasswordBearer
-from db.fake_user_db import get_user_by_username  # Replace with real DB logic  just for testing only
+from services import user_repository, health_rollups
+from services.rate_limit import rate_limit
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
-ai_service = HealthAIService()
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
-    username = verify_token(token)
-    user = await get_user_by_username(username)  # Replace with your DB call later/...
-    if not user:
+async def get_current_profile(token: str = Depends(oauth2_scheme)) -> CachedProfile:
+    subject = verify_token(token)
+    profile = await get_cached_profile(subject, user_repository.get_user_by_subject)
+    if not profile:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return profile
+
+
+async def get_current_user(profile: CachedProfile = Depends(get_current_profile)) -> UserResponse:
+    return profile.user
+
+
+async def get_current_user_data(profile: CachedProfile = Depends(get_current_profile)) -> Dict[str, Any]:
+    """The current user's profile, already serialized for the AI service (read-only)"""
+    return profile.data
 
 
 @router.get("/quote", summary="Get a daily health quote")
 async def get_daily_quote():
-    return {"quote": ai_service.get_daily_health_quote()}
+    return {"quote": daily_health_quote()}
 
 
-@router.post("/analyze-symptoms", summary="Analyze user symptoms with AI")
-async def analyze_symptoms(payload: Dict[str, Any], user: UserResponse = Depends(get_current_user)):
+@router.post("/analyze-symptoms", summary="Analyze user symptoms with AI",
+             dependencies=[Depends(rate_limit("analyze_symptoms"))])
+async def analyze_symptoms(
+    payload: Dict[str, Any],
+    user_data: Dict[str, Any] = Depends(get_current_user_data),
+    cache_control: Optional[str] = Header(None),
+    ai_service: HealthAIService = Depends(get_ai_service)
+):
     symptoms = payload.get("symptoms", "")
     if not symptoms:
         raise HTTPException(status_code=400, detail="Symptoms are required")
+    # "Cache-Control: no-cache" forces a fresh analysis
+    use_cache = "no-cache" not in (cache_control or "").lower()
     result = await ai_service.analyze_symptoms(
         symptoms=symptoms,
-        user_history=user.medical_history or [],
-        user_data=user.model_dump()
+        user_history=user_data.get("medical_history") or [],
+        user_data=user_data,
+        use_cache=use_cache
     )
     return result
 
 
-@router.post("/recommendations", summary="Get AI-generated health recommendations")
-async def get_recommendations(user: UserResponse = Depends(get_current_user)):
-    user_data = user.model_dump()
-   
-    user_data["health_data"] = {}  
-    user_data["lifestyle"] = {}    
+@router.post("/recommendations", summary="Get AI-generated health recommendations",
+             dependencies=[Depends(rate_limit("generate_health_recommendations"))])
+async def get_recommendations(
+    user_data: Dict[str, Any] = Depends(get_current_user_data),
+    ai_service: HealthAIService = Depends(get_ai_service)
+):
+    # Copy: the cached profile dict is shared between requests
+    health_data = await health_rollups.recent_summary(user_data["id"])
+    user_data = dict(user_data, health_data=health_data, lifestyle={})
     return await ai_service.generate_health_recommendations(user_data)
 
 
-@router.post("/analyze-health", summary="Analyze health data for insights", response_model=HealthInsightsResponse)
-async def analyze_health_data(payload: Dict[str, Any], user: UserResponse = Depends(get_current_user)):
-    result = await ai_service.analyze_health_data(payload, user.model_dump())
+@router.post("/analyze-health", summary="Analyze health data for insights", response_model=HealthInsightsResponse,
+             dependencies=[Depends(rate_limit("analyze_health_data"))])
+async def analyze_health_data(
+    payload: Dict[str, Any],
+    user_data: Dict[str, Any] = Depends(get_current_user_data),
+    ai_service: HealthAIService = Depends(get_ai_service)
+):
+    result = await ai_service.analyze_health_data(payload, user_data)
     return result
+
+
+@router.post("/emergency", summary="Get immediate guidance for an emergency",
+             dependencies=[Depends(rate_limit("generate_emergency_response"))])
+async def get_emergency_guidance(
+    payload: Dict[str, Any],
+    user_data: Dict[str, Any] = Depends(get_current_user_data),
+    ai_service: HealthAIService = Depends(get_ai_service)
+):
+    emergency_type = payload.get("emergency_type", "")
+    if not emergency_type:
+        raise HTTPException(status_code=400, detail="Emergency type is required")
+    return await ai_service.generate_emergency_response(emergency_type, user_data)
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Optional
+from fastapi.responses import JSONResponse
+from fastapi.security import OAuth2PasswordBearer
+from schema.health_data import HealthDataIngestResponse, HealthTrendsResponse
+from services.auth import verify_token
+from services import user_repository
+from services.health_data_ingest import ingest, iter_json_array, iter_ndjson
+from services.health_trends import compute_trends
+from services.profile_cache import get_cached_profile
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+router = APIRouter(prefix="/health-data", tags=["Health Data"])
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
+    profile = await get_cached_profile(verify_token(token), user_repository.get_user_by_subject)
+    if not profile:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profile.user.id
+
+
+@router.post("/bulk", response_model=HealthDataIngestResponse, summary="Bulk-ingest health readings")
+async def bulk_ingest(request: Request, user_id: str = Depends(get_current_user_id)):
+    """
+    Ingest many readings in one upload.
+
+    The body is either a JSON array of readings (Content-Type: application/json)
+    or newline-delimited JSON (Content-Type: application/x-ndjson). It is read
+    as a stream and written in unordered batches; invalid readings are listed
+    in `errors` by position without failing the rest of the upload.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    parse = iter_ndjson if content_type in NDJSON_CONTENT_TYPES else iter_json_array
+
+    report = await ingest(user_id, parse(request.stream()))
+    if report["aborted"] and report["received"] == 0:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=report)
+    return report
+
+
+@router.get("/trends", response_model=HealthTrendsResponse, summary="Health trends over a period")
+async def get_trends(
+    period: str = "month",
+    bucket: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Trend series for week, month, quarter or year, bucketed by day, week or month
+    (defaults to day for week/month and week for quarter/year).
+    """
+    return await compute_trends(user_id, period, bucket)
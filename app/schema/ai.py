@@ -0,0 +1,41 @@
+from typing import List, Dict
+from pydantic import BaseModel, Field, validator
+
+# Shapes the Gemini JSON answers are validated against (see services.structured_output)
+
+class SymptomAnalysis(BaseModel):
+    possible_conditions: List[str]
+    recommendations: List[str]
+    urgency_level: str = Field("medium", regex="^(low|medium|high)$")
+    suggested_tests: List[str] = []
+    lifestyle_advice: List[str] = []
+    warning_signs: List[str] = []
+    when_to_seek_help: str = ""
+    confidence_level: str = ""
+
+    @validator("urgency_level", pre=True)
+    def normalize_urgency(cls, value):
+        return str(value).strip().lower()
+
+class HealthRecommendations(BaseModel):
+    dietary_suggestions: List[str]
+    vitamins_minerals: Dict[str, str] = {}
+    exercise_recommendations: List[str]
+    general_health_tips: List[str] = []
+    foods_to_avoid: List[str] = []
+    sleep_recommendations: List[str] = []
+    stress_management: List[str] = []
+    preventive_measures: List[str] = []
+
+class EmergencyGuidance(BaseModel):
+    immediate_actions: List[str]
+    emergency_contacts: List[str] = []
+    warning_signs: List[str] = []
+    do_not_do: List[str] = []
+    when_to_call_emergency: str = ""
+    preparation_steps: List[str] = []
+
+class ChatSummaryUpdate(BaseModel):
+    summary: str
+    key_symptoms: List[str] = []
+    recommendations: List[str] = []
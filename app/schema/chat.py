@@ -93,3 +93,13 @@ class ChatSummary(BaseModel):
     key_symptoms: List[str] = []
     recommendations: List[str] = []
     created_at: datetime
+
+
+class ChatSessionPage(BaseModel):
+    sessions: List[ChatSessionListResponse] = []
+    next_cursor: Optional[str] = None
+
+
+class ChatMessagePage(BaseModel):
+    messages: List[ChatMessageResponse] = []
+    next_cursor: Optional[str] = None
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional, List, Dict
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 class VitalSignsBase(BaseModel):
     heart_rate: Optional[int] = Field(None, ge=0, le=300, description="Heart rate in BPM")
@@ -32,6 +32,21 @@ class HealthDataBase(BaseModel):
 class HealthDataCreate(HealthDataBase):
     pass
 
+class HealthDataBulkItem(HealthDataCreate):
+    date_recorded: Optional[datetime] = Field(None, description="When the reading was taken; defaults to ingest time")
+
+class HealthDataIngestError(BaseModel):
+    index: int
+    error: str
+
+class HealthDataIngestResponse(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[HealthDataIngestError] = []
+    errors_truncated: bool = False
+    aborted: Optional[str] = None
+
 class HealthDataUpdate(BaseModel):
     vital_signs: Optional[VitalSignsBase] = None
     health_metrics: Optional[HealthMetricsBase] = None
@@ -96,10 +111,13 @@ class HealthDataListResponse(BaseModel):
 
 class HealthTrendsResponse(BaseModel):
     period: str
-    vital_signs_trends: Dict[str, List[float]] = {}
-    health_metrics_trends: Dict[str, List[float]] = {}
+    bucket: str = "day"
+    # Start of each bucket; every series below has one value per bucket (None when nothing was recorded)
+    bucket_starts: List[datetime] = []
+    vital_signs_trends: Dict[str, List[Optional[float]]] = {}
+    health_metrics_trends: Dict[str, List[Optional[float]]] = {}
     mood_trends: Dict[str, int] = {}
-    sleep_trends: List[float] = []
+    sleep_trends: List[Optional[float]] = []
     exercise_trends: List[int] = []
     water_intake_trends: List[int] = []
     calories_trends: List[int] = []
@@ -112,6 +130,11 @@ class HealthInsightsResponse(BaseModel):
     areas_for_improvement: List[str] = []
     next_checkup_date: Optional[datetime] = None
 
+    @validator("overall_health_score", pre=True)
+    def strip_percent(cls, value):
+        # Models like to answer "78%"
+        return value.strip().rstrip("%") if isinstance(value, str) else value
+
 # New schemas for HealthAnalysis and HealthQuote
 class HealthAnalysisBase(BaseModel):
     analysis_type: str = Field(..., regex="^(nutrition|symptoms|general_health)$")
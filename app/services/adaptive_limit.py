@@ -0,0 +1,57 @@
+import os
+import time
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from services.metrics import metrics
+
+load_dotenv()
+
+# Adaptive concurrency configuration
+AI_ADAPTIVE_LIMIT_ENABLED = os.getenv("AI_ADAPTIVE_LIMIT_ENABLED", "true").lower() == "true"
+AI_ADAPTIVE_MIN_LIMIT = int(os.getenv("AI_ADAPTIVE_MIN_LIMIT", "2"))
+AI_ADAPTIVE_MAX_LIMIT = int(os.getenv("AI_ADAPTIVE_MAX_LIMIT", "128"))
+AI_LATENCY_TARGET_SECONDS = float(os.getenv("AI_LATENCY_TARGET_SECONDS", "8"))
+AI_ADAPTIVE_BACKOFF = float(os.getenv("AI_ADAPTIVE_BACKOFF", "0.75"))
+AI_ADAPTIVE_DECREASE_COOLDOWN_SECONDS = float(os.getenv("AI_ADAPTIVE_DECREASE_COOLDOWN_SECONDS", "2"))
+
+
+class AIMDLimit:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Every completed call is a sample. A failure or a call slower than the
+    latency target multiplies the limit by `backoff`, at most once per
+    cooldown so one slow burst counts once. A fast call while the limit is
+    actually in use adds 1/limit, about +1 per limit's worth of calls.
+    `on_change` receives the new whole-number limit.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int = AI_ADAPTIVE_MIN_LIMIT,
+                 max_limit: int = AI_ADAPTIVE_MAX_LIMIT, latency_target: float = AI_LATENCY_TARGET_SECONDS,
+                 backoff: float = AI_ADAPTIVE_BACKOFF, on_change: Optional[Callable[[int], None]] = None):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.on_change = on_change
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self._last_decrease = 0.0
+        metrics.set_gauge(f"ai.{name}.adaptive_limit", int(self.limit))
+
+    def on_sample(self, latency: float, ok: bool, in_flight: int):
+        """Record one finished call; in_flight counts the calls running when it finished, itself included"""
+        previous = int(self.limit)
+        if not ok or latency > self.latency_target:
+            now = time.monotonic()
+            if now - self._last_decrease >= AI_ADAPTIVE_DECREASE_COOLDOWN_SECONDS:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                metrics.inc(f"ai.{self.name}.adaptive_decreases")
+        elif in_flight >= int(self.limit):
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        if int(self.limit) != previous:
+            metrics.set_gauge(f"ai.{self.name}.adaptive_limit", int(self.limit))
+            if self.on_change is not None:
+                self.on_change(int(self.limit))
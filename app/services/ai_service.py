@@ -1,14 +1,134 @@
 import google.generativeai as genai
-import json
+import asyncio
+import copy
 import random
+import re
 import os
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
-from notifications import notify_n8n
+from fastapi import HTTPException, Request, status
+from services.notifications import notify_n8n, notify_emergency_alert
+from services.metrics import metrics
+from services.model_router import model_router
+from services.cache import TTLCache
+from services.singleflight import SingleFlight
+from services.chat_context import CHAT_CONTEXT_TOKEN_BUDGET, estimate_tokens, select_recent_turns
+from services.prompt_budget import fit_prompt, format_list, to_json
+from services.token_usage import usage_recorder
+from services.triage import triage, triage_response, emergency_guidance
+from services.emergency_guidance import emergency_guidance_store
+from services.structured_output import generate_structured, StructuredOutputError
+from services.model_scheduler import OverloadedError
+from schema.ai import SymptomAnalysis, HealthRecommendations, EmergencyGuidance, ChatSummaryUpdate
+from schema.health_data import HealthInsightsResponse
 
 load_dotenv()
 
+# Symptom analysis response cache
+SYMPTOM_CACHE_MAX_SIZE = int(os.getenv("SYMPTOM_CACHE_MAX_SIZE", "2048"))
+SYMPTOM_CACHE_TTL_SECONDS = float(os.getenv("SYMPTOM_CACHE_TTL_SECONDS", "3600"))
+# Retry-After sent with 503s when the model backend sheds a request
+AI_OVERLOAD_RETRY_AFTER_SECONDS = int(os.getenv("AI_OVERLOAD_RETRY_AFTER_SECONDS", "5"))
+
+# Canned answers used whenever the model can't give a valid one
+SYMPTOM_ANALYSIS_FALLBACK = {
+    "possible_conditions": ["Consult a healthcare professional"],
+    "recommendations": ["Please consult a healthcare professional for proper diagnosis"],
+    "urgency_level": "medium",
+    "suggested_tests": ["General health checkup"],
+    "lifestyle_advice": ["Maintain a healthy lifestyle"],
+    "warning_signs": ["Persistent symptoms"],
+    "when_to_seek_help": "If symptoms persist or worsen",
+    "confidence_level": "60%"
+}
+
+HEALTH_RECOMMENDATIONS_FALLBACK = {
+    "dietary_suggestions": ["Eat a balanced diet with fruits and vegetables"],
+    "vitamins_minerals": {
+        "vitamin_d": "Consider supplementation",
+        "iron": "Include iron-rich foods",
+        "calcium": "Include dairy or fortified foods",
+        "vitamin_b12": "Include animal products or supplements"
+    },
+    "exercise_recommendations": ["30 minutes of moderate exercise daily"],
+    "general_health_tips": ["Stay hydrated", "Get adequate sleep"],
+    "foods_to_avoid": ["Excessive processed foods"],
+    "sleep_recommendations": ["7-9 hours of sleep per night"],
+    "stress_management": ["Practice meditation or deep breathing"],
+    "preventive_measures": ["Regular health checkups"]
+}
+
+HEALTH_INSIGHTS_FALLBACK = {
+    "overall_health_score": 70,
+    "recommendations": ["Regular health checkups"],
+    "risk_factors": ["None identified"],
+    "positive_trends": ["General health appears stable"],
+    "areas_for_improvement": ["Maintain current healthy habits"]
+}
+
+EMERGENCY_FALLBACK = {
+    "immediate_actions": ["Call emergency services if needed"],
+    "emergency_contacts": ["911", "Local emergency services"],
+    "warning_signs": ["Severe symptoms"],
+    "do_not_do": ["Don't delay seeking help"],
+    "when_to_call_emergency": "If symptoms are severe or life-threatening",
+    "preparation_steps": ["Stay calm", "Call for help"]
+}
+
+CHAT_FALLBACK_MESSAGE = "I'm sorry, I'm having trouble responding right now. Please try again later."
+
+# Enhanced health quotes
+HEALTH_QUOTES = [
+    "An apple a day keeps the doctor away",
+    "Health is wealth",
+    "Take care of your body. It's the only place you have to live",
+    "The groundwork for all happiness is good health",
+    "Your body is a temple. Keep it pure and clean for the soul to reside in",
+    "Prevention is better than cure",
+    "A healthy outside starts from the inside",
+    "The greatest wealth is health",
+    "Wellness is the complete integration of body, mind, and spirit",
+    "Health is not simply the absence of sickness"
+]
+
+
+def daily_health_quote() -> str:
+    """Return a random health quote (no model call)"""
+    return random.choice(HEALTH_QUOTES)
+
+
+class AIUnavailableError(Exception):
+    """
+    The model backend turned the request away (overload, open circuit, ...).
+
+    Carries the canned fallback payload; the app's exception handler sends
+    it as a 503 with Retry-After instead of letting the request time out.
+    """
+
+    def __init__(self, message: str, fallback: Dict, retry_after: int = AI_OVERLOAD_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.fallback = fallback
+        self.retry_after = retry_after
+
+
+def _age_bucket(age) -> str:
+    try:
+        decade = int(age) // 10 * 10
+    except (TypeError, ValueError):
+        return "unknown"
+    return f"{decade}-{decade + 9}"
+
+
+def _symptom_cache_key(symptoms: str, user_history: List[str], user_data: Optional[Dict]) -> tuple:
+    """Cache key from normalized symptoms, age bucket, gender and sorted medical history"""
+    user_data = user_data or {}
+    normalized = " ".join(re.sub(r"[^\w\s,]", " ", symptoms.lower()).split())
+    gender = str(user_data.get('gender') or 'unknown').strip().lower()
+    history = tuple(sorted({h.strip().lower() for h in (user_history or []) if h and h.strip()}))
+    return (normalized, _age_bucket(user_data.get('age')), gender, history)
+
+
 class HealthAIService:
     def __init__(self):
         # Configure Gemini
@@ -17,21 +137,13 @@ class HealthAIService:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
-        
-        # Enhanced health quotes
-        self.health_quotes = [
-            "An apple a day keeps the doctor away",
-            "Health is wealth",
-            "Take care of your body. It's the only place you have to live",
-            "The groundwork for all happiness is good health",
-            "Your body is a temple. Keep it pure and clean for the soul to reside in",
-            "Prevention is better than cure",
-            "A healthy outside starts from the inside",
-            "The greatest wealth is health",
-            "Wellness is the complete integration of body, mind, and spirit",
-            "Health is not simply the absence of sickness"
-        ]
+        # Each method runs on the model tier services.model_router assigns it
+        model_router.configure(genai.GenerativeModel)
+        self.router = model_router
+        self.inflight = SingleFlight("ai")
+        self.symptom_cache = TTLCache("symptom_analysis", SYMPTOM_CACHE_MAX_SIZE, SYMPTOM_CACHE_TTL_SECONDS)
+        # Strong references to fire-and-forget model calls so they aren't garbage collected mid-flight
+        self.background_tasks = set()
         
         # Health analysis templates
         self.symptom_analysis_template = """
@@ -90,6 +202,7 @@ class HealthAIService:
         You are HealLLMe.ai, a friendly and empathetic medical AI assistant. You provide health guidance, support, and education.
         
         CONVERSATION CONTEXT:
+        Summary of earlier conversation: {summary}
         Previous messages: {chat_history}
         
         CURRENT MESSAGE: {message}
@@ -104,41 +217,152 @@ class HealthAIService:
         
         Respond naturally and helpfully to the user's health-related question or concern.
         """
+        
+        self.chat_summary_template = """
+        You maintain a running summary of a health conversation between a user and HealLLMe.ai.
+        
+        CURRENT SUMMARY: {summary}
+        
+        NEW EXCHANGES:
+        {exchanges}
+        
+        Update the summary so it also covers the new exchanges. Keep it under 150 words and keep
+        symptoms, conditions, medications and advice already given. Respond in JSON format:
+        {{
+            "summary": "updated summary",
+            "key_symptoms": ["symptom1", "symptom2"],
+            "recommendations": ["recommendation1", "recommendation2"]
+        }}
+        """
+        
+        self.health_data_analysis_template = """
+        Analyze the following health data and provide insights:
+        
+        USER DATA:
+        Age: {age}
+        Gender: {gender}
+        Medical History: {medical_history}
+        
+        HEALTH DATA:
+        {health_data}
+        
+        Provide analysis in JSON format:
+        {{
+            "overall_health_score": 0-100,
+            "recommendations": ["recommendation1", "recommendation2"],
+            "risk_factors": ["risk1", "risk2"],
+            "positive_trends": ["positive1", "positive2"],
+            "areas_for_improvement": ["improvement1", "improvement2"]
+        }}
+        """
+    
+    async def _generate(self, method: str, prompt: str, user_id: Optional[str] = None, **kwargs):
+        """
+        Run a model call on the method's model tier without blocking the event loop.
+
+        Identical prompts already in flight share that call's response (and
+        its token usage is charged to the user who started it).
+        """
+        key = (method, prompt, repr(sorted(kwargs.items())))
+        return await self.inflight.do(
+            key,
+            lambda: self._call_model(method, prompt, user_id, **kwargs),
+            label=method
+        )
+
+    async def _call_model(self, method: str, prompt: str, user_id: Optional[str], **kwargs):
+        response = await self.router.generate(method, prompt, **kwargs)
+        usage_recorder.record(method, user_id, prompt, response)
+        return response
+
+    async def _generate_json(self, method: str, prompt: str, schema, user_id: Optional[str] = None) -> Dict:
+        """
+        Model call whose JSON answer is extracted and validated against `schema`.
+
+        Raises StructuredOutputError when no valid answer came back, even after
+        a repair attempt; callers then use their canned fallback.
+        """
+        return await generate_structured(
+            lambda attempt_prompt, **kwargs: self._generate(method, attempt_prompt, user_id, **kwargs),
+            prompt, schema, method
+        )
+
+    def _run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task: asyncio.Task):
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Background AI task failed: {task.exception()}")
     
-    async def analyze_symptoms(self, symptoms: str, user_history: List[str], user_data: Dict = None) -> Dict:
-        """AI-powered symptom analysis using Gemini"""
+    def ensure_capacity(self, method: str):
+        """Raise AIUnavailableError up front if a call for this method would be shed (e.g. before streaming)"""
         try:
-            # Prepare user data
-            age = user_data.get('age', 'Not specified') if user_data else 'Not specified'
-            gender = user_data.get('gender', 'Not specified') if user_data else 'Not specified'
-            medical_history = ', '.join(user_history) if user_history else 'None'
-            
-            # Create prompt
-            prompt = self.symptom_analysis_template.format(
-                symptoms=symptoms,
-                medical_history=medical_history,
-                age=age,
-                gender=gender
-            )
-            
-            # Generate response
-            response = self.model.generate_content(prompt)
-            
-            # Parse JSON response
-            try:
-                result = json.loads(response.text)
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                result = {
-                    "possible_conditions": ["Consult a healthcare professional"],
-                    "recommendations": ["Please consult a healthcare professional for proper diagnosis"],
-                    "urgency_level": "medium",
-                    "suggested_tests": ["General health checkup"],
-                    "lifestyle_advice": ["Maintain a healthy lifestyle"],
-                    "warning_signs": ["Persistent symptoms"],
-                    "when_to_seek_help": "If symptoms persist or worsen",
-                    "confidence_level": "60%"
-                }
+            self.router.check_admission(method)
+        except OverloadedError as e:
+            raise AIUnavailableError(str(e), {"ai_response": CHAT_FALLBACK_MESSAGE} if method == "chat_with_ai" else {})
+
+    async def analyze_symptoms(self, symptoms: str, user_history: List[str], user_data: Dict = None,
+                               use_cache: bool = True) -> Dict:
+        """
+        Symptom analysis with a red-flag fast path.
+
+        Emergencies recognised by the triage rules get an immediate high-urgency
+        answer from the emergency templates; the detailed Gemini analysis still
+        runs in the background (cached and sent to n8n when it completes).
+        """
+        red_flags = triage(symptoms)
+        if red_flags is None:
+            return await self._analyze_symptoms(symptoms, user_history, user_data, use_cache)
+
+        metrics.inc("triage.red_flag")
+        metrics.inc(f"triage.red_flag.{red_flags['emergency_types'][0].replace(' ', '_')}")
+        self._run_in_background(self._analyze_symptoms(symptoms, user_history, user_data, use_cache))
+        await notify_emergency_alert(
+            (user_data or {}).get('user_id', 'unknown'),
+            red_flags['emergency_types'][0]
+        )
+        guidance = emergency_guidance_store.get(red_flags['emergency_types'][0], (user_data or {}).get('age'))
+        return triage_response(red_flags, guidance)
+
+    async def _analyze_symptoms(self, symptoms: str, user_history: List[str], user_data: Dict = None,
+                                use_cache: bool = True) -> Dict:
+        """AI-powered symptom analysis using Gemini, served from cache for repeated complaints"""
+        try:
+            cache_key = _symptom_cache_key(symptoms, user_history, user_data)
+            result = self.symptom_cache.get(cache_key) if use_cache else None
+            cached = result is not None
+            
+            if cached:
+                result = copy.deepcopy(result)
+            else:
+                # Prepare user data
+                age = user_data.get('age', 'Not specified') if user_data else 'Not specified'
+                gender = user_data.get('gender', 'Not specified') if user_data else 'Not specified'
+                
+                # Create prompt, clipped to the method's budget
+                prompt = fit_prompt(
+                    "analyze_symptoms",
+                    self.symptom_analysis_template,
+                    symptoms=symptoms,
+                    medical_history=format_list(user_history),
+                    age=age,
+                    gender=gender
+                )
+                
+                # Generate and validate response
+                try:
+                    result = await self._generate_json(
+                        "analyze_symptoms", prompt, SymptomAnalysis, (user_data or {}).get('user_id')
+                    )
+                    # Only genuine model answers are cached, never fallbacks
+                    self.symptom_cache.set(cache_key, copy.deepcopy(result))
+                except StructuredOutputError:
+                    # Fallback if JSON parsing fails
+                    result = copy.deepcopy(SYMPTOM_ANALYSIS_FALLBACK)
             
             # Send notification to n8n
             await notify_n8n(
@@ -149,12 +373,16 @@ class HealthAIService:
                     "symptoms": symptoms,
                     "urgency_level": result.get("urgency_level", "medium"),
                     "possible_conditions": result.get("possible_conditions", []),
-                    "confidence_level": result.get("confidence_level", "unknown")
+                    "confidence_level": result.get("confidence_level", "unknown"),
+                    "cached": cached
                 }
             )
             
             return result
             
+        except OverloadedError as e:
+            raise AIUnavailableError(str(e), copy.deepcopy(SYMPTOM_ANALYSIS_FALLBACK))
+            
         except Exception as e:
             error_result = {
                 "error": str(e),
@@ -185,38 +413,25 @@ class HealthAIService:
             health_data = user_data.get('health_data', {})
             lifestyle = user_data.get('lifestyle', {})
             
-            # Create prompt
-            prompt = self.health_recommendations_template.format(
+            # Create prompt, clipped to the method's budget
+            prompt = fit_prompt(
+                "generate_health_recommendations",
+                self.health_recommendations_template,
                 age=user_data.get('age', 'Not specified'),
                 gender=user_data.get('gender', 'Not specified'),
-                medical_history=', '.join(user_data.get('medical_history', [])) if user_data.get('medical_history') else 'None',
-                health_data=json.dumps(health_data),
-                lifestyle=json.dumps(lifestyle)
+                medical_history=format_list(user_data.get('medical_history')),
+                health_data=to_json(health_data),
+                lifestyle=to_json(lifestyle)
             )
             
-            # Generate response
-            response = self.model.generate_content(prompt)
-            
-            # Parse JSON response
+            # Generate and validate response
             try:
-                result = json.loads(response.text)
-            except json.JSONDecodeError:
+                result = await self._generate_json(
+                    "generate_health_recommendations", prompt, HealthRecommendations, user_data.get('user_id')
+                )
+            except StructuredOutputError:
                 # Fallback recommendations
-                result = {
-                    "dietary_suggestions": ["Eat a balanced diet with fruits and vegetables"],
-                    "vitamins_minerals": {
-                        "vitamin_d": "Consider supplementation",
-                        "iron": "Include iron-rich foods",
-                        "calcium": "Include dairy or fortified foods",
-                        "vitamin_b12": "Include animal products or supplements"
-                    },
-                    "exercise_recommendations": ["30 minutes of moderate exercise daily"],
-                    "general_health_tips": ["Stay hydrated", "Get adequate sleep"],
-                    "foods_to_avoid": ["Excessive processed foods"],
-                    "sleep_recommendations": ["7-9 hours of sleep per night"],
-                    "stress_management": ["Practice meditation or deep breathing"],
-                    "preventive_measures": ["Regular health checkups"]
-                }
+                result = copy.deepcopy(HEALTH_RECOMMENDATIONS_FALLBACK)
             
             # Send notification to n8n
             await notify_n8n(
@@ -232,6 +447,9 @@ class HealthAIService:
             
             return result
             
+        except OverloadedError as e:
+            raise AIUnavailableError(str(e), copy.deepcopy(HEALTH_RECOMMENDATIONS_FALLBACK))
+            
         except Exception as e:
             error_result = {
                 "error": str(e),
@@ -257,27 +475,36 @@ class HealthAIService:
     
     def get_daily_health_quote(self) -> str:
         """Return a random health quote"""
-        return random.choice(self.health_quotes)
+        return daily_health_quote()
+    
+    @staticmethod
+    def _format_turns(turns: List[Dict]) -> str:
+        return "\n".join([
+            f"User: {msg.get('message', '')}\nAI: {msg.get('response', '')}"
+            for msg in turns
+        ])
+    
+    def _build_chat_prompt(self, message: str, chat_history: List[Dict], summary: Optional[str] = None) -> str:
+        """Render the chat prompt from the rolling summary and as many recent turns as the token budget allows"""
+        budget = max(0, CHAT_CONTEXT_TOKEN_BUDGET - estimate_tokens(summary))
+        recent_turns = select_recent_turns(chat_history or [], budget)
+        
+        return fit_prompt(
+            "chat_with_ai",
+            self.chat_template,
+            summary=summary or "None",
+            chat_history=self._format_turns(recent_turns),
+            message=message
+        )
     
-    async def chat_with_ai(self, message: str, chat_history: List[Dict], user_data: Dict = None) -> str:
+    async def chat_with_ai(self, message: str, chat_history: List[Dict], user_data: Dict = None,
+                           summary: Optional[str] = None) -> str:
         """General health chat with Gemini AI"""
         try:
-            # Prepare chat history
-            history_text = ""
-            if chat_history:
-                history_text = "\n".join([
-                    f"User: {msg.get('message', '')}\nAI: {msg.get('response', '')}"
-                    for msg in chat_history[-5:]  # Last 5 messages for context
-                ])
-            
-            # Create prompt
-            prompt = self.chat_template.format(
-                chat_history=history_text,
-                message=message
-            )
+            prompt = self._build_chat_prompt(message, chat_history, summary)
             
             # Generate response
-            response = self.model.generate_content(prompt)
+            response = await self._generate("chat_with_ai", prompt, user_data.get('user_id'))
             ai_response = response.text
             
             # Send notification to n8n
@@ -294,8 +521,11 @@ class HealthAIService:
             
             return ai_response
             
+        except OverloadedError as e:
+            raise AIUnavailableError(str(e), {"ai_response": CHAT_FALLBACK_MESSAGE})
+            
         except Exception as e:
-            error_message = f"I'm sorry, I'm having trouble responding right now. Please try again later. Error: {str(e)}"
+            error_message = f"{CHAT_FALLBACK_MESSAGE} Error: {str(e)}"
             
             # Notify n8n about the error
             await notify_n8n(
@@ -307,46 +537,75 @@ class HealthAIService:
             
             return error_message
     
-    async def analyze_health_data(self, health_data: Dict, user_data: Dict) -> Dict:
-        """Analyze health data and provide insights"""
+    async def stream_chat_with_ai(self, message: str, chat_history: List[Dict], user_data: Dict = None,
+                                  summary: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a health chat reply chunk by chunk as Gemini produces it"""
+        chunks = []
         try:
-            prompt = f"""
-            Analyze the following health data and provide insights:
+            prompt = self._build_chat_prompt(message, chat_history, summary)
             
-            USER DATA:
-            Age: {user_data.get('age', 'Not specified')}
-            Gender: {user_data.get('gender', 'Not specified')}
-            Medical History: {', '.join(user_data.get('medical_history', [])) if user_data.get('medical_history') else 'None'}
+            async for text in self.router.stream("chat_with_ai", prompt):
+                chunks.append(text)
+                yield text
             
-            HEALTH DATA:
-            {json.dumps(health_data, indent=2)}
+            ai_response = "".join(chunks)
+            usage_recorder.record(
+                "chat_with_ai", user_data.get('user_id'), prompt, output_text=ai_response
+            )
             
-            Provide analysis in JSON format:
-            {{
-                "overall_health_score": "percentage",
-                "trends": ["trend1", "trend2"],
-                "concerns": ["concern1", "concern2"],
-                "improvements": ["improvement1", "improvement2"],
-                "recommendations": ["recommendation1", "recommendation2"],
-                "risk_factors": ["risk1", "risk2"],
-                "positive_aspects": ["positive1", "positive2"]
-            }}
-            """
+            # Notify n8n once the full reply has been delivered
+            await notify_n8n(
+                user_id=user_data.get('user_id', 'unknown'),
+                message=f"AI chat interaction: {message[:100]}...",
+                event_type="ai_chat",
+                metadata={
+                    "user_message": message,
+                    "ai_response": ai_response[:200],
+                    "chat_history_length": len(chat_history),
+                    "streamed": True
+                }
+            )
             
-            response = self.model.generate_content(prompt)
+        except Exception as e:
+            yield f"{CHAT_FALLBACK_MESSAGE} Error: {str(e)}"
+            
+            # Notify n8n about the error
+            await notify_n8n(
+                user_id=user_data.get('user_id', 'unknown'),
+                message=f"AI chat failed: {str(e)}",
+                event_type="ai_chat_error",
+                metadata={"error": str(e), "user_message": message, "streamed": True}
+            )
+    
+    async def summarize_chat(self, summary: str, turns: List[Dict], user_id: Optional[str] = None) -> Dict:
+        """Fold new chat turns into an existing conversation summary"""
+        prompt = fit_prompt(
+            "summarize_chat",
+            self.chat_summary_template,
+            summary=summary or "None",
+            exchanges=self._format_turns(turns)
+        )
+        return await self._generate_json("summarize_chat", prompt, ChatSummaryUpdate, user_id)
+    
+    async def analyze_health_data(self, health_data: Dict, user_data: Dict) -> Dict:
+        """Analyze health data and provide insights"""
+        try:
+            # Compact JSON clipped to the method's budget: clients can post arbitrarily large payloads
+            prompt = fit_prompt(
+                "analyze_health_data",
+                self.health_data_analysis_template,
+                age=user_data.get('age', 'Not specified'),
+                gender=user_data.get('gender', 'Not specified'),
+                medical_history=format_list(user_data.get('medical_history')),
+                health_data=to_json(health_data)
+            )
             
             try:
-                result = json.loads(response.text)
-            except json.JSONDecodeError:
-                result = {
-                    "overall_health_score": "70%",
-                    "trends": ["General health appears stable"],
-                    "concerns": ["Continue monitoring"],
-                    "improvements": ["Maintain current healthy habits"],
-                    "recommendations": ["Regular health checkups"],
-                    "risk_factors": ["None identified"],
-                    "positive_aspects": ["Good overall health indicators"]
-                }
+                result = await self._generate_json(
+                    "analyze_health_data", prompt, HealthInsightsResponse, user_data.get('user_id')
+                )
+            except StructuredOutputError:
+                result = copy.deepcopy(HEALTH_INSIGHTS_FALLBACK)
             
             # Send notification to n8n
             await notify_n8n(
@@ -355,23 +614,24 @@ class HealthAIService:
                 event_type="health_data_analysis",
                 metadata={
                     "health_score": result.get("overall_health_score", "unknown"),
-                    "concerns_count": len(result.get("concerns", [])),
+                    "concerns_count": len(result.get("areas_for_improvement", [])),
                     "recommendations_count": len(result.get("recommendations", []))
                 }
             )
             
             return result
             
+        except OverloadedError as e:
+            raise AIUnavailableError(str(e), copy.deepcopy(HEALTH_INSIGHTS_FALLBACK))
+            
         except Exception as e:
             error_result = {
                 "error": str(e),
-                "overall_health_score": "Unable to analyze",
-                "trends": ["Analysis unavailable"],
-                "concerns": ["Please consult healthcare professional"],
-                "improvements": ["Maintain healthy lifestyle"],
-                "recommendations": ["Regular health checkups"],
+                "overall_health_score": 0,
+                "recommendations": ["Regular health checkups", "Please consult healthcare professional"],
                 "risk_factors": ["Unable to assess"],
-                "positive_aspects": ["Continue healthy habits"]
+                "positive_trends": ["Analysis unavailable"],
+                "areas_for_improvement": ["Maintain healthy lifestyle"]
             }
             
             # Notify n8n about the error
@@ -384,15 +644,16 @@ class HealthAIService:
             
             return error_result
     
-    async def generate_emergency_response(self, emergency_type: str, user_data: Dict) -> Dict:
-        """Generate emergency response guidance"""
-        try:
-            prompt = f"""
+    @staticmethod
+    def _emergency_prompt(emergency_type: str, age, medical_history: str) -> str:
+        return fit_prompt(
+            "generate_emergency_response",
+            """
             Emergency situation: {emergency_type}
             
             User Information:
-            Age: {user_data.get('age', 'Not specified')}
-            Medical History: {', '.join(user_data.get('medical_history', [])) if user_data.get('medical_history') else 'None'}
+            Age: {age}
+            Medical History: {medical_history}
             
             Provide emergency guidance in JSON format:
             {{
@@ -403,21 +664,50 @@ class HealthAIService:
                 "when_to_call_emergency": "specific guidance",
                 "preparation_steps": ["step1", "step2"]
             }}
-            """
-            
-            response = self.model.generate_content(prompt)
-            
-            try:
-                result = json.loads(response.text)
-            except json.JSONDecodeError:
-                result = {
-                    "immediate_actions": ["Call emergency services if needed"],
-                    "emergency_contacts": ["911", "Local emergency services"],
-                    "warning_signs": ["Severe symptoms"],
-                    "do_not_do": ["Don't delay seeking help"],
-                    "when_to_call_emergency": "If symptoms are severe or life-threatening",
-                    "preparation_steps": ["Stay calm", "Call for help"]
-                }
+            """,
+            emergency_type=emergency_type,
+            age=age,
+            medical_history=medical_history
+        )
+    
+    async def generate_emergency_guidance(self, emergency_type: str, age: str) -> Dict:
+        """
+        Generic guidance for an emergency type and age group, for the pre-warmed store (raises on bad output).
+
+        Runs as warm_emergency_guidance, in the background scheduler class, so
+        filling the store never takes slots from live emergency requests.
+        """
+        return await self._generate_json(
+            "warm_emergency_guidance", self._emergency_prompt(emergency_type, age, "None"), EmergencyGuidance
+        )
+    
+    async def generate_emergency_response(self, emergency_type: str, user_data: Dict) -> Dict:
+        """
+        Emergency response guidance.
+
+        Known emergency types are served from the pre-warmed guidance store (or
+        the offline template while that entry is being generated); only
+        unknown types are generated live.
+        """
+        try:
+            result = emergency_guidance_store.get(emergency_type, user_data.get('age'))
+            if result is None and emergency_guidance_store.is_known(emergency_type):
+                emergency_guidance_store.refresh_soon(self, emergency_type, user_data.get('age'))
+                result = emergency_guidance(emergency_type)
+            
+            if result is None:
+                prompt = self._emergency_prompt(
+                    emergency_type,
+                    user_data.get('age', 'Not specified'),
+                    format_list(user_data.get('medical_history'))
+                )
+                
+                try:
+                    result = await self._generate_json(
+                        "generate_emergency_response", prompt, EmergencyGuidance, user_data.get('user_id')
+                    )
+                except StructuredOutputError:
+                    result = copy.deepcopy(EMERGENCY_FALLBACK)
             
             # Send emergency notification to n8n
             await notify_n8n(
@@ -434,8 +724,7 @@ class HealthAIService:
             return result
             
         except Exception as e:
-            error_result = {
-                "error": str(e),
+            error_result = emergency_guidance(emergency_type) or {
                 "immediate_actions": ["Call emergency services immediately"],
                 "emergency_contacts": ["911"],
                 "warning_signs": ["Any severe symptoms"],
@@ -443,5 +732,22 @@ class HealthAIService:
                 "when_to_call_emergency": "Immediately for severe symptoms",
                 "preparation_steps": ["Call emergency services"]
             }
+            error_result["error"] = str(e)
             
             return error_result
+
+def get_ai_service(request: Request) -> HealthAIService:
+    """
+    FastAPI dependency returning the process-wide HealthAIService.
+
+    The service is created on first use and kept on app.state for the app's
+    lifetime; tests can swap it via app.dependency_overrides or app.state.
+    """
+    service = getattr(request.app.state, "ai_service", None)
+    if service is None:
+        try:
+            service = HealthAIService()
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        request.app.state.ai_service = service
+    return service
@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import bisect
+import os
+import time
+import warnings
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import numpy as np
+from bson import ObjectId
+from dotenv import load_dotenv
+from database.connection import (
+    connect_to_mongo, close_mongo_connection, get_health_data_collection, get_anomaly_watermarks_collection
+)
+from schema.health_data import VitalSignsBase
+from services.metrics import metrics
+from services.notifications import notify_vital_signs_alert
+
+load_dotenv()
+
+# Detector configuration
+ANOMALY_ROLLING_WINDOW = int(os.getenv("ANOMALY_ROLLING_WINDOW", "20"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.2"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "5"))
+ANOMALY_MAX_SERIES = int(os.getenv("ANOMALY_MAX_SERIES", "1024"))
+
+VITAL_SIGNS = list(VitalSignsBase.__fields__)
+
+# Adult resting ranges: (critical_low, warning_low, warning_high, critical_high); None means no bound
+CLINICAL_RANGES = {
+    "heart_rate": (40, 50, 100, 130),
+    "blood_pressure_systolic": (80, 90, 140, 180),
+    "blood_pressure_diastolic": (40, 60, 90, 120),
+    "temperature": (35.0, 35.5, 38.0, 39.5),
+    "oxygen_saturation": (90, 94, None, None),
+    "respiratory_rate": (8, 12, 20, 30),
+}
+
+NORMAL, WARNING, CRITICAL = 0, 1, 2
+STATUS_NAMES = {WARNING: "warning", CRITICAL: "critical"}
+
+
+def _bounds(position: int) -> np.ndarray:
+    return np.array([
+        np.nan if CLINICAL_RANGES[v][position] is None else CLINICAL_RANGES[v][position] for v in VITAL_SIGNS
+    ], dtype=float)
+
+
+CRITICAL_LOW, WARNING_LOW, WARNING_HIGH, CRITICAL_HIGH = (_bounds(i) for i in range(4))
+
+
+def to_matrix(readings: List[Dict[str, Any]]) -> np.ndarray:
+    """(readings x vital signs) matrix in reading order, NaN where a vital wasn't recorded"""
+    matrix = np.full((len(readings), len(VITAL_SIGNS)), np.nan)
+    for row, reading in enumerate(readings):
+        vitals = reading.get("vital_signs") or {}
+        for col, field in enumerate(VITAL_SIGNS):
+            value = vitals.get(field)
+            if value is not None:
+                matrix[row, col] = value
+    return matrix
+
+
+def _zscores(values: np.ndarray, weight_sum: np.ndarray, weighted_x: np.ndarray, weighted_x2: np.ndarray,
+             history: np.ndarray) -> np.ndarray:
+    """
+    Z-score of each reading against a weighted baseline of earlier readings.
+
+    The other arguments hold, per reading and vital, the baseline's total
+    weight, weighted sum and weighted sum of squares, and how many earlier
+    readings it covers.
+    """
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = weighted_x / weight_sum
+        variance = weighted_x2 / weight_sum - mean * mean
+        z = (values - mean) / np.sqrt(np.clip(variance, 0, None))
+    z[(history < ANOMALY_MIN_HISTORY) | ~np.isfinite(z)] = np.nan
+    return z
+
+
+def _masked(values: np.ndarray):
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    return valid.astype(float), x, x * x
+
+
+def rolling_zscores(values: np.ndarray, window: int = ANOMALY_ROLLING_WINDOW) -> np.ndarray:
+    """Baseline: the previous `window` readings, equally weighted (cumulative sums, O(n))"""
+    columns = _masked(values)
+    # sums[k][i] is the total over readings before i; a window is the difference of two of them
+    sums = [np.vstack([np.zeros((1, values.shape[1])), np.cumsum(c, axis=0)]) for c in columns]
+    end = np.arange(len(values))
+    start = np.maximum(0, end - window)
+    count, total, total_sq = (c[end] - c[start] for c in sums)
+    return _zscores(values, count, total, total_sq, count)
+
+
+# Largest decay**-t a block of _decayed_prefix_sums may reach before it starts a new block
+_MAX_DECAY_SCALE = 1e100
+
+
+def _decayed_prefix_sums(columns: np.ndarray, decay: float) -> np.ndarray:
+    """
+    out[i] = sum over j < i of decay**(i - 1 - j) * columns[j], vectorised with cumulative sums.
+
+    Within a block, out[t] = decay**(t - 1) * cumsum(columns * decay**-s); blocks
+    are cut where decay**-s would leave float range and carry the sum forward,
+    so a series normally takes a single pass.
+    """
+    n = len(columns)
+    out = np.zeros_like(columns)
+    if n < 2:
+        return out
+    if decay <= 0:
+        out[1:] = columns[:-1]
+        return out
+    block = n if decay >= 1 else max(1, int(np.log(_MAX_DECAY_SCALE) / -np.log(decay)))
+    carry = np.zeros(columns.shape[1:])
+    for start in range(0, n, block):
+        end = min(n, start + block)
+        powers = (decay ** np.arange(end - start))[:, None]
+        prefix = np.cumsum(columns[start:end] / powers, axis=0)
+        out[start:end] = powers * carry
+        out[start + 1:end] += powers[1:] / decay * prefix[:-1]
+        carry = decay * out[end - 1] + columns[end - 1]
+    return out
+
+
+def ewma_zscores(values: np.ndarray, alpha: float = ANOMALY_EWMA_ALPHA) -> np.ndarray:
+    """Baseline: every earlier reading, weighted by (1 - alpha) per step back (decay-power cumulative sums, O(n))"""
+    valid, x, x2 = _masked(values)
+    weight_sum, weighted_x, weighted_x2 = (_decayed_prefix_sums(c, 1 - alpha) for c in (valid, x, x2))
+    history = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(valid, axis=0)[:-1]])
+    return _zscores(values, weight_sum, weighted_x, weighted_x2, history)
+
+
+def score(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Severity (0 normal, 1 warning, 2 critical) per reading and vital, with the z-scores behind it"""
+    with np.errstate(invalid="ignore"):
+        clinical = np.where(
+            (values < CRITICAL_LOW) | (values > CRITICAL_HIGH), CRITICAL,
+            np.where((values < WARNING_LOW) | (values > WARNING_HIGH), WARNING, NORMAL)
+        )
+    rolling = rolling_zscores(values)
+    ewma = ewma_zscores(values)
+    with np.errstate(invalid="ignore"):
+        statistical = (np.abs(rolling) >= ANOMALY_Z_THRESHOLD) | (np.abs(ewma) >= ANOMALY_Z_THRESHOLD)
+    return {
+        "severity": np.maximum(clinical, statistical.astype(int)),
+        "clinical": clinical,
+        "rolling_z": rolling,
+        "ewma_z": ewma,
+    }
+
+
+def _threshold_text(col: int, clinical: int, rolling_z: float, ewma_z: float) -> str:
+    if clinical:
+        low = CRITICAL_LOW[col] if clinical == CRITICAL else WARNING_LOW[col]
+        high = CRITICAL_HIGH[col] if clinical == CRITICAL else WARNING_HIGH[col]
+        return f"outside {'' if np.isnan(low) else low}-{'' if np.isnan(high) else high}"
+    z = rolling_z if not np.isnan(rolling_z) else ewma_z
+    return f"|z| >= {ANOMALY_Z_THRESHOLD} (z={z:.1f})"
+
+
+def detect(readings: List[Dict[str, Any]], check_from: int = 0,
+           alerted_through: Optional[Dict[str, datetime]] = None) -> List[Dict[str, Any]]:
+    """
+    Anomalies among readings[check_from:], using everything before as baseline.
+
+    Readings must be in date order. A vital sign in `alerted_through` only
+    alerts on readings recorded after that date, so nothing is reported
+    twice. Returns at most one alert per vital sign: the most severe, most
+    recent one.
+    """
+    # Bound the work per user; the oldest readings matter least
+    dropped = max(0, len(readings) - ANOMALY_MAX_SERIES)
+    readings = readings[dropped:]
+    check_from = max(0, check_from - dropped)
+    if not readings:
+        return []
+
+    values = to_matrix(readings)
+    scores = score(values)
+    dates = [reading.get("date_recorded") for reading in readings]
+    alerts = []
+    for col, vital in enumerate(VITAL_SIGNS):
+        start = check_from
+        if alerted_through and alerted_through.get(vital) is not None:
+            start = max(start, bisect.bisect_right(dates, alerted_through[vital]))
+        severities = scores["severity"][start:, col]
+        if not severities.any():
+            continue
+        # Most severe, then most recent
+        row = start + int(np.lexsort((np.arange(len(severities)), severities))[-1])
+        level = int(scores["severity"][row, col])
+        alerts.append({
+            "vital_sign": vital,
+            "value": float(values[row, col]),
+            "status": STATUS_NAMES[level],
+            "threshold": _threshold_text(
+                col, int(scores["clinical"][row, col]), scores["rolling_z"][row, col], scores["ewma_z"][row, col]
+            ),
+            "date_recorded": readings[row].get("date_recorded"),
+        })
+    return alerts
+
+
+async def load_watermarks(user_id: ObjectId) -> Dict[str, datetime]:
+    """Per vital sign, the date_recorded of the last reading the user was alerted on"""
+    collection = get_anomaly_watermarks_collection()
+    if collection is None:
+        return {}
+    doc = await collection.find_one({"_id": user_id})
+    return (doc or {}).get("alerted_through", {})
+
+
+async def fire_alerts(user_id: ObjectId, alerts: List[Dict[str, Any]]):
+    """Send the alerts and advance the user's watermarks past them"""
+    for alert in alerts:
+        metrics.inc(f"anomaly.alerts.{alert['status']}")
+        await notify_vital_signs_alert(
+            str(user_id), alert["vital_sign"], alert["value"], alert["threshold"], alert["status"]
+        )
+    collection = get_anomaly_watermarks_collection()
+    if collection is None or not alerts:
+        return
+    await collection.update_one(
+        {"_id": user_id},
+        {
+            "$max": {f"alerted_through.{alert['vital_sign']}": alert["date_recorded"] for alert in alerts},
+            "$set": {"updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+
+async def check_new_readings(user_id: ObjectId, new_readings: List[Dict[str, Any]]):
+    """Score freshly ingested readings against the user's preceding history and alert right away"""
+    collection = get_health_data_collection()
+    new_readings = [r for r in new_readings if r.get("vital_signs")]
+    if collection is None or not new_readings:
+        return
+
+    started_at = time.perf_counter()
+    new_readings.sort(key=lambda r: r["date_recorded"])
+    history = await collection.find(
+        {"user_id": user_id, "date_recorded": {"$lt": new_readings[0]["date_recorded"]}, "vital_signs": {"$ne": None}},
+        {"vital_signs": 1, "date_recorded": 1}
+    ).sort("date_recorded", -1).limit(ANOMALY_ROLLING_WINDOW * 2).to_list(length=None)
+    history.reverse()
+
+    alerts = detect(history + new_readings, check_from=len(history), alerted_through=await load_watermarks(user_id))
+    await fire_alerts(user_id, alerts)
+    metrics.observe("anomaly.check_seconds", time.perf_counter() - started_at)
+
+
+async def scan_all_users(since_hours: float = 24, history_days: int = 30) -> int:
+    """
+    Batch pass over every user with readings in the last `since_hours`.
+
+    Each user's series (the last `history_days`, at most ANOMALY_MAX_SERIES
+    readings) is streamed with its own sorted cursor; only readings newer
+    than since_hours, and newer than what the user was already alerted on,
+    can raise alerts. Returns the number of alerts fired.
+    """
+    collection = get_health_data_collection()
+    if collection is None:
+        raise RuntimeError("MongoDB is not connected")
+
+    now = datetime.utcnow()
+    since = now - timedelta(hours=since_hours)
+    users = collection.aggregate([
+        {"$match": {"date_recorded": {"$gte": since}, "vital_signs": {"$ne": None}}},
+        {"$group": {"_id": "$user_id"}}
+    ], allowDiskUse=True)
+    fired = 0
+    async for user in users:
+        readings = await collection.find(
+            {
+                "user_id": user["_id"],
+                "date_recorded": {"$gte": now - timedelta(days=history_days)},
+                "vital_signs": {"$ne": None}
+            },
+            {"vital_signs": 1, "date_recorded": 1}
+        ).sort("date_recorded", -1).limit(ANOMALY_MAX_SERIES).to_list(length=None)
+        readings.reverse()
+        check_from = next((i for i, r in enumerate(readings) if r["date_recorded"] >= since), len(readings))
+        alerts = detect(readings, check_from, alerted_through=await load_watermarks(user["_id"]))
+        await fire_alerts(user["_id"], alerts)
+        fired += len(alerts)
+    return fired
+
+
+async def _main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Vital-sign anomaly detection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    scan_parser = subparsers.add_parser("scan", help="Score every user's recent vital signs and send alerts")
+    scan_parser.add_argument("--since-hours", type=float, default=24, help="Only alert on readings this recent")
+    scan_parser.add_argument("--history-days", type=int, default=30, help="Baseline history to load per user")
+    args = parser.parse_args(argv)
+
+    from services.notifications import dispatcher
+    await connect_to_mongo()
+    try:
+        fired = await scan_all_users(args.since_hours, args.history_days)
+        print(f"✅ Anomaly scan fired {fired} alerts")
+    finally:
+        await dispatcher.stop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run from the app directory: python -m services.anomaly_detection scan
+    asyncio.run(_main())
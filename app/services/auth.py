@@ -1,10 +1,16 @@
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
 from dotenv import load_dotenv
+from services.metrics import metrics
+from services.cache import TTLCache
 
 load_dotenv()
 
@@ -12,7 +18,23 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt work factor; hashes below it are upgraded on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel off the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# Verified tokens keyed by SHA-256 digest; each entry expires with the token's own exp
+_token_cache = TTLCache("verified_tokens", TOKEN_CACHE_MAX_SIZE, ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +42,28 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_hashing(name: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_hash_executor, fn, *args)
+    finally:
+        metrics.observe(f"auth.{name}_seconds", time.perf_counter() - started_at)
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the bcrypt worker pool"""
+    return await _run_hashing("hash", pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the bcrypt worker pool.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash is flagged
+    by pwd_context.needs_update (e.g. fewer rounds than BCRYPT_ROUNDS) and
+    should replace it.
+    """
+    return await _run_hashing("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,16 +75,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def verify_token(token: str):
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    cached_subject = _token_cache.get(token_digest)
+    if cached_subject is not None:
+        return cached_subject
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+        subject: str = payload.get("sub")
+        if subject is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return username
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            _token_cache.set(token_digest, subject, ttl_seconds=remaining)
+        return subject
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
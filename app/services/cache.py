@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from services.metrics import metrics
+
+
+class TTLCache:
+    """
+    Bounded in-memory LRU cache whose entries also expire after a TTL.
+
+    Hits and misses are counted under cache.<name>.* in the metrics registry.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl_seconds: float = 300):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.inc(f"cache.{self.name}.misses")
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            metrics.inc(f"cache.{self.name}.expired")
+            metrics.inc(f"cache.{self.name}.misses")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc(f"cache.{self.name}.hits")
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            metrics.inc(f"cache.{self.name}.evictions")
+        metrics.set_gauge(f"cache.{self.name}.size", len(self._entries))
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+        metrics.set_gauge(f"cache.{self.name}.size", len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        metrics.set_gauge(f"cache.{self.name}.size", 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.counters.get(f"cache.{self.name}.hits", 0)
+        misses = metrics.counters.get(f"cache.{self.name}.misses", 0)
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+from schema.chat import ChatSummary
+from services import chat_sessions
+
+load_dotenv()
+
+# Chat context configuration
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1500"))
+CHAT_CONTEXT_MAX_TURNS = int(os.getenv("CHAT_CONTEXT_MAX_TURNS", "50"))
+CHAT_SUMMARY_FOLD_BATCH = int(os.getenv("CHAT_SUMMARY_FOLD_BATCH", "20"))
+
+# Sessions with a summary update already running in this process
+_folding: set = set()
+# Strong references to scheduled folds so they aren't garbage collected mid-flight
+_fold_tasks: set = set()
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting"""
+    return len(text) // 4 + 1 if text else 0
+
+
+def turn_tokens(turn: Dict[str, Any]) -> int:
+    return estimate_tokens(turn.get("message", "")) + estimate_tokens(turn.get("response", ""))
+
+
+def select_recent_turns(chat_history: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """The longest run of most recent turns (chronological order) that fits in `budget` tokens"""
+    selected = []
+    used = 0
+    for turn in reversed(chat_history):
+        cost = turn_tokens(turn)
+        if used + cost > budget:
+            break
+        selected.append(turn)
+        used += cost
+    return list(reversed(selected))
+
+
+async def build_context(session: Dict[str, Any], budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Build the prompt context for a session.
+
+    Returns the session's rolling summary, the recent turns that fit in what
+    is left of the token budget, and `overflow`: the oldest turns that are
+    neither in the window nor folded into the summary yet.
+    """
+    summary = (session.get("summary") or {}).get("summary", "")
+    summarized_through = session.get("summary_through")
+    remaining = max(0, budget - estimate_tokens(summary))
+
+    recent = await chat_sessions.messages_between(
+        session["_id"], newer_than=summarized_through, limit=CHAT_CONTEXT_MAX_TURNS, newest_first=True
+    )
+    history = select_recent_turns(list(reversed(recent)), remaining)
+
+    overflow = []
+    if len(history) < len(recent) or len(recent) == CHAT_CONTEXT_MAX_TURNS:
+        window_start = history[0]["timestamp"] if history else None
+        overflow = await chat_sessions.messages_between(
+            session["_id"], newer_than=summarized_through, older_than=window_start,
+            limit=CHAT_SUMMARY_FOLD_BATCH, newest_first=False
+        )
+
+    return {"summary": summary, "history": history, "overflow": overflow}
+
+
+async def fold_into_summary(ai_service, session: Dict[str, Any], turns: List[Dict[str, Any]]):
+    """
+    Fold turns that left the context window into the session's rolling summary.
+
+    Only the new turns and the previous summary go to the model, so the cost
+    stays constant however long the conversation is. Meant to run after the
+    reply has been sent.
+    """
+    session_id = session["_id"]
+    if not turns or session_id in _folding:
+        return
+    _folding.add(session_id)
+    try:
+        previous = session.get("summary") or {}
+        updated = await ai_service.summarize_chat(previous.get("summary", ""), turns, session.get("user_id"))
+        summary = ChatSummary(
+            session_id=session_id,
+            session_name=session["session_name"],
+            summary=updated.get("summary", previous.get("summary", "")),
+            key_symptoms=updated.get("key_symptoms", previous.get("key_symptoms", [])),
+            recommendations=updated.get("recommendations", previous.get("recommendations", [])),
+            created_at=datetime.utcnow()
+        )
+        await chat_sessions.save_summary(
+            session_id, summary.dict(), turns[-1]["timestamp"], expected_through=session.get("summary_through")
+        )
+    except Exception as e:
+        print(f"⚠️ Chat summary update failed for session {session_id}: {e}")
+    finally:
+        _folding.discard(session_id)
+
+
+def schedule_fold(ai_service, session: Dict[str, Any], turns: List[Dict[str, Any]]):
+    """Run fold_into_summary in the background if there is anything to fold"""
+    if turns:
+        task = asyncio.create_task(fold_into_summary(ai_service, session, turns))
+        _fold_tasks.add(task)
+        task.add_done_callback(_fold_tasks.discard)
@@ -0,0 +1,179 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from database.connection import get_chat_sessions_collection, get_chat_messages_collection
+from models.chat import ChatMessage, ChatSession
+
+# Pagination defaults
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _collection(getter):
+    collection = getter()
+    if collection is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Chat storage unavailable")
+    return collection
+
+
+def encode_cursor(value: datetime, doc_id: str) -> str:
+    return f"{value.isoformat()}_{doc_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, Optional[str]]]:
+    """(timestamp, _id) of a cursor; cursors issued before the _id was added carry only the timestamp"""
+    if not cursor:
+        return None
+    stamp, _, doc_id = cursor.partition("_")
+    try:
+        return datetime.fromisoformat(stamp), doc_id or None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _after(field: str, position: Tuple[datetime, Optional[str]]) -> Dict[str, Any]:
+    """Documents past `position` when sorted by (field, _id) descending, so ties on field are neither skipped nor repeated"""
+    value, doc_id = position
+    if doc_id is None:
+        return {field: {"$lt": value}}
+    return {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": doc_id}}]}
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def _message_response(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": doc["_id"],
+        "user_id": doc["user_id"],
+        "session_id": doc["session_id"],
+        "message": doc["message"],
+        "response": doc["response"],
+        "timestamp": doc["timestamp"],
+        "message_type": doc.get("message_type", "health_guidance")
+    }
+
+
+def _session_summary(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": doc["_id"],
+        "session_name": doc["session_name"],
+        "last_message": doc.get("last_message"),
+        "message_count": doc.get("message_count", 0),
+        "last_activity": doc["last_activity"],
+        "created_at": doc["created_at"]
+    }
+
+
+async def create_session(user_id: str, session_name: str) -> Dict[str, Any]:
+    """Create an empty chat session"""
+    session = ChatSession(user_id=user_id, session_name=session_name)
+    doc = session.dict(by_alias=True, exclude={"messages"})
+    doc.update({"message_count": 0, "last_message": None})
+    await _collection(get_chat_sessions_collection).insert_one(doc)
+    return doc
+
+
+async def get_session(session_id: str, user_id: str) -> Dict[str, Any]:
+    """Fetch a session owned by user_id, 404 otherwise"""
+    doc = await _collection(get_chat_sessions_collection).find_one({"_id": session_id, "user_id": user_id})
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    return doc
+
+
+async def list_sessions(user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Most recently active sessions first, keyset-paginated on (last_activity, _id).
+
+    Served by the (user_id, last_activity, _id) index; pass next_cursor back
+    as cursor to get the following page.
+    """
+    size = _page_size(limit)
+    query: Dict[str, Any] = {"user_id": user_id}
+    position = decode_cursor(cursor)
+    if position is not None:
+        query.update(_after("last_activity", position))
+
+    docs = await _collection(get_chat_sessions_collection).find(
+        query, {"_id": 1, "session_name": 1, "last_message": 1, "message_count": 1, "last_activity": 1, "created_at": 1}
+    ).sort([("last_activity", -1), ("_id", -1)]).limit(size + 1).to_list(length=size + 1)
+
+    last = docs[size - 1] if len(docs) > size else None
+    next_cursor = encode_cursor(last["last_activity"], last["_id"]) if last else None
+    return {"sessions": [_session_summary(doc) for doc in docs[:size]], "next_cursor": next_cursor}
+
+
+async def list_messages(session_id: str, limit: int = DEFAULT_PAGE_SIZE, before: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Newest messages first, keyset-paginated on (timestamp, _id).
+
+    Served by the (session_id, timestamp, _id) index; pass next_cursor back
+    as before to walk further into the past.
+    """
+    size = _page_size(limit)
+    query: Dict[str, Any] = {"session_id": session_id}
+    position = decode_cursor(before)
+    if position is not None:
+        query.update(_after("timestamp", position))
+
+    docs = await _collection(get_chat_messages_collection).find(query) \
+        .sort([("timestamp", -1), ("_id", -1)]).limit(size + 1).to_list(length=size + 1)
+
+    last = docs[size - 1] if len(docs) > size else None
+    next_cursor = encode_cursor(last["timestamp"], last["_id"]) if last else None
+    return {"messages": [_message_response(doc) for doc in docs[:size]], "next_cursor": next_cursor}
+
+
+async def messages_between(session_id: str, newer_than: Optional[datetime] = None, older_than: Optional[datetime] = None,
+                           limit: int = DEFAULT_PAGE_SIZE, newest_first: bool = True) -> List[Dict[str, Any]]:
+    """Messages of a session within an exclusive timestamp range, via the (session_id, timestamp) index"""
+    query: Dict[str, Any] = {"session_id": session_id}
+    bounds: Dict[str, Any] = {}
+    if newer_than is not None:
+        bounds["$gt"] = newer_than
+    if older_than is not None:
+        bounds["$lt"] = older_than
+    if bounds:
+        query["timestamp"] = bounds
+
+    docs = await _collection(get_chat_messages_collection).find(query) \
+        .sort("timestamp", -1 if newest_first else 1).limit(limit).to_list(length=limit)
+    return [_message_response(doc) for doc in docs]
+
+
+async def save_summary(session_id: str, summary: Dict[str, Any], summarized_through: datetime,
+                       expected_through: Optional[datetime] = None) -> bool:
+    """
+    Store a session's rolling summary and the timestamp of the last turn folded into it.
+
+    Only applies if nobody else advanced the summary since it was read.
+    """
+    result = await _collection(get_chat_sessions_collection).update_one(
+        {"_id": session_id, "summary_through": expected_through},
+        {"$set": {"summary": summary, "summary_through": summarized_through}}
+    )
+    return result.modified_count == 1
+
+
+async def add_message(session_id: str, user_id: str, message: str, response: str,
+                      message_type: str = "health_guidance") -> Dict[str, Any]:
+    """Store one user message / AI response exchange and bump the session's activity"""
+    chat_message = ChatMessage(
+        user_id=user_id,
+        session_id=session_id,
+        message=message,
+        response=response,
+        message_type=message_type
+    )
+    doc = chat_message.dict(by_alias=True)
+    await _collection(get_chat_messages_collection).insert_one(doc)
+    await _collection(get_chat_sessions_collection).update_one(
+        {"_id": session_id},
+        {
+            "$set": {"last_activity": doc["timestamp"], "last_message": message[:200]},
+            "$inc": {"message_count": 1}
+        }
+    )
+    return _message_response(doc)
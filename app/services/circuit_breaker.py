@@ -0,0 +1,116 @@
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from services.metrics import metrics
+from services.model_scheduler import OverloadedError
+
+load_dotenv()
+
+# Circuit breaker configuration
+AI_BREAKER_ENABLED = os.getenv("AI_BREAKER_ENABLED", "true").lower() == "true"
+AI_BREAKER_WINDOW_SECONDS = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "30"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+AI_BREAKER_OPEN_SECONDS = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "15"))
+AI_BREAKER_HALF_OPEN_CALLS = int(os.getenv("AI_BREAKER_HALF_OPEN_CALLS", "2"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(OverloadedError):
+    """The breaker is open: the backend is failing, so the call is refused without trying"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a sliding error-rate window.
+
+    Closed: calls go through; once the window holds at least `min_calls`
+    results and the error rate reaches `error_rate`, the breaker opens.
+    Open: every call fails fast with CircuitOpenError for `open_seconds`.
+    Half-open: up to `half_open_calls` probe calls go through; one success
+    closes the breaker, one failure opens it again.
+    """
+
+    def __init__(self, name: str, window_seconds: float = AI_BREAKER_WINDOW_SECONDS,
+                 min_calls: int = AI_BREAKER_MIN_CALLS, error_rate: float = AI_BREAKER_ERROR_RATE,
+                 open_seconds: float = AI_BREAKER_OPEN_SECONDS, half_open_calls: int = AI_BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._results: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._publish()
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self._reject()
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self._reject()
+            self._probes += 1
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be refused right now, without taking a half-open probe"""
+        if self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds:
+            self._reject()
+
+    def record(self, ok: Optional[bool]):
+        """Report a call's outcome; None means it was abandoned (e.g. a cancelled hedge) and proves nothing"""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if ok is True:
+                self._transition(CLOSED)
+            elif ok is False:
+                self._open()
+            return
+        if ok is None or self.state != CLOSED:
+            return
+
+        now = time.monotonic()
+        self._results.append((now, ok))
+        self._failures += not ok
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            _, old_ok = self._results.popleft()
+            self._failures -= not old_ok
+        if len(self._results) >= self.min_calls and self._failures / len(self._results) >= self.error_rate:
+            self._open()
+
+    def _reject(self):
+        metrics.inc(f"ai.circuit.{self.name}.rejected")
+        raise CircuitOpenError(f"Model backend circuit '{self.name}' is open")
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        metrics.inc(f"ai.circuit.{self.name}.opened")
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        self.state = state
+        self._probes = 0
+        if state == CLOSED:
+            self._results.clear()
+            self._failures = 0
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge(f"ai.circuit.{self.name}.state", _STATE_GAUGE[self.state])
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "window_calls": len(self._results),
+            "window_failures": self._failures,
+        }
@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import copy
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from dotenv import load_dotenv
+from database.connection import connect_to_mongo, close_mongo_connection, get_emergency_guidance_collection
+from services.metrics import metrics
+from services.triage import EMERGENCY_TEMPLATES
+
+load_dotenv()
+
+# Pre-warmed guidance configuration
+EMERGENCY_GUIDANCE_MAX_AGE_SECONDS = float(os.getenv("EMERGENCY_GUIDANCE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+# How often the app re-reads the stored entries to pick up what the warm command wrote
+EMERGENCY_GUIDANCE_REFRESH_SECONDS = float(os.getenv("EMERGENCY_GUIDANCE_REFRESH_SECONDS", "3600"))
+EMERGENCY_GUIDANCE_WARM_CONCURRENCY = int(os.getenv("EMERGENCY_GUIDANCE_WARM_CONCURRENCY", "4"))
+
+KNOWN_EMERGENCY_TYPES = list(EMERGENCY_TEMPLATES)
+
+# Emergency advice differs by life stage rather than by exact age
+AGE_BUCKETS = {
+    "child": "Child (under 13)",
+    "teen": "Teenager (13-17)",
+    "adult": "Adult (18-64)",
+    "senior": "Older adult (65+)",
+    "unknown": "Not specified",
+}
+
+
+def normalize_type(emergency_type: str) -> str:
+    return " ".join((emergency_type or "").lower().split())
+
+
+def age_bucket(age) -> str:
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if age < 13:
+        return "child"
+    if age < 18:
+        return "teen"
+    return "adult" if age < 65 else "senior"
+
+
+class EmergencyGuidanceStore:
+    """
+    Model-generated emergency guidance per (emergency type, age bucket).
+
+    Entries are persisted in MongoDB, loaded into memory at startup and
+    served from there, so requests for known emergency types never wait on
+    the model. Missing or stale entries are generated offline by
+    `python -m services.emergency_guidance warm` (run it on deploy and from
+    cron), once for the whole fleet rather than in every app worker; workers
+    re-read the collection every EMERGENCY_GUIDANCE_REFRESH_SECONDS. A miss
+    at request time only schedules that one entry.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._pending: set = set()
+        self._tasks: set = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def get(self, emergency_type: str, age) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get((normalize_type(emergency_type), age_bucket(age)))
+        if entry is None:
+            metrics.inc("emergency_guidance.miss")
+            return None
+        metrics.inc("emergency_guidance.hit")
+        return copy.deepcopy(entry["guidance"])
+
+    def is_known(self, emergency_type: str) -> bool:
+        return normalize_type(emergency_type) in EMERGENCY_TEMPLATES
+
+    def _is_fresh(self, key: Tuple[str, str]) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (datetime.utcnow() - entry["generated_at"]).total_seconds() < EMERGENCY_GUIDANCE_MAX_AGE_SECONDS
+
+    async def load(self) -> int:
+        """Read every persisted entry into memory; returns how many were loaded"""
+        collection = get_emergency_guidance_collection()
+        if collection is None:
+            return 0
+        async for doc in collection.find({}):
+            key = (doc["_id"]["emergency_type"], doc["_id"]["age_bucket"])
+            self._entries[key] = {"guidance": doc["guidance"], "generated_at": doc["generated_at"]}
+        metrics.set_gauge("emergency_guidance.entries", len(self._entries))
+        return len(self._entries)
+
+    async def _generate(self, ai_service, key: Tuple[str, str]) -> bool:
+        emergency_type, bucket = key
+        if key in self._pending:
+            return False
+        self._pending.add(key)
+        try:
+            guidance = await ai_service.generate_emergency_guidance(emergency_type, AGE_BUCKETS[bucket])
+        except Exception as e:
+            metrics.inc("emergency_guidance.failed")
+            print(f"⚠️ Emergency guidance for {emergency_type} ({bucket}) not generated: {e}")
+            return False
+        finally:
+            self._pending.discard(key)
+
+        now = datetime.utcnow()
+        self._entries[key] = {"guidance": guidance, "generated_at": now}
+        metrics.inc("emergency_guidance.generated")
+        metrics.set_gauge("emergency_guidance.entries", len(self._entries))
+        collection = get_emergency_guidance_collection()
+        if collection is not None:
+            await collection.replace_one(
+                {"_id": {"emergency_type": emergency_type, "age_bucket": bucket}},
+                {"guidance": guidance, "generated_at": now},
+                upsert=True
+            )
+        return True
+
+    async def warm(self, ai_service, force: bool = False) -> int:
+        """Generate every missing or stale entry (all of them with force); returns how many were written"""
+        semaphore = asyncio.Semaphore(EMERGENCY_GUIDANCE_WARM_CONCURRENCY)
+        keys = [
+            (emergency_type, bucket) for emergency_type in KNOWN_EMERGENCY_TYPES for bucket in AGE_BUCKETS
+            if force or not self._is_fresh((emergency_type, bucket))
+        ]
+
+        async def generate(key):
+            async with semaphore:
+                return await self._generate(ai_service, key)
+
+        results = await asyncio.gather(*(generate(key) for key in keys))
+        return sum(results)
+
+    def refresh_soon(self, ai_service, emergency_type: str, age):
+        """Fill one missing entry in the background"""
+        key = (normalize_type(emergency_type), age_bucket(age))
+        if key not in self._pending:
+            task = asyncio.create_task(self._generate(ai_service, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(EMERGENCY_GUIDANCE_REFRESH_SECONDS)
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"⚠️ Emergency guidance reload failed: {e}")
+
+    async def start(self):
+        """Load persisted guidance now and re-read it periodically; never calls the model"""
+        try:
+            loaded = await self.load()
+            print(f"✅ Loaded {loaded} emergency guidance entries")
+        except Exception as e:
+            print(f"⚠️ Emergency guidance not loaded: {e}")
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "expected": len(KNOWN_EMERGENCY_TYPES) * len(AGE_BUCKETS),
+            "stale": sum(1 for key in self._entries if not self._is_fresh(key)),
+        }
+
+
+emergency_guidance_store = EmergencyGuidanceStore()
+
+
+async def _main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pre-generated emergency guidance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Generate missing or stale guidance entries")
+    warm_parser.add_argument("--force", action="store_true", help="Regenerate every entry")
+    subparsers.add_parser("status", help="Show how many entries are stored")
+    args = parser.parse_args(argv)
+
+    from services.ai_service import HealthAIService
+    from services.model_router import model_router
+    from services.notifications import dispatcher
+    from services.token_usage import usage_recorder
+    await connect_to_mongo()
+    try:
+        await emergency_guidance_store.load()
+        if args.command == "warm":
+            written = await emergency_guidance_store.warm(HealthAIService(), force=args.force)
+            print(f"✅ Generated {written} emergency guidance entries")
+        print(emergency_guidance_store.stats())
+    finally:
+        await dispatcher.stop()
+        await usage_recorder.flush()
+        model_router.shutdown()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run from the app directory: python -m services.emergency_guidance warm
+    asyncio.run(_main())
@@ -0,0 +1,222 @@
+import codecs
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from database.connection import get_health_data_collection
+from schema.health_data import HealthDataBulkItem
+from services.metrics import metrics
+from services.health_rollups import apply_readings, as_utc
+from services.anomaly_detection import check_new_readings
+
+load_dotenv()
+
+# Ingestion configuration
+HEALTH_DATA_INGEST_BATCH_SIZE = int(os.getenv("HEALTH_DATA_INGEST_BATCH_SIZE", "500"))
+HEALTH_DATA_MAX_ITEM_BYTES = int(os.getenv("HEALTH_DATA_MAX_ITEM_BYTES", str(64 * 1024)))
+HEALTH_DATA_MAX_REPORTED_ERRORS = int(os.getenv("HEALTH_DATA_MAX_REPORTED_ERRORS", "1000"))
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class IngestError(Exception):
+    """A body that cannot be parsed any further (as opposed to a single bad item)"""
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, str]]:
+    """Yield (item, error) per non-empty line of an NDJSON body, holding at most one line in memory"""
+    buffer = b""
+    async for chunk in chunks:
+        # Only the new chunk is split, so a long line spread over many chunks is not rescanned
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            lines[0] = buffer + lines[0]
+            buffer = tail
+        else:
+            buffer += tail
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+        if len(buffer) > HEALTH_DATA_MAX_ITEM_BYTES:
+            raise IngestError(f"NDJSON line longer than {HEALTH_DATA_MAX_ITEM_BYTES} bytes")
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Tuple[Any, str]:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, str]]:
+    """
+    Yield (item, None) per element of a top-level JSON array without loading the whole body.
+
+    Elements are decoded one at a time from a rolling buffer; a malformed
+    array aborts the upload with IngestError.
+    """
+    buffer = ""
+    started = finished = False
+    # Incremental decoding copes with multi-byte characters split across chunks
+    text = codecs.getincrementaldecoder("utf-8")()
+
+    async for chunk in chunks:
+        try:
+            buffer += text.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise IngestError(f"Body is not valid UTF-8: {e}")
+
+        # Walk the buffer by offset and drop the consumed prefix once per chunk
+        idx = 0
+        while True:
+            idx = _WHITESPACE.match(buffer, idx).end()
+            if idx == len(buffer) or finished:
+                break
+            if not started:
+                if buffer[idx] != "[":
+                    raise IngestError("Expected a JSON array or an NDJSON body")
+                idx += 1
+                started = True
+                continue
+            if buffer[idx] == ",":
+                idx += 1
+                continue
+            if buffer[idx] == "]":
+                finished = True
+                idx += 1
+                continue
+            try:
+                item, idx = _decoder.raw_decode(buffer, idx)
+            except ValueError:
+                # Element not complete yet
+                if len(buffer) - idx > HEALTH_DATA_MAX_ITEM_BYTES:
+                    raise IngestError(f"JSON array element longer than {HEALTH_DATA_MAX_ITEM_BYTES} bytes")
+                break
+            yield item, None
+        buffer = buffer[idx:]
+
+    if not started or not finished or buffer.strip():
+        raise IngestError("Truncated or malformed JSON array")
+
+
+def _to_document(item: Any, user_id: ObjectId, now: datetime) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        raise ValueError("Each reading must be a JSON object")
+    reading = HealthDataBulkItem.parse_obj(item)
+    # Same document shape as models.HealthData
+    doc = reading.dict(exclude={"date_recorded"})
+    doc.update({
+        "_id": ObjectId(),
+        "user_id": user_id,
+        # Stored as naive UTC so in-process comparisons agree with what MongoDB returns
+        "date_recorded": as_utc(reading.date_recorded) if reading.date_recorded else now,
+        "created_at": now,
+        "updated_at": now
+    })
+    return doc
+
+
+class IngestReport:
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.errors_truncated = False
+        self.aborted = None
+
+    def add_error(self, index: int, error: str):
+        self.failed += 1
+        if len(self.errors) < HEALTH_DATA_MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": error})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+            "aborted": self.aborted
+        }
+
+
+async def _write(collection, batch: List[Tuple[int, Dict[str, Any]]], report: IngestReport) -> List[Dict[str, Any]]:
+    """Unordered insert_many of one batch; returns the documents that were written"""
+    docs = [doc for _, doc in batch]
+    try:
+        await collection.insert_many(docs, ordered=False)
+        report.inserted += len(docs)
+        return docs
+    except BulkWriteError as e:
+        failed_positions = set()
+        for write_error in e.details.get("writeErrors", []):
+            position = write_error["index"]
+            failed_positions.add(position)
+            report.add_error(batch[position][0], write_error.get("errmsg", "Write failed"))
+        written = [doc for position, doc in enumerate(docs) if position not in failed_positions]
+        report.inserted += len(written)
+        return written
+
+
+async def _flush(collection, batch: List[Tuple[int, Dict[str, Any]]], report: IngestReport):
+    written = await _write(collection, batch, report)
+    await apply_readings(written)
+    if written:
+        # Alert on abnormal vitals as soon as they land, not on the next batch scan
+        await check_new_readings(written[0]["user_id"], written)
+
+
+async def ingest(user_id: str, items: AsyncIterator[Tuple[Any, str]]) -> Dict[str, Any]:
+    """
+    Validate and store readings in batches of HEALTH_DATA_INGEST_BATCH_SIZE.
+
+    Invalid items are reported by position and skipped; the rest of the upload
+    is still written. If the body itself breaks off, what was read so far is
+    kept and the reason is returned as `aborted`. Only one batch is held in
+    memory at a time.
+    """
+    collection = get_health_data_collection()
+    if collection is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Health data storage unavailable")
+
+    owner = ObjectId(user_id)
+    report = IngestReport()
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    now = datetime.utcnow()
+
+    try:
+        async for item, parse_error in items:
+            index = report.received
+            report.received += 1
+            if parse_error:
+                report.add_error(index, parse_error)
+                continue
+            try:
+                batch.append((index, _to_document(item, owner, now)))
+            except (ValidationError, ValueError, TypeError) as e:
+                report.add_error(index, str(e))
+                continue
+            if len(batch) >= HEALTH_DATA_INGEST_BATCH_SIZE:
+                await _flush(collection, batch, report)
+                batch = []
+    except IngestError as e:
+        report.aborted = str(e)
+
+    if batch:
+        await _flush(collection, batch, report)
+
+    metrics.inc("health_data.ingested", report.inserted)
+    metrics.inc("health_data.rejected", report.failed)
+    return report.as_dict()
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from database.connection import (
+    connect_to_mongo, close_mongo_connection, get_health_data_collection, get_health_rollups_collection,
+    HEALTH_ROLLUPS_COLLECTION
+)
+from schema.health_data import VitalSignsBase, HealthMetricsBase
+
+GRANULARITIES = ("day", "week")
+
+# Every numeric field that gets count/sum/min/max, as (stat key, path in a health_data document)
+STAT_FIELDS: List[Tuple[str, str]] = (
+    [(f"vital_signs__{field}", f"vital_signs.{field}") for field in VitalSignsBase.__fields__]
+    + [(f"health_metrics__{field}", f"health_metrics.{field}") for field in HealthMetricsBase.__fields__]
+    + [(field, field) for field in ("sleep_hours", "exercise_minutes", "water_intake_ml", "calories_consumed")]
+)
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Naive UTC, the way MongoDB stores and returns datetimes; naive input is taken to be UTC already"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def period_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the UTC day or Monday-based week holding `moment`, matching $dateTrunc in the rebuild"""
+    moment = as_utc(moment)
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # weeks start on Monday
+    return day
+
+
+def _rollup_id(user_id: ObjectId, granularity: str, start: datetime) -> Dict[str, Any]:
+    # Key order matters for equality on an embedded-document _id
+    return {"user_id": user_id, "granularity": granularity, "period_start": start}
+
+
+def _value(doc: Dict[str, Any], path: str) -> Optional[float]:
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _empty_delta() -> Dict[str, Any]:
+    return {"count": 0, "stats": {}, "moods": {}}
+
+
+def _accumulate(delta: Dict[str, Any], doc: Dict[str, Any]):
+    delta["count"] += 1
+    for key, path in STAT_FIELDS:
+        value = _value(doc, path)
+        if value is None:
+            continue
+        stat = delta["stats"].setdefault(key, {"count": 0, "sum": 0, "min": value, "max": value})
+        stat["count"] += 1
+        stat["sum"] += value
+        stat["min"] = min(stat["min"], value)
+        stat["max"] = max(stat["max"], value)
+    if doc.get("mood"):
+        delta["moods"][doc["mood"]] = delta["moods"].get(doc["mood"], 0) + 1
+
+
+def _update_for(rollup_id: Dict[str, Any], delta: Dict[str, Any]) -> UpdateOne:
+    inc: Dict[str, Any] = {"count": delta["count"]}
+    minimums: Dict[str, Any] = {}
+    maximums: Dict[str, Any] = {}
+    for key, stat in delta["stats"].items():
+        inc[f"stats.{key}.count"] = stat["count"]
+        inc[f"stats.{key}.sum"] = stat["sum"]
+        minimums[f"stats.{key}.min"] = stat["min"]
+        maximums[f"stats.{key}.max"] = stat["max"]
+    for mood, count in delta["moods"].items():
+        inc[f"moods.{mood}"] = count
+
+    update: Dict[str, Any] = {
+        "$inc": inc,
+        "$setOnInsert": {
+            "user_id": rollup_id["user_id"],
+            "granularity": rollup_id["granularity"],
+            "period_start": rollup_id["period_start"]
+        },
+        "$set": {"updated_at": datetime.utcnow()}
+    }
+    if minimums:
+        update["$min"] = minimums
+        update["$max"] = maximums
+    return UpdateOne({"_id": rollup_id}, update, upsert=True)
+
+
+async def apply_readings(docs: List[Dict[str, Any]]):
+    """
+    Fold freshly inserted health_data documents into their day and week rollups.
+
+    Readings are pre-aggregated per rollup in memory, then applied with one
+    unordered bulk_write of atomic $inc/$min/$max upserts.
+    """
+    collection = get_health_rollups_collection()
+    if collection is None or not docs:
+        return
+
+    deltas: Dict[tuple, Dict[str, Any]] = {}
+    for doc in docs:
+        for granularity in GRANULARITIES:
+            key = (doc["user_id"], granularity, period_start(doc["date_recorded"], granularity))
+            _accumulate(deltas.setdefault(key, _empty_delta()), doc)
+
+    updates = [_update_for(_rollup_id(*key), delta) for key, delta in deltas.items()]
+    await collection.bulk_write(updates, ordered=False)
+
+
+async def read_rollups(user_id: str, granularity: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Rollup documents for a window, oldest first (one per period, via the rollup index)"""
+    collection = get_health_rollups_collection()
+    if collection is None:
+        return []
+    cursor = collection.find({
+        "user_id": ObjectId(user_id),
+        "granularity": granularity,
+        "period_start": {"$gte": period_start(start, granularity), "$lt": as_utc(end)}
+    }).sort("period_start", 1)
+    return await cursor.to_list(length=None)
+
+
+def mean(rollup: Dict[str, Any], key: str) -> Optional[float]:
+    stat = rollup.get("stats", {}).get(key)
+    return stat["sum"] / stat["count"] if stat and stat["count"] else None
+
+
+async def recent_summary(user_id: str, weeks: int = 4) -> Dict[str, Any]:
+    """Compact averages over the last few weekly rollups, e.g. for AI recommendations"""
+    end = datetime.utcnow()
+    rollups = await read_rollups(user_id, "week", end - timedelta(weeks=weeks), end)
+    totals: Dict[str, List[float]] = {}
+    for rollup in rollups:
+        for key, stat in rollup.get("stats", {}).items():
+            sums = totals.setdefault(key, [0, 0])
+            sums[0] += stat["sum"]
+            sums[1] += stat["count"]
+    return {
+        "weeks": len(rollups),
+        "averages": {key: round(total / count, 2) for key, (total, count) in totals.items() if count}
+    }
+
+
+def _backfill_pipeline(granularity: str, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    group: Dict[str, Any] = {
+        "_id": {
+            "user_id": "$user_id",
+            "granularity": granularity,
+            "period_start": {"$dateTrunc": {"date": "$date_recorded", "unit": granularity, "startOfWeek": "monday"}}
+        },
+        "count": {"$sum": 1},
+        "mood_list": {"$push": "$mood"}
+    }
+    stats_projection: Dict[str, Any] = {}
+    for key, path in STAT_FIELDS:
+        group[f"{key}__count"] = {"$sum": {"$cond": [{"$eq": [{"$ifNull": [f"${path}", None]}, None]}, 0, 1]}}
+        group[f"{key}__sum"] = {"$sum": f"${path}"}
+        group[f"{key}__min"] = {"$min": f"${path}"}
+        group[f"{key}__max"] = {"$max": f"${path}"}
+        # Leave out fields without readings so later $min/$max updates are not pinned to null
+        stats_projection[key] = {"$cond": [
+            {"$gt": [f"${key}__count", 0]},
+            {"count": f"${key}__count", "sum": f"${key}__sum", "min": f"${key}__min", "max": f"${key}__max"},
+            "$$REMOVE"
+        ]}
+
+    moods = {"$arrayToObject": {"$map": {
+        "input": {"$setUnion": [{"$filter": {"input": "$mood_list", "cond": {"$ne": ["$$this", None]}}}]},
+        "as": "mood",
+        "in": {"k": "$$mood", "v": {"$size": {"$filter": {"input": "$mood_list", "cond": {"$eq": ["$$this", "$$mood"]}}}}}
+    }}}
+
+    return [
+        {"$match": match},
+        {"$group": group},
+        {"$project": {
+            "user_id": "$_id.user_id",
+            "granularity": "$_id.granularity",
+            "period_start": "$_id.period_start",
+            "count": 1,
+            "stats": stats_projection,
+            "moods": moods,
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {"into": HEALTH_ROLLUPS_COLLECTION, "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+
+async def backfill(user_id: Optional[str] = None):
+    """
+    Rebuild rollups from raw health_data, for one user or everyone.
+
+    Runs entirely server-side ($group + $merge). Readings ingested while it
+    runs may be counted twice, so run it when ingestion is quiet.
+    """
+    rollups = get_health_rollups_collection()
+    readings = get_health_data_collection()
+    if rollups is None or readings is None:
+        raise RuntimeError("MongoDB is not connected")
+
+    match: Dict[str, Any] = {"user_id": ObjectId(user_id)} if user_id else {}
+    await rollups.delete_many(match)
+    for granularity in GRANULARITIES:
+        await readings.aggregate(_backfill_pipeline(granularity, match)).to_list(length=None)
+
+
+async def _main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain per-user daily and weekly health rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Rebuild rollups from raw health_data")
+    backfill_parser.add_argument("--user", help="Only rebuild this user id")
+    args = parser.parse_args(argv)
+
+    await connect_to_mongo()
+    try:
+        await backfill(args.user)
+        print("✅ Health rollups rebuilt")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run from the app directory: python -m services.health_rollups backfill
+    asyncio.run(_main())
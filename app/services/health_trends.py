@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+from database.connection import get_health_data_collection
+from schema.health_data import VitalSignsBase, HealthMetricsBase
+from services.health_rollups import STAT_FIELDS, period_start, read_rollups
+
+VITAL_SIGN_FIELDS = list(VitalSignsBase.__fields__)
+HEALTH_METRIC_FIELDS = list(HealthMetricsBase.__fields__)
+
+# Lookback window per period and the default bucket size for it
+PERIOD_DAYS = {"week": 7, "month": 30, "quarter": 90, "year": 365}
+DEFAULT_BUCKETS = {"week": "day", "month": "day", "quarter": "week", "year": "week"}
+BUCKETS = ("day", "week", "month")
+# Daily quantities are totalled per bucket; everything else is averaged
+TOTAL_FIELDS = ("exercise_minutes", "water_intake_ml", "calories_consumed")
+
+
+def period_window(period: str, end: Optional[datetime] = None) -> Dict[str, datetime]:
+    if period not in PERIOD_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"period must be one of {list(PERIOD_DAYS)}")
+    end = end or datetime.utcnow()
+    return {"start": end - timedelta(days=PERIOD_DAYS[period]), "end": end}
+
+
+def trend_window(period: str, bucket: str) -> Dict[str, datetime]:
+    """
+    The period's window with its start moved back to the start of its first day or week.
+
+    Rollups can't be split inside a period, so both the rollup and the raw
+    path start here and the first bucket covers the same readings either way.
+    """
+    window = period_window(period)
+    window["start"] = period_start(window["start"], "week" if bucket == "week" else "day")
+    return window
+
+
+def _validate_bucket(period: str, bucket: Optional[str]) -> str:
+    bucket = bucket or DEFAULT_BUCKETS[period]
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"bucket must be one of {list(BUCKETS)}")
+    return bucket
+
+
+async def _has_readings(user_id: str, start: datetime, end: datetime) -> bool:
+    """Whether any raw reading falls in [start, end), via the (user_id, date_recorded) index"""
+    collection = get_health_data_collection()
+    if collection is None or start >= end:
+        return False
+    doc = await collection.find_one(
+        {"user_id": ObjectId(user_id), "date_recorded": {"$gte": start, "$lt": end}}, {"_id": 1}
+    )
+    return doc is not None
+
+
+def _series_stage(bucket: str) -> Dict[str, Any]:
+    """$group stage averaging measurements and totalling daily quantities per time bucket"""
+    group: Dict[str, Any] = {
+        "_id": {"$dateTrunc": {"date": "$date_recorded", "unit": bucket, "startOfWeek": "monday"}}
+    }
+    for field in VITAL_SIGN_FIELDS:
+        group[f"vital_signs__{field}"] = {"$avg": f"$vital_signs.{field}"}
+    for field in HEALTH_METRIC_FIELDS:
+        group[f"health_metrics__{field}"] = {"$avg": f"$health_metrics.{field}"}
+    group["sleep_hours"] = {"$avg": "$sleep_hours"}
+    group["exercise_minutes"] = {"$sum": "$exercise_minutes"}
+    group["water_intake_ml"] = {"$sum": "$water_intake_ml"}
+    group["calories_consumed"] = {"$sum": "$calories_consumed"}
+    return {"$group": group}
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def shape_trends(period: str, bucket: str, rows: List[Dict[str, Any]], moods: Dict[str, int]) -> Dict[str, Any]:
+    """Turn per-bucket rows (sorted by bucket start) into HealthTrendsResponse fields"""
+    return {
+        "period": period,
+        "bucket": bucket,
+        "bucket_starts": [row["_id"] for row in rows],
+        "vital_signs_trends": {
+            field: [_round(row.get(f"vital_signs__{field}")) for row in rows] for field in VITAL_SIGN_FIELDS
+        },
+        "health_metrics_trends": {
+            field: [_round(row.get(f"health_metrics__{field}")) for row in rows] for field in HEALTH_METRIC_FIELDS
+        },
+        "mood_trends": moods,
+        "sleep_trends": [_round(row.get("sleep_hours")) for row in rows],
+        "exercise_trends": [int(row.get("exercise_minutes") or 0) for row in rows],
+        "water_intake_trends": [int(row.get("water_intake_ml") or 0) for row in rows],
+        "calories_trends": [int(row.get("calories_consumed") or 0) for row in rows],
+    }
+
+
+def _bucket_row(start: datetime, rollups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the rollups of one bucket into a row shaped like the raw aggregation's output"""
+    row: Dict[str, Any] = {"_id": start}
+    for key, _ in STAT_FIELDS:
+        count = sum(r.get("stats", {}).get(key, {}).get("count", 0) for r in rollups)
+        total = sum(r.get("stats", {}).get(key, {}).get("sum", 0) for r in rollups)
+        if key in TOTAL_FIELDS:
+            row[key] = total
+        else:
+            row[key] = total / count if count else None
+    return row
+
+
+async def compute_trends(user_id: str, period: str = "month", bucket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Trend series for one user read from the daily/weekly rollups.
+
+    Touches one rollup document per day or week in the window (monthly
+    buckets are folded from daily rollups). Falls back to aggregating raw
+    readings when the rollups don't cover the window: none at all, or raw
+    readings older than the first rollup (e.g. data from before rollups
+    existed and no backfill has run).
+    """
+    bucket = _validate_bucket(period, bucket)
+    window = trend_window(period, bucket)
+
+    granularity = "week" if bucket == "week" else "day"
+    rollups = await read_rollups(user_id, granularity, window["start"], window["end"])
+    if not rollups or await _has_readings(user_id, window["start"], rollups[0]["period_start"]):
+        return await compute_trends_from_readings(user_id, period, bucket, window)
+
+    buckets: Dict[datetime, List[Dict[str, Any]]] = {}
+    moods: Dict[str, int] = {}
+    for rollup in rollups:
+        start = rollup["period_start"]
+        if bucket == "month":
+            start = datetime(start.year, start.month, 1)
+        buckets.setdefault(start, []).append(rollup)
+        for mood, count in rollup.get("moods", {}).items():
+            moods[mood] = moods.get(mood, 0) + count
+
+    rows = [_bucket_row(start, group) for start, group in sorted(buckets.items())]
+    return shape_trends(period, bucket, rows, moods)
+
+
+async def compute_trends_from_readings(user_id: str, period: str = "month", bucket: Optional[str] = None,
+                                       window: Optional[Dict[str, datetime]] = None) -> Dict[str, Any]:
+    """
+    Trend series for one user aggregated from raw readings in a single round trip.
+
+    The $match on (user_id, date_recorded) is served by the compound index;
+    bucketing, averaging and mood counts all happen inside MongoDB via $facet.
+    The window is trend_window()'s unless the caller passes one.
+    """
+    bucket = _validate_bucket(period, bucket)
+    window = window or trend_window(period, bucket)
+
+    collection = get_health_data_collection()
+    if collection is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Health data storage unavailable")
+
+    pipeline = [
+        {"$match": {
+            "user_id": ObjectId(user_id),
+            "date_recorded": {"$gte": window["start"], "$lt": window["end"]}
+        }},
+        {"$facet": {
+            "series": [_series_stage(bucket), {"$sort": {"_id": 1}}],
+            "moods": [
+                {"$match": {"mood": {"$ne": None}}},
+                {"$group": {"_id": "$mood", "count": {"$sum": 1}}}
+            ]
+        }}
+    ]
+    result = await collection.aggregate(pipeline).to_list(length=1)
+    facets = result[0] if result else {"series": [], "moods": []}
+    moods = {doc["_id"]: doc["count"] for doc in facets["moods"]}
+    return shape_trends(period, bucket, facets["series"], moods)
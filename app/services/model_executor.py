@@ -0,0 +1,313 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+from dotenv import load_dotenv
+from services.metrics import metrics
+from services.model_scheduler import AI_MAX_CONCURRENCY, ModelScheduler, OverloadedError, class_for
+from services.adaptive_limit import AIMDLimit, AI_ADAPTIVE_LIMIT_ENABLED, AI_ADAPTIVE_MAX_LIMIT
+from services.circuit_breaker import CircuitBreaker, CLOSED, AI_BREAKER_ENABLED
+
+load_dotenv()
+
+# Model execution configuration
+AI_EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS", "64"))
+GEMINI_USE_ASYNC_API = os.getenv("GEMINI_USE_ASYNC_API", "true").lower() == "true"
+# Latency-critical methods that may fire a second, hedged call when the first runs past the p95
+AI_HEDGE_METHODS = [
+    m.strip() for m in os.getenv("AI_HEDGE_METHODS", "generate_emergency_response,analyze_symptoms").split(",")
+    if m.strip()
+]
+AI_HEDGE_QUANTILE = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+
+# Marks the end of a stream produced in a worker thread
+_STREAM_END = object()
+
+
+class ModelExecutor:
+    """
+    Runs Gemini calls for one model tier off the event loop.
+
+    Uses the SDK's native async API when available and falls back to a bounded
+    thread pool for the blocking client. Every call is admitted by the shared
+    priority scheduler (see services.model_scheduler) according to its
+    method's priority class, and records queue wait and call latency metrics.
+    With AI_ADAPTIVE_LIMIT_ENABLED the scheduler's capacity follows an AIMD
+    limit driven by observed call latency and errors, never above the
+    configured capacity (or AI_ADAPTIVE_MAX_LIMIT, if lower).
+
+    A circuit breaker in front of the scheduler fails calls fast with
+    CircuitOpenError (an OverloadedError, so callers serve their fallbacks)
+    while the backend is erroring. Methods in AI_HEDGE_METHODS fire a second
+    call once the first has run past the method's recent p95 latency and
+    return whichever succeeds first. Calls running longer than `timeout`
+    (or streams idle that long between chunks) fail with asyncio.TimeoutError;
+    a timed-out blocking call keeps its slot until its worker thread returns,
+    so the scheduler's limit bounds real upstream concurrency.
+
+    Per-tier metrics go under ai.tier.<name>: slots, queues, latency and
+    the prompt/output token counts Gemini reports in usage_metadata.
+    """
+
+    def __init__(self, name: str = "default", max_workers: int = AI_EXECUTOR_WORKERS,
+                 scheduler: Optional[ModelScheduler] = None, capacity: int = AI_MAX_CONCURRENCY,
+                 timeout: Optional[float] = None, use_async_api: bool = GEMINI_USE_ASYNC_API,
+                 hedge_methods: Optional[List[str]] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.scheduler = scheduler or ModelScheduler(capacity, name=f"tier.{name}")
+        # The configured capacity is a ceiling: AIMD only ever shrinks below it and grows back
+        self.limiter = AIMDLimit(
+            f"tier.{name}", initial=self.scheduler.capacity,
+            max_limit=min(self.scheduler.capacity, AI_ADAPTIVE_MAX_LIMIT), on_change=self.scheduler.set_capacity
+        ) if AI_ADAPTIVE_LIMIT_ENABLED else None
+        self.breaker = CircuitBreaker(name) if AI_BREAKER_ENABLED else None
+        self.use_async_api = use_async_api
+        self.hedge_methods = set(AI_HEDGE_METHODS if hedge_methods is None else hedge_methods)
+        self._hedges: Dict[str, List[int]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._waiting: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"gemini-{self.name}")
+        return self._executor
+
+    def _track(self, table: Dict[str, int], gauge: str, method: str, delta: int):
+        table[method] = table.get(method, 0) + delta
+        metrics.set_gauge(f"ai.{method}.{gauge}", table[method])
+
+    def check_admission(self, method: str):
+        """Raise OverloadedError if a call for this method would be shed right now"""
+        if self.breaker is not None:
+            self.breaker.check()
+        self.scheduler.check_admission(class_for(method))
+
+    async def generate(self, method: str, model, prompt: str, **kwargs) -> Any:
+        """Generate content for a service method without blocking the event loop"""
+        if self.use_async_api and hasattr(model, "generate_content_async"):
+            start_call = lambda: model.generate_content_async(prompt, **kwargs)
+            # Only hedge native async calls: cancelling the loser must actually stop it
+            if method in self.hedge_methods:
+                return await self._hedged(method, start_call)
+            return await self._run(method, start_call)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(model.generate_content, prompt, **kwargs)
+        return await self._run(method, lambda: loop.run_in_executor(self.executor, call))
+
+    def hedge_delay(self, method: str) -> Optional[float]:
+        """How long to wait before hedging, or None until there are enough latency samples on this tier"""
+        # Per tier: a method downgraded to the fast tier must not set the large tier's hedge delay
+        histogram = metrics.histogram(f"ai.tier.{self.name}.{method}.call_seconds")
+        if len(histogram.recent) < AI_HEDGE_MIN_SAMPLES:
+            return None
+        return histogram.quantile(AI_HEDGE_QUANTILE)
+
+    def _can_hedge(self, method: str) -> bool:
+        # A hedge is extra load: never add it to a failing or saturated backend
+        if self.breaker is not None and self.breaker.state != CLOSED:
+            return False
+        try:
+            self.check_admission(method)
+        except OverloadedError:
+            return False
+        return self.scheduler.in_flight < self.scheduler.capacity
+
+    async def _hedged(self, method: str, start_call) -> Any:
+        delay = self.hedge_delay(method)
+        if delay is None:
+            return await self._run(method, start_call)
+
+        primary = asyncio.ensure_future(self._run(method, start_call))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done or not self._can_hedge(method):
+                return await primary
+
+            hedge = asyncio.ensure_future(self._run(method, start_call))
+            pending.add(hedge)
+            self._record_hedge(method, "fired")
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_hedge(method, "hedge_won" if task is hedge else "primary_won")
+                        return task.result()
+            # Both failed; report the primary's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _record_hedge(self, method: str, outcome: str):
+        metrics.inc(f"ai.{method}.hedge.{outcome}")
+        counts = self._hedges.setdefault(method, [0, 0])
+        if outcome == "fired":
+            counts[0] += 1
+        elif outcome == "hedge_won":
+            counts[1] += 1
+        metrics.set_gauge(f"ai.{method}.hedge.win_rate", counts[1] / counts[0])
+
+    async def stream(self, method: str, model, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yield text chunks as the model produces them, holding the method's slot until done"""
+        started_at = await self._acquire(method)
+        chunks = self._stream_chunks(model, prompt, **kwargs)
+        chunk = None
+        ok = None
+        try:
+            while True:
+                try:
+                    next_chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk is None:
+                    metrics.observe(f"ai.{method}.first_chunk_seconds", time.perf_counter() - started_at)
+                chunk = next_chunk
+                yield chunk.text
+            metrics.inc(f"ai.{method}.calls")
+            ok = True
+            # Streams report usage on the final chunk
+            self._record_usage(chunk)
+        except Exception as e:
+            ok = False
+            metrics.inc(f"ai.{method}.{'timeouts' if isinstance(e, asyncio.TimeoutError) else 'errors'}")
+            raise
+        finally:
+            try:
+                # Stop the model stream too, whether it timed out, failed or the consumer went away
+                await chunks.aclose()
+            finally:
+                # ok stays None when the consumer went away: not a backend verdict either way
+                self._release(method, started_at, ok)
+
+    async def _stream_chunks(self, model, prompt: str, **kwargs) -> AsyncIterator[str]:
+        if self.use_async_api and hasattr(model, "generate_content_async"):
+            response = await model.generate_content_async(prompt, stream=True, **kwargs)
+            chunks = response.__aiter__()
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                close = getattr(chunks, "aclose", None)
+                if close is not None:
+                    await close()
+            return
+
+        # Blocking client: iterate the stream in a worker thread and hand chunks back to the loop
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                    if stopped.is_set():
+                        # Nobody is reading any more; dropping the iterator ends the stream
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        producer = loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            await producer
+        finally:
+            stopped.set()
+
+    async def _run(self, method: str, start_call) -> Any:
+        started_at = await self._acquire(method)
+        call = asyncio.ensure_future(start_call())
+        ok = None
+        try:
+            # Shielded so a timeout doesn't drop the call while it still occupies the backend
+            result = await asyncio.wait_for(asyncio.shield(call), self.timeout)
+            metrics.inc(f"ai.{method}.calls")
+            ok = True
+            self._record_usage(result)
+            return result
+        except Exception as e:
+            ok = False
+            metrics.inc(f"ai.{method}.{'timeouts' if isinstance(e, asyncio.TimeoutError) else 'errors'}")
+            raise
+        finally:
+            # ok stays None when cancelled (e.g. a losing hedge)
+            if call.done():
+                self._release(method, started_at, ok)
+            else:
+                # Native async calls stop on cancel. A blocking call keeps its worker thread until the
+                # SDK returns (cancelling its future would only hide that), so its slot is freed then
+                if isinstance(call, asyncio.Task):
+                    call.cancel()
+                call.add_done_callback(lambda finished: self._release_abandoned(method, started_at, ok, finished))
+
+    def _release_abandoned(self, method: str, started_at: float, ok: Optional[bool], call: asyncio.Future):
+        if not call.cancelled():
+            # Retrieve the late outcome so it isn't logged as never retrieved
+            call.exception()
+        self._release(method, started_at, ok)
+
+    async def _acquire(self, method: str) -> float:
+        """Wait for a slot for this method, returning the time the call started"""
+        if self.breaker is not None:
+            self.breaker.before_call()
+        enqueued_at = time.perf_counter()
+        self._track(self._waiting, "waiting", method, 1)
+        try:
+            await self.scheduler.acquire(class_for(method))
+        except BaseException:
+            if self.breaker is not None:
+                # Never reached the backend; give back a half-open probe
+                self.breaker.record(None)
+            raise
+        finally:
+            self._track(self._waiting, "waiting", method, -1)
+
+        started_at = time.perf_counter()
+        metrics.observe(f"ai.{method}.queue_wait_seconds", started_at - enqueued_at)
+        self._track(self._in_flight, "in_flight", method, 1)
+        return started_at
+
+    def _release(self, method: str, started_at: float, ok: Optional[bool] = True):
+        """Free the call's slot; ok=None (cancelled or abandoned) feeds no latency or health sample"""
+        elapsed = time.perf_counter() - started_at
+        self._track(self._in_flight, "in_flight", method, -1)
+        if ok is not None:
+            metrics.observe(f"ai.{method}.call_seconds", elapsed)
+            metrics.observe(f"ai.tier.{self.name}.call_seconds", elapsed)
+            metrics.observe(f"ai.tier.{self.name}.{method}.call_seconds", elapsed)
+            if self.limiter is not None:
+                self.limiter.on_sample(elapsed, ok, self.scheduler.in_flight)
+        if self.breaker is not None:
+            self.breaker.record(ok)
+        self.scheduler.release()
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        # Per-method and per-user counts are kept by services.token_usage
+        metrics.inc(f"ai.tier.{self.name}.prompt_tokens", prompt_tokens)
+        metrics.inc(f"ai.tier.{self.name}.output_tokens", output_tokens)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,163 @@
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from services.metrics import metrics
+from services.model_executor import ModelExecutor
+from services.model_scheduler import AI_MAX_CONCURRENCY, OverloadedError
+
+load_dotenv()
+
+# Model routing configuration
+AI_TIER_DOWNGRADE_ENABLED = os.getenv("AI_TIER_DOWNGRADE_ENABLED", "true").lower() == "true"
+
+FAST, LARGE = "fast", "large"
+
+# Default (model, timeout seconds, max concurrency) for each tier.
+# Override with AI_<TIER>_MODEL / AI_<TIER>_TIMEOUT_SECONDS / AI_<TIER>_MAX_CONCURRENCY.
+DEFAULT_TIERS: Dict[str, Tuple[str, float, int]] = {
+    FAST: ("gemini-1.5-flash", 20, AI_MAX_CONCURRENCY),
+    LARGE: ("gemini-1.5-pro", 45, 16),
+}
+
+# Tier serving each service method; override with AI_MODEL_TIER_<METHOD>=fast|large
+METHOD_TIERS: Dict[str, str] = {
+    "chat_with_ai": FAST,
+    "summarize_chat": FAST,
+    "generate_health_recommendations": FAST,
+    "analyze_symptoms": LARGE,
+    "analyze_health_data": LARGE,
+    "generate_emergency_response": LARGE,
+    "warm_emergency_guidance": LARGE,
+}
+DEFAULT_TIER = FAST
+
+
+class ModelTier:
+    """A Gemini model together with the timeout and concurrency its calls get"""
+
+    def __init__(self, name: str, model_name: str, timeout: float, max_concurrency: int):
+        self.name = name
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+    @classmethod
+    def from_env(cls, name: str, default: Tuple[str, float, int]) -> "ModelTier":
+        model_name, timeout, max_concurrency = default
+        prefix = f"AI_{name.upper()}"
+        return cls(
+            name,
+            os.getenv(f"{prefix}_MODEL", model_name),
+            float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", timeout)),
+            int(os.getenv(f"{prefix}_MAX_CONCURRENCY", max_concurrency)),
+        )
+
+
+class ModelRouter:
+    """
+    Routes each service method to a model tier.
+
+    Every tier has its own executor, so its own slots, adaptive limit,
+    circuit breaker and timeout. When a call to the method's tier is
+    refused for overload (shed, queue full or breaker open), it is retried
+    on the fast tier instead: a lighter answer beats a 503. Calls that
+    already reached the model are never retried.
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, ModelTier]] = None, routes: Optional[Dict[str, str]] = None,
+                 downgrade: bool = AI_TIER_DOWNGRADE_ENABLED):
+        self.tiers = tiers or {name: ModelTier.from_env(name, default) for name, default in DEFAULT_TIERS.items()}
+        routes = routes or METHOD_TIERS
+        self.routes = {
+            method: os.getenv(f"AI_MODEL_TIER_{method.upper()}", tier) for method, tier in routes.items()
+        }
+        self.downgrade = downgrade
+        self.executors = {
+            name: ModelExecutor(name, capacity=tier.max_concurrency, timeout=tier.timeout)
+            for name, tier in self.tiers.items()
+        }
+        self._model_factory: Optional[Callable[[str], Any]] = None
+        self._models: Dict[str, Any] = {}
+
+    def configure(self, model_factory: Callable[[str], Any]):
+        """Set how models are built from their names (e.g. genai.GenerativeModel)"""
+        self._model_factory = model_factory
+        self._models = {}
+
+    def model(self, tier: str):
+        if tier not in self._models:
+            if self._model_factory is None:
+                raise RuntimeError("ModelRouter.configure() must be called before making model calls")
+            self._models[tier] = self._model_factory(self.tiers[tier].model_name)
+        return self._models[tier]
+
+    def tier_for(self, method: str) -> str:
+        tier = self.routes.get(method, DEFAULT_TIER)
+        return tier if tier in self.tiers else DEFAULT_TIER
+
+    def _candidates(self, method: str) -> List[str]:
+        tier = self.tier_for(method)
+        if self.downgrade and tier != FAST and FAST in self.tiers:
+            return [tier, FAST]
+        return [tier]
+
+    def _downgraded(self, method: str, tier: str, error: OverloadedError):
+        metrics.inc(f"ai.{method}.downgraded")
+        metrics.inc(f"ai.tier.{tier}.downgraded")
+        print(f"⚠️ {method} downgraded from the {tier} tier: {error}")
+
+    def check_admission(self, method: str):
+        """Raise OverloadedError if no tier available to this method would admit a call right now"""
+        candidates = self._candidates(method)
+        for tier in candidates:
+            try:
+                self.executors[tier].check_admission(method)
+                return
+            except OverloadedError:
+                if tier == candidates[-1]:
+                    raise
+
+    async def generate(self, method: str, prompt: str, **kwargs) -> Any:
+        """Generate content on the method's tier, falling back to the fast tier under overload"""
+        candidates = self._candidates(method)
+        for tier in candidates:
+            try:
+                return await self.executors[tier].generate(method, self.model(tier), prompt, **kwargs)
+            except OverloadedError as e:
+                if tier == candidates[-1]:
+                    raise
+                self._downgraded(method, tier, e)
+
+    async def stream(self, method: str, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Stream text chunks from the method's tier; only a stream refused before its first chunk is downgraded"""
+        candidates = self._candidates(method)
+        for tier in candidates:
+            started = False
+            try:
+                async for text in self.executors[tier].stream(method, self.model(tier), prompt, **kwargs):
+                    started = True
+                    yield text
+                return
+            except OverloadedError as e:
+                if started or tier == candidates[-1]:
+                    raise
+                self._downgraded(method, tier, e)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            name: {
+                "model": self.tiers[name].model_name,
+                "timeout": self.tiers[name].timeout,
+                **executor.scheduler.stats(),
+                "circuit": executor.breaker.stats() if executor.breaker is not None else None,
+            }
+            for name, executor in self.executors.items()
+        }
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown()
+
+
+# Shared per-process router
+model_router = ModelRouter()
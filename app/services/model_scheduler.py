@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict
+from dotenv import load_dotenv
+from services.metrics import metrics
+
+load_dotenv()
+
+# Scheduler configuration
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", os.getenv("AI_DEFAULT_CONCURRENCY", "32")))
+AI_QUEUE_MAX_SIZE = int(os.getenv("AI_QUEUE_MAX_SIZE", "200"))
+# Shed new non-emergency calls once this many are queued per model slot
+AI_SHED_QUEUE_RATIO = float(os.getenv("AI_SHED_QUEUE_RATIO", "2"))
+
+# Priority classes, most urgent first, with their share of model slots under contention
+PRIORITY_WEIGHTS: Dict[str, int] = {
+    "emergency": 32,
+    "symptoms": 16,
+    "chat": 8,
+    "health_data": 4,
+    "recommendations": 2,
+    "background": 1,
+}
+
+METHOD_CLASSES: Dict[str, str] = {
+    "generate_emergency_response": "emergency",
+    "analyze_symptoms": "symptoms",
+    "chat_with_ai": "chat",
+    "analyze_health_data": "health_data",
+    "generate_health_recommendations": "recommendations",
+    # Rolling chat summaries run after the reply was sent; nobody is waiting on them
+    "summarize_chat": "background",
+    # Pre-generated emergency guidance; requests are answered from the template meanwhile
+    "warm_emergency_guidance": "background",
+}
+
+
+# Never shed: a late emergency answer is worse than a slow one
+UNSHEDDABLE_CLASSES = {"emergency"}
+
+
+class OverloadedError(Exception):
+    """The model backend is saturated; the call was rejected without waiting"""
+
+
+class QueueFullError(OverloadedError):
+    """The priority class already has AI_QUEUE_MAX_<CLASS> calls waiting"""
+
+
+def class_for(method: str) -> str:
+    return METHOD_CLASSES.get(method, "background")
+
+
+class ModelScheduler:
+    """
+    Admits model calls into a shared pool of `capacity` slots.
+
+    Waiting calls are queued per priority class. A free slot goes to the
+    non-empty class with the lowest virtual time, which then advances by
+    1/weight (stride scheduling). Each class therefore gets slots in
+    proportion to its weight under contention, so an emergency waits behind
+    at most a few calls while bulk work still makes progress. Queues are
+    bounded per class; a full queue rejects with QueueFullError. Once the
+    total backlog reaches AI_SHED_QUEUE_RATIO times the capacity, new
+    non-emergency calls are shed with OverloadedError instead of queueing
+    into a timeout.
+    """
+
+    def __init__(self, capacity: int = AI_MAX_CONCURRENCY, weights: Dict[str, int] = None, name: str = "scheduler"):
+        self.name = name
+        self.capacity = capacity
+        self.weights = dict(weights or PRIORITY_WEIGHTS)
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in self.weights}
+        self._pass: Dict[str, float] = {name: 0.0 for name in self.weights}
+        self._virtual_time = 0.0
+        self.max_queue = {
+            name: int(os.getenv(f"AI_QUEUE_MAX_{name.upper()}", AI_QUEUE_MAX_SIZE)) for name in self.weights
+        }
+
+    def queue_depth(self, priority: str = None) -> int:
+        if priority is not None:
+            return len(self._queues[priority])
+        return sum(len(queue) for queue in self._queues.values())
+
+    def would_shed(self, priority: str) -> bool:
+        return priority not in UNSHEDDABLE_CLASSES and self.queue_depth() >= self.capacity * AI_SHED_QUEUE_RATIO
+
+    def check_admission(self, priority: str):
+        """Raise OverloadedError now if a call of this class would be rejected"""
+        if self.would_shed(priority):
+            metrics.inc(f"ai.{self.name}.class.{priority}.shed")
+            raise OverloadedError(f"Model backend overloaded; {priority} request shed")
+        if len(self._queues[priority]) >= self.max_queue[priority]:
+            metrics.inc(f"ai.{self.name}.class.{priority}.rejected")
+            raise QueueFullError(f"Too many queued {priority} model calls")
+
+    async def acquire(self, priority: str):
+        """Wait for a model slot for a call of the given priority class"""
+        enqueued_at = time.perf_counter()
+        if self.in_flight < self.capacity and not self.queue_depth():
+            self._grant(priority)
+        else:
+            self.check_admission(priority)
+            queue = self._queues[priority]
+            if not queue:
+                # A class going from idle to busy starts at the current virtual time, not with banked credit
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+            waiter = asyncio.get_running_loop().create_future()
+            queue.append(waiter)
+            self._publish(priority)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Slot was granted just as we were cancelled; hand it on
+                    self.release()
+                else:
+                    self._discard(priority, waiter)
+                raise
+        metrics.observe(f"ai.{self.name}.class.{priority}.queue_wait_seconds", time.perf_counter() - enqueued_at)
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def set_capacity(self, capacity: int):
+        """Resize the pool; extra slots are handed to waiting calls straight away"""
+        self.capacity = max(1, capacity)
+        metrics.set_gauge(f"ai.{self.name}.capacity", self.capacity)
+        self._dispatch()
+
+    def _grant(self, priority: str):
+        self.in_flight += 1
+        self._virtual_time = self._pass[priority]
+        self._pass[priority] += 1 / self.weights[priority]
+        metrics.set_gauge(f"ai.{self.name}.in_flight", self.in_flight)
+
+    def _dispatch(self):
+        while self.in_flight < self.capacity:
+            waiting = [name for name, queue in self._queues.items() if queue]
+            if not waiting:
+                break
+            priority = min(waiting, key=lambda name: self._pass[name])
+            waiter = self._queues[priority].popleft()
+            self._publish(priority)
+            if waiter.cancelled():
+                continue
+            self._grant(priority)
+            waiter.set_result(None)
+        metrics.set_gauge(f"ai.{self.name}.in_flight", self.in_flight)
+
+    def _discard(self, priority: str, waiter: asyncio.Future):
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            pass
+        self._publish(priority)
+
+    def _publish(self, priority: str):
+        metrics.set_gauge(f"ai.{self.name}.class.{priority}.queue_depth", len(self._queues[priority]))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": {name: len(queue) for name, queue in self._queues.items()},
+        }
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import aiofiles
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from uuid import uuid4
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, the single-process rule is up to the operator
+    fcntl = None
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from database.connection import connect_to_mongo, close_mongo_connection, get_notification_outbox_collection
+
+load_dotenv()
+
+# Outbox configuration
+# Mongo like the rest of the app (database.connection defaults to localhost); "file" to run without it
+N8N_OUTBOX_BACKEND = os.getenv("N8N_OUTBOX_BACKEND", "mongo")
+N8N_OUTBOX_PATH = os.getenv("N8N_OUTBOX_PATH", "n8n_outbox.jsonl")
+N8N_MAX_ATTEMPTS = int(os.getenv("N8N_MAX_ATTEMPTS", "8"))
+N8N_RETRY_BASE_SECONDS = float(os.getenv("N8N_RETRY_BASE_SECONDS", "5"))
+N8N_RETRY_MAX_SECONDS = float(os.getenv("N8N_RETRY_MAX_SECONDS", "900"))
+# How long a claimed event is hidden from other senders while its POST is in flight
+N8N_DELIVERY_LEASE_SECONDS = float(os.getenv("N8N_DELIVERY_LEASE_SECONDS", "60"))
+
+PENDING = "pending"
+DELIVERED = "delivered"
+DEAD = "dead"
+
+
+class OutboxLockedError(RuntimeError):
+    """The file outbox is held by another process"""
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts"""
+    delay = min(N8N_RETRY_MAX_SECONDS, N8N_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def new_record(payload: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {
+        "_id": str(uuid4()),
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now + timedelta(seconds=N8N_DELIVERY_LEASE_SECONDS),
+        "last_error": None,
+        "delivered_at": None
+    }
+
+
+def failure_update(record: Dict[str, Any], error: str) -> Dict[str, Any]:
+    """Fields to set on a record after a failed delivery attempt"""
+    attempts = record.get("attempts", 0) + 1
+    update = {"attempts": attempts, "last_error": error}
+    if attempts >= N8N_MAX_ATTEMPTS:
+        update["status"] = DEAD
+    else:
+        update["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=backoff_delay(attempts))
+    return update
+
+
+class MongoOutboxStore:
+    """Outbox kept in the notification_outbox collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        records = [new_record(payload) for payload in payloads]
+        if records:
+            await self.collection.insert_many(records, ordered=False)
+        return records
+
+    async def claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Lease up to `limit` due records to this caller.
+
+        Candidates are tagged with a fresh claim id by an update that
+        re-checks they are still due, then read back by that tag, so a record
+        another sender leased in between is never returned twice.
+        """
+        now = datetime.utcnow()
+        due = {"status": PENDING, "next_attempt_at": {"$lte": now}}
+        candidates = await self.collection.find(due, {"_id": 1}).sort("next_attempt_at", 1).limit(limit) \
+            .to_list(length=limit)
+        if not candidates:
+            return []
+        claim_id = str(uuid4())
+        await self.collection.update_many(
+            {**due, "_id": {"$in": [r["_id"] for r in candidates]}},
+            {"$set": {"claim_id": claim_id, "next_attempt_at": now + timedelta(seconds=N8N_DELIVERY_LEASE_SECONDS)}}
+        )
+        return await self.collection.find({"claim_id": claim_id}).to_list(length=limit)
+
+    async def mark_delivered(self, records: List[Dict[str, Any]]):
+        await self.collection.update_many(
+            {"_id": {"$in": [r["_id"] for r in records]}},
+            {"$set": {"status": DELIVERED, "delivered_at": datetime.utcnow()}}
+        )
+
+    async def mark_failed(self, records: List[Dict[str, Any]], error: str):
+        if records:
+            await self.collection.bulk_write(
+                [UpdateOne({"_id": r["_id"]}, {"$set": failure_update(r, error)}) for r in records],
+                ordered=False
+            )
+
+    async def replay(self, dead_only: bool = True) -> int:
+        query = {"status": DEAD} if dead_only else {"status": {"$in": [PENDING, DEAD]}}
+        result = await self.collection.update_many(
+            query,
+            {"$set": {"status": PENDING, "attempts": 0, "next_attempt_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+    def close(self):
+        pass
+
+    async def counts(self) -> Dict[str, int]:
+        pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        return {doc["_id"]: doc["count"] async for doc in self.collection.aggregate(pipeline)}
+
+
+class FileOutboxStore:
+    """
+    Append-only JSONL outbox for running without MongoDB.
+
+    Every state change is appended as an operation; the file is replayed into
+    memory on first use and compacted to the undelivered records. Compaction
+    writes a temporary file and swaps it in, so a crash leaves either the old
+    or the new log. The store is for a single process: leases live in memory
+    and concurrent writers would interleave their appends, so the first load
+    takes an exclusive lock on <path>.lock (held until close()) and a second
+    process gets OutboxLockedError instead of corrupting the log.
+    """
+
+    def __init__(self, path: str = N8N_OUTBOX_PATH):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._lock_file = None
+
+    def _acquire_file_lock(self):
+        if fcntl is None or self._lock_file is not None:
+            return
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise OutboxLockedError(f"{self.path} is in use by another process")
+        self._lock_file = lock_file
+
+    def close(self):
+        """Release the file lock; the next use reloads the log from disk"""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.records = {}
+        self._loaded = False
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()}
+
+    @staticmethod
+    def _decode(record: Dict[str, Any]) -> Dict[str, Any]:
+        for key in ("created_at", "next_attempt_at", "delivered_at"):
+            if record.get(key):
+                record[key] = datetime.fromisoformat(record[key])
+        return record
+
+    async def _load(self):
+        if self._loaded:
+            return
+        self._acquire_file_lock()
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        async with aiofiles.open(self.path, "r") as f:
+            async for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                if op["op"] == "put":
+                    record = self._decode(op["record"])
+                    self.records[record["_id"]] = record
+                elif op["op"] == "delivered":
+                    for record_id in op["ids"]:
+                        self.records.pop(record_id, None)
+        # Compact: rewrite only what still needs delivering, then atomically replace the log
+        compacted = f"{self.path}.tmp"
+        async with aiofiles.open(compacted, "w") as f:
+            for record in self.records.values():
+                await f.write(json.dumps({"op": "put", "record": self._encode(record)}) + "\n")
+            await f.flush()
+            os.fsync(f.fileno())
+        os.replace(compacted, self.path)
+
+    async def _append(self, ops: List[Dict[str, Any]]):
+        async with aiofiles.open(self.path, "a") as f:
+            await f.write("".join(json.dumps(op) + "\n" for op in ops))
+
+    async def _put(self, records: List[Dict[str, Any]]):
+        for record in records:
+            self.records[record["_id"]] = record
+        await self._append([{"op": "put", "record": self._encode(r)} for r in records])
+
+    async def add(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        async with self._lock:
+            await self._load()
+            records = [new_record(payload) for payload in payloads]
+            await self._put(records)
+            return records
+
+    async def claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        async with self._lock:
+            await self._load()
+            now = datetime.utcnow()
+            due = sorted(
+                (r for r in self.records.values() if r["status"] == PENDING and r["next_attempt_at"] <= now),
+                key=lambda r: r["next_attempt_at"]
+            )[:limit]
+            # Leases are only held in memory; after a restart everything pending is due
+            for record in due:
+                record["next_attempt_at"] = now + timedelta(seconds=N8N_DELIVERY_LEASE_SECONDS)
+            return [dict(r) for r in due]
+
+    async def mark_delivered(self, records: List[Dict[str, Any]]):
+        async with self._lock:
+            await self._load()
+            ids = [r["_id"] for r in records]
+            for record_id in ids:
+                self.records.pop(record_id, None)
+            await self._append([{"op": "delivered", "ids": ids}])
+
+    async def mark_failed(self, records: List[Dict[str, Any]], error: str):
+        async with self._lock:
+            await self._load()
+            updated = []
+            for record in records:
+                stored = self.records.get(record["_id"])
+                if stored is not None:
+                    stored.update(failure_update(stored, error))
+                    updated.append(stored)
+            await self._put(updated)
+
+    async def replay(self, dead_only: bool = True) -> int:
+        async with self._lock:
+            await self._load()
+            now = datetime.utcnow()
+            replayed = [
+                r for r in self.records.values()
+                if r["status"] == DEAD or (not dead_only and r["status"] == PENDING)
+            ]
+            for record in replayed:
+                record.update({"status": PENDING, "attempts": 0, "next_attempt_at": now})
+            await self._put(replayed)
+            return len(replayed)
+
+    async def counts(self) -> Dict[str, int]:
+        async with self._lock:
+            await self._load()
+            counts: Dict[str, int] = {}
+            for record in self.records.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            return counts
+
+
+_store = None
+
+
+def get_outbox_store():
+    """Get the outbox store for this process (Mongo unless N8N_OUTBOX_BACKEND=file or no database is connected)"""
+    global _store
+    if _store is None:
+        collection = get_notification_outbox_collection() if N8N_OUTBOX_BACKEND == "mongo" else None
+        _store = MongoOutboxStore(collection) if collection is not None else FileOutboxStore()
+    return _store
+
+
+async def _main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect and replay the n8n notification outbox")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="Move events back to pending so the app resends them")
+    replay_parser.add_argument("--all", action="store_true", help="Also reset backoff on pending events, not just dead ones")
+    subparsers.add_parser("status", help="Show event counts by status")
+    args = parser.parse_args(argv)
+
+    if N8N_OUTBOX_BACKEND == "mongo":
+        await connect_to_mongo()
+    store = get_outbox_store()
+    try:
+        if args.command == "replay":
+            count = await store.replay(dead_only=not args.all)
+            print(f"✅ Replayed {count} events")
+        else:
+            print(json.dumps(await store.counts()))
+    except OutboxLockedError as e:
+        # The running app owns the file and never re-reads it; stop it first or use the Mongo backend
+        print(f"❌ {e}: stop the app before replaying a file outbox")
+    finally:
+        store.close()
+        if N8N_OUTBOX_BACKEND == "mongo":
+            await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run from the app directory: python -m services.notification_outbox replay
+    asyncio.run(_main())
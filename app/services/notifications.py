@@ -1,8 +1,12 @@
+import asyncio
 import httpx
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
+from services.metrics import metrics
+from services.notification_outbox import get_outbox_store, N8N_MAX_ATTEMPTS
 
 load_dotenv()
 
@@ -10,6 +14,212 @@ load_dotenv()
 N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
 N8N_TIMEOUT = int(os.getenv("N8N_TIMEOUT", "30"))
 
+# Background dispatcher configuration
+N8N_QUEUE_MAX_SIZE = int(os.getenv("N8N_QUEUE_MAX_SIZE", "10000"))
+N8N_BATCH_MAX_SIZE = int(os.getenv("N8N_BATCH_MAX_SIZE", "50"))
+N8N_BATCH_WINDOW_SECONDS = float(os.getenv("N8N_BATCH_WINDOW_SECONDS", "1.0"))
+N8N_MAX_CONNECTIONS = int(os.getenv("N8N_MAX_CONNECTIONS", "10"))
+N8N_RETRY_POLL_SECONDS = float(os.getenv("N8N_RETRY_POLL_SECONDS", "10"))
+N8N_REPLAY_BATCH_SIZE = int(os.getenv("N8N_REPLAY_BATCH_SIZE", "200"))
+
+
+def _batch_payload(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "events": events,
+        "batch_timestamp": datetime.utcnow().isoformat(),
+        "total_events": len(events)
+    }
+
+
+class NotificationDispatcher:
+    """
+    Process-wide n8n dispatcher.
+
+    Request handlers only enqueue events; a background worker drains the queue,
+    coalescing events into notify_batch_events-style payloads once either
+    N8N_BATCH_MAX_SIZE events are waiting or N8N_BATCH_WINDOW_SECONDS has passed,
+    and posts them over a shared keep-alive client.
+
+    Each batch is written to the notification outbox before it is sent, so
+    failed deliveries are retried with exponential backoff (and dead-lettered
+    after N8N_MAX_ATTEMPTS) by a second worker that resends due events in bulk
+    batches of N8N_REPLAY_BATCH_SIZE. Events in the outbox survive restarts.
+
+    Events are only persisted when the worker takes them off the in-memory
+    queue. Anything still queued (up to one batch window's worth under normal
+    load, more when the outbox is slow) is lost if the process crashes;
+    stop() drains the queue on a clean shutdown.
+    """
+
+    def __init__(self, max_queue_size: int = N8N_QUEUE_MAX_SIZE, batch_size: int = N8N_BATCH_MAX_SIZE,
+                 batch_window: float = N8N_BATCH_WINDOW_SECONDS):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue: Optional[asyncio.Queue] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.retry_worker: Optional[asyncio.Task] = None
+        self.outbox = None
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None and not self.worker.done()
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=N8N_TIMEOUT,
+                limits=httpx.Limits(max_connections=N8N_MAX_CONNECTIONS, max_keepalive_connections=N8N_MAX_CONNECTIONS)
+            )
+        return self.client
+
+    def start(self):
+        """Start the background worker on the running event loop"""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.outbox = get_outbox_store()
+        self.worker = asyncio.create_task(self._run())
+        self.retry_worker = asyncio.create_task(self._retry_loop())
+        print("✅ n8n dispatcher started")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Flush what is queued (bounded by drain_timeout), then stop the worker and close the client"""
+        if self.running:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ n8n dispatcher stopped with {self.queue.qsize()} undelivered events")
+            for task in (self.worker, self.retry_worker):
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.worker = None
+        self.retry_worker = None
+        if self.outbox is not None:
+            self.outbox.close()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def enqueue(self, payload: Dict[str, Any]) -> bool:
+        """
+        Queue an event for delivery without waiting on n8n; returns False if it was dropped.
+
+        The event is held in memory only until the worker writes its batch to
+        the outbox, so it is not durable yet when this returns.
+        """
+        if not self.running:
+            self.start()
+        try:
+            self.queue.put_nowait((time.monotonic(), payload))
+        except asyncio.QueueFull:
+            metrics.inc("n8n.dropped")
+            return False
+        metrics.inc("n8n.enqueued")
+        metrics.set_gauge("n8n.queue_depth", self.queue.qsize())
+        return True
+
+    async def _next_batch(self) -> List[Tuple[float, Dict[str, Any]]]:
+        """Wait for one event, then gather more until the batch is full or the window closes"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                now = time.monotonic()
+                for enqueued_at, _ in batch:
+                    metrics.observe("n8n.queue_wait_seconds", now - enqueued_at)
+                records = await self.outbox.add([payload for _, payload in batch])
+                await self._deliver(records)
+            except Exception as e:
+                print(f"❌ n8n dispatcher error: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                metrics.set_gauge("n8n.queue_depth", self.queue.qsize())
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(N8N_RETRY_POLL_SECONDS)
+            try:
+                await self.drain_outbox()
+            except Exception as e:
+                print(f"❌ n8n outbox retry error: {e}")
+
+    async def drain_outbox(self) -> int:
+        """Resend due outbox events in bulk batches until none are due or a batch fails"""
+        sent = 0
+        while True:
+            records = await self.outbox.claim_due(N8N_REPLAY_BATCH_SIZE)
+            if not records:
+                break
+            metrics.inc("n8n.retried", len(records))
+            if not await self._deliver(records):
+                break
+            sent += len(records)
+        return sent
+
+    async def _deliver(self, records: List[Dict[str, Any]]) -> bool:
+        """POST outbox records as one payload and record the outcome; True when n8n accepted them"""
+        if not N8N_WEBHOOK_URL or not records:
+            return False
+        events = [record["payload"] for record in records]
+        body = events[0] if len(events) == 1 else _batch_payload(events)
+
+        try:
+            response = await self.get_client().post(N8N_WEBHOOK_URL, json=body)
+            error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+
+        if error is None:
+            await self.outbox.mark_delivered(records)
+            metrics.inc("n8n.delivered", len(records))
+            metrics.inc("n8n.batches")
+            now = datetime.utcnow()
+            for record in records:
+                metrics.observe("n8n.delivery_latency_seconds", (now - record["created_at"]).total_seconds())
+            return True
+
+        await self.outbox.mark_failed(records, error)
+        metrics.inc("n8n.failed", len(records))
+        metrics.inc("n8n.dead", sum(1 for r in records if r.get("attempts", 0) + 1 >= N8N_MAX_ATTEMPTS))
+        print(f"⚠️ n8n delivery failed for {len(records)} events: {error}")
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "enqueued": metrics.counters.get("n8n.enqueued", 0),
+            "delivered": metrics.counters.get("n8n.delivered", 0),
+            "failed": metrics.counters.get("n8n.failed", 0),
+            "dropped": metrics.counters.get("n8n.dropped", 0),
+            "retried": metrics.counters.get("n8n.retried", 0),
+            "dead": metrics.counters.get("n8n.dead", 0),
+            "delivery_latency": metrics.histogram("n8n.delivery_latency_seconds").snapshot(),
+        }
+
+
+# Shared per-process dispatcher
+dispatcher = NotificationDispatcher()
+
 async def notify_n8n(user_id: str, message: str, event_type: str = "general", metadata: Optional[Dict[str, Any]] = None):
     """
     Send notification to n8n webhook for workflow automation
@@ -32,15 +242,9 @@ async def notify_n8n(user_id: str, message: str, event_type: str = "general", me
         "metadata": metadata or {}
     }
 
-    try:
-        async with httpx.AsyncClient(timeout=N8N_TIMEOUT) as client:
-            response = await client.post(N8N_WEBHOOK_URL, json=payload)
-            if response.status_code == 200:
-                print(f"✅ Sent to n8n: {response.status_code} - {event_type}")
-            else:
-                print(f"⚠️ n8n webhook returned status: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Failed to send to n8n: {e}")
+    # Delivery happens on the background dispatcher, off the request path
+    if not dispatcher.enqueue(payload):
+        print(f"⚠️ n8n queue full, dropped event: {event_type}")
 
 async def notify_health_alert(user_id: str, alert_type: str, severity: str, details: str):
     """Send health alert to n8n workflow"""
@@ -140,19 +344,12 @@ async def notify_batch_events(events: list):
         print("⚠️ N8N_WEBHOOK_URL not configured")
         return
     
-    batch_payload = {
-        "events": events,
-        "batch_timestamp": datetime.utcnow().isoformat(),
-        "total_events": len(events)
-    }
-    
     try:
-        async with httpx.AsyncClient(timeout=N8N_TIMEOUT) as client:
-            response = await client.post(N8N_WEBHOOK_URL, json=batch_payload)
-            if response.status_code == 200:
-                print(f"✅ Sent batch to n8n: {response.status_code} - {len(events)} events")
-            else:
-                print(f"⚠️ n8n batch webhook returned status: {response.status_code}")
+        response = await dispatcher.get_client().post(N8N_WEBHOOK_URL, json=_batch_payload(events))
+        if response.status_code == 200:
+            print(f"✅ Sent batch to n8n: {response.status_code} - {len(events)} events")
+        else:
+            print(f"⚠️ n8n batch webhook returned status: {response.status_code}")
     except Exception as e:
         print(f"❌ Failed to send batch to n8n: {e}")
 
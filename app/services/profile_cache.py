@@ -0,0 +1,44 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from dotenv import load_dotenv
+from schema.user import UserResponse
+from services.cache import TTLCache
+
+load_dotenv()
+
+# Short-lived cache of authenticated users' profiles
+PROFILE_CACHE_MAX_SIZE = int(os.getenv("PROFILE_CACHE_MAX_SIZE", "10000"))
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+PROFILE_CACHE_ENABLED = os.getenv("PROFILE_CACHE_ENABLED", "true").lower() == "true"
+
+_profiles = TTLCache("user_profiles", PROFILE_CACHE_MAX_SIZE, PROFILE_CACHE_TTL_SECONDS)
+
+
+class CachedProfile(NamedTuple):
+    user: UserResponse
+    # Serialized once per cache fill; treat as read-only and copy before changing
+    data: Dict[str, Any]
+
+
+async def get_cached_profile(subject: str, loader: Callable[[str], Awaitable[Optional[Any]]]) -> Optional[CachedProfile]:
+    """Profile for a token subject (the user's id), read through the cache to `loader`"""
+    entry = _profiles.get(subject) if PROFILE_CACHE_ENABLED else None
+    if entry is not None:
+        return entry
+
+    user = await loader(subject)
+    if not user:
+        return None
+    if not isinstance(user, UserResponse):
+        user = UserResponse(**user)
+    entry = CachedProfile(user=user, data=dict(user.dict(), user_id=user.id))
+    if PROFILE_CACHE_ENABLED:
+        _profiles.set(subject, entry)
+    return entry
+
+
+def invalidate_profile(*subjects: str):
+    """Drop cached profiles, e.g. after the user updates them"""
+    for subject in subjects:
+        if subject:
+            _profiles.delete(subject)
@@ -0,0 +1,96 @@
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+from dotenv import load_dotenv
+from services.chat_context import estimate_tokens
+from services.metrics import metrics
+
+load_dotenv()
+
+# Prompt size configuration
+PROMPT_MAX_LIST_ITEMS = int(os.getenv("PROMPT_MAX_LIST_ITEMS", "20"))
+PROMPT_MAX_STRING_CHARS = int(os.getenv("PROMPT_MAX_STRING_CHARS", "1000"))
+# Characters per estimated token, matching services.chat_context.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+# Default whole-prompt budget in estimated tokens per method; override with PROMPT_BUDGET_<METHOD>
+DEFAULT_PROMPT_BUDGETS: Dict[str, int] = {
+    "analyze_symptoms": 1000,
+    "generate_health_recommendations": 1500,
+    "analyze_health_data": 2000,
+    "generate_emergency_response": 600,
+    "chat_with_ai": 2500,
+    "summarize_chat": 2500,
+}
+DEFAULT_PROMPT_BUDGET = 2000
+
+_TRUNCATED = "…"
+
+
+def budget_for(method: str) -> int:
+    return int(os.getenv(f"PROMPT_BUDGET_{method.upper()}", DEFAULT_PROMPT_BUDGETS.get(method, DEFAULT_PROMPT_BUDGET)))
+
+
+def clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - len(_TRUNCATED))] + _TRUNCATED
+
+
+def compact(value: Any, max_items: int = PROMPT_MAX_LIST_ITEMS, max_chars: int = PROMPT_MAX_STRING_CHARS) -> Any:
+    """
+    Shrink client-supplied data before it goes into a prompt.
+
+    Nulls, empty strings and empty lists/objects are dropped, lists keep
+    their first `max_items` entries plus a note of how many were cut, and
+    long strings are clipped. Returns None if nothing is left.
+    """
+    if isinstance(value, dict):
+        items = ((key, compact(item, max_items, max_chars)) for key, item in value.items())
+        value = {key: item for key, item in items if item is not None}
+    elif isinstance(value, (list, tuple, set)):
+        items = [item for item in (compact(item, max_items, max_chars) for item in value) if item is not None]
+        value = items[:max_items]
+        if len(items) > max_items:
+            value.append(f"(+{len(items) - max_items} more)")
+    elif isinstance(value, str):
+        value = clip(value.strip(), max_chars)
+    return None if value in (None, "", [], {}) else value
+
+
+def to_json(value: Any) -> str:
+    """Compact JSON for a prompt: no indentation or spaces, empty values dropped"""
+    value = compact(value)
+    return "None" if value is None else json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def format_list(items: Optional[Iterable[Any]], default: str = "None") -> str:
+    """Comma-separated list for a prompt, truncated like compact() does"""
+    items = compact(list(items or []))
+    return ", ".join(str(item) for item in items) if items else default
+
+
+def fit_prompt(method: str, template: str, **fields: Any) -> str:
+    """
+    Format `template` with `fields`, clipping them so the prompt fits the method's budget.
+
+    The template's own text is always kept. If the fields don't fit in what
+    is left, small fields keep their full text and the remaining space is
+    shared evenly by the larger ones.
+    """
+    values = {name: str(value) for name, value in fields.items()}
+    budget_chars = budget_for(method) * CHARS_PER_TOKEN
+    available = max(0, budget_chars - len(template.format(**{name: "" for name in values})))
+
+    if sum(len(value) for value in values.values()) > available:
+        metrics.inc(f"ai.{method}.prompt_clipped")
+        remaining = available
+        by_size = sorted(values, key=lambda name: len(values[name]))
+        for i, name in enumerate(by_size):
+            allowance = min(len(values[name]), remaining // (len(by_size) - i))
+            values[name] = clip(values[name], allowance)
+            remaining -= len(values[name])
+
+    prompt = template.format(**values)
+    metrics.observe(f"ai.{method}.prompt_tokens_estimate", estimate_tokens(prompt))
+    return prompt
@@ -0,0 +1,174 @@
+import math
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from pymongo import ReturnDocument
+from database.connection import get_rate_limits_collection
+from services.auth import verify_token
+from services.cache import TTLCache
+from services.metrics import metrics
+
+load_dotenv()
+
+# Admission control configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Default (requests, per seconds) for each AI method, per user and shared by everyone.
+# Override with RATE_LIMIT_USER_<METHOD> / RATE_LIMIT_GLOBAL_<METHOD>="requests/seconds".
+DEFAULT_LIMITS: Dict[str, Tuple[Tuple[int, float], Tuple[int, float]]] = {
+    "generate_emergency_response": ((30, 60), (600, 60)),
+    "analyze_symptoms": ((10, 60), (300, 60)),
+    "chat_with_ai": ((30, 60), (600, 60)),
+    "analyze_health_data": ((10, 60), (200, 60)),
+    "generate_health_recommendations": ((5, 60), (100, 60)),
+}
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+
+class RateLimit:
+    """Token bucket holding up to `capacity` requests, refilled evenly over `per_seconds`"""
+
+    def __init__(self, capacity: int, per_seconds: float):
+        self.capacity = capacity
+        self.per_seconds = per_seconds
+        self.rate = capacity / per_seconds
+
+    @classmethod
+    def from_env(cls, name: str, default: Tuple[int, float]) -> "RateLimit":
+        value = os.getenv(name)
+        if not value:
+            return cls(*default)
+        requests, _, seconds = value.partition("/")
+        return cls(int(requests), float(seconds or 1))
+
+
+class InMemoryBucketBackend:
+    """Buckets in process memory; limits apply per worker process"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        # An idle bucket is full again after per_seconds, so forgetting it then changes nothing
+        self._buckets = TTLCache("rate_limit_buckets", max_keys)
+
+    async def take(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key) or (limit.capacity, now)
+        tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / limit.rate
+        self._buckets.set(key, (tokens, now), ttl_seconds=limit.per_seconds)
+        return retry_after
+
+    async def refund(self, key: str, limit: RateLimit, cost: float = 1):
+        entry = self._buckets.get(key)
+        if entry is not None:
+            tokens, updated_at = entry
+            self._buckets.set(key, (min(limit.capacity, tokens + cost), updated_at), ttl_seconds=limit.per_seconds)
+
+
+class MongoBucketBackend:
+    """
+    Buckets in MongoDB, shared by every worker.
+
+    Each take is one atomic find_one_and_update running the refill and the
+    withdrawal as an update pipeline, so concurrent workers never race.
+    """
+
+    async def take(self, key: str, limit: RateLimit, cost: float = 1) -> float:
+        collection = get_rate_limits_collection()
+        if collection is None:
+            # Fail open: an unavailable limiter must not take the AI endpoints down
+            return 0.0
+        now = datetime.utcnow()
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [
+            limit.capacity,
+            {"$add": [{"$ifNull": ["$tokens", limit.capacity]}, {"$multiply": [elapsed, limit.rate]}]}
+        ]}
+        doc = await collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc["allowed"]:
+            return 0.0
+        return (cost - doc["tokens"]) / limit.rate
+
+    async def refund(self, key: str, limit: RateLimit, cost: float = 1):
+        collection = get_rate_limits_collection()
+        if collection is None:
+            return
+        await collection.update_one(
+            {"_id": key},
+            [{"$set": {"tokens": {"$min": [limit.capacity, {"$add": ["$tokens", cost]}]}}}]
+        )
+
+
+def _backend():
+    return MongoBucketBackend() if RATE_LIMIT_BACKEND == "mongo" else InMemoryBucketBackend()
+
+
+class RateLimiter:
+    """Per-user and per-method global token buckets in front of the AI endpoints"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or _backend()
+        self.limits: Dict[str, Tuple[RateLimit, RateLimit]] = {}
+
+    def limits_for(self, method: str) -> Tuple[RateLimit, RateLimit]:
+        if method not in self.limits:
+            user_default, global_default = DEFAULT_LIMITS.get(method, DEFAULT_LIMITS["chat_with_ai"])
+            self.limits[method] = (
+                RateLimit.from_env(f"RATE_LIMIT_USER_{method.upper()}", user_default),
+                RateLimit.from_env(f"RATE_LIMIT_GLOBAL_{method.upper()}", global_default),
+            )
+        return self.limits[method]
+
+    async def check(self, method: str, user: str):
+        """Admit one request or raise 429 with Retry-After"""
+        user_limit, global_limit = self.limits_for(method)
+        user_key = f"user:{method}:{user}"
+        # The user's own bucket first, so one abusive client can't drain the shared one
+        retry_after = await self.backend.take(user_key, user_limit)
+        if retry_after > 0:
+            self._reject(method, "user", retry_after)
+        retry_after = await self.backend.take(f"global:{method}", global_limit)
+        if retry_after > 0:
+            # Not admitted, so it mustn't count against the user's own quota
+            await self.backend.refund(user_key, user_limit)
+            self._reject(method, "global", retry_after)
+        metrics.inc(f"rate_limit.{method}.admitted")
+
+    @staticmethod
+    def _reject(method: str, scope: str, retry_after: float):
+        metrics.inc(f"rate_limit.{method}.{scope}_rejected")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many {method.replace('_', ' ')} requests; retry in {math.ceil(retry_after)}s",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+
+rate_limiter = RateLimiter()
+
+
+def rate_limit(method: str) -> Callable:
+    """FastAPI dependency admitting a request to the given AI method for the token's user"""
+    async def dependency(token: str = Depends(oauth2_scheme)):
+        if RATE_LIMIT_ENABLED:
+            await rate_limiter.check(method, verify_token(token))
+    return dependency
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from services.metrics import metrics
+
+
+class _Call:
+    """An in-flight call and how many callers are still waiting on it"""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls.
+
+    The first caller for a key starts the call in its own task; every caller,
+    the first included, awaits it through a shield, so cancelling any one of
+    them leaves the call running for the others. The call is only cancelled
+    once nobody is waiting on it any more. Leader and shared counts are
+    recorded as singleflight.<name>[.<label>].* metrics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def _count(self, outcome: str, label: Optional[str]):
+        metrics.inc(f"singleflight.{self.name}.{outcome}")
+        if label:
+            metrics.inc(f"singleflight.{self.name}.{label}.{outcome}")
+
+    def _forget(self, key: Hashable, entry: _Call):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]], label: Optional[str] = None) -> Any:
+        entry = self._calls.get(key)
+        if entry is not None:
+            self._count("shared", label)
+        else:
+            entry = _Call(asyncio.ensure_future(call()))
+            self._calls[key] = entry
+            entry.task.add_done_callback(lambda _: self._forget(key, entry))
+            self._count("leaders", label)
+
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                # Every caller gave up; later callers start a fresh call
+                self._forget(key, entry)
+                entry.task.cancel()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        leaders = metrics.counters.get(f"singleflight.{self.name}.leaders", 0)
+        shared = metrics.counters.get(f"singleflight.{self.name}.shared", 0)
+        total = leaders + shared
+        return {
+            "in_flight": len(self._calls),
+            "leaders": leaders,
+            "shared": shared,
+            "coalescing_ratio": round(shared / total, 4) if total else 0.0,
+        }
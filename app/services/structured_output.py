@@ -0,0 +1,165 @@
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, Type
+from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
+from services.metrics import metrics
+
+load_dotenv()
+
+# Structured output configuration
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "true").lower() == "true"
+STRUCTURED_OUTPUT_REPAIR_ATTEMPTS = int(os.getenv("STRUCTURED_OUTPUT_REPAIR_ATTEMPTS", "1"))
+STRUCTURED_OUTPUT_REPAIR_MAX_CHARS = int(os.getenv("STRUCTURED_OUTPUT_REPAIR_MAX_CHARS", "4000"))
+
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+_decoder = json.JSONDecoder()
+# The closing fence is optional: output cut off mid-answer still counts
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S | re.I)
+_PARTIAL_TRIM_ATTEMPTS = 5
+
+_json_mode = GEMINI_JSON_MODE
+_outcomes: Dict[str, Dict[str, int]] = {}
+
+
+class StructuredOutputError(Exception):
+    """The model did not produce a valid answer, even after repair attempts"""
+
+
+def _close_partial(text: str) -> str:
+    """Terminate an open string and close every open object/array of a cut-off JSON document"""
+    closers = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]" and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r"[,:]\s*$", "", text.rstrip())
+    return text + "".join(reversed(closers))
+
+
+def extract_json(text: str) -> Any:
+    """
+    Pull the JSON value out of a model reply.
+
+    Copes with markdown fences, prose before or after the JSON and output
+    that was cut off (open strings and brackets are closed, and a trailing
+    incomplete member is dropped). Raises ValueError if nothing parses.
+    """
+    text = (text or "").strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON found in model output")
+    text = text[min(starts):]
+
+    try:
+        return _decoder.raw_decode(text)[0]
+    except ValueError:
+        pass
+
+    candidate = text
+    for _ in range(_PARTIAL_TRIM_ATTEMPTS):
+        try:
+            return json.loads(_close_partial(candidate))
+        except ValueError:
+            cut = candidate.rfind(",")
+            if cut <= 0:
+                break
+            candidate = candidate[:cut]
+    raise ValueError("Model output is not valid JSON")
+
+
+def parse(text: str, schema: Type[BaseModel]) -> Dict[str, Any]:
+    data = extract_json(text)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return schema.parse_obj(data).dict()
+
+
+def _repair_prompt(text: str, schema: Type[BaseModel], error: Exception) -> str:
+    return f"""
+        The reply below should have been a single JSON object matching the schema, but it is invalid.
+
+        ERROR: {error}
+
+        SCHEMA:
+        {schema.schema_json()}
+
+        REPLY:
+        {text[:STRUCTURED_OUTPUT_REPAIR_MAX_CHARS]}
+
+        Respond with only the corrected JSON object.
+        """
+
+
+def _record(method: str, outcome: str):
+    counts = _outcomes.setdefault(method, {"ok": 0, "repaired": 0, "fallback": 0})
+    counts[outcome] += 1
+    metrics.inc(f"ai.{method}.structured.{outcome}")
+    metrics.set_gauge(f"ai.{method}.structured.fallback_rate", counts["fallback"] / sum(counts.values()))
+
+
+async def _call(generate: Callable[..., Awaitable[Any]], prompt: str) -> Any:
+    global _json_mode
+    if not _json_mode:
+        return await generate(prompt)
+    try:
+        return await generate(prompt, generation_config=JSON_GENERATION_CONFIG)
+    except (TypeError, ValueError) as e:
+        if "response_mime_type" not in str(e):
+            raise
+        # Installed SDK predates JSON mode; rely on the prompt and tolerant parsing
+        print(f"⚠️ Gemini JSON mode unavailable, falling back to prompt-only JSON: {e}")
+        _json_mode = False
+        return await generate(prompt)
+
+
+async def generate_structured(generate: Callable[..., Awaitable[Any]], prompt: str,
+                              schema: Type[BaseModel], method: str) -> Dict[str, Any]:
+    """
+    Generate a JSON answer and validate it against a Pydantic schema.
+
+    `generate(prompt, **kwargs)` must return a response with `.text`. JSON
+    mode is requested when the SDK supports it; invalid answers get up to
+    STRUCTURED_OUTPUT_REPAIR_ATTEMPTS repair round trips before giving up
+    with StructuredOutputError, so callers can use their fallback payload.
+    """
+    attempt_prompt = prompt
+    error: Exception = None
+    for attempt in range(1 + STRUCTURED_OUTPUT_REPAIR_ATTEMPTS):
+        response = await _call(generate, attempt_prompt)
+        text = ""
+        try:
+            # .text itself raises ValueError when the answer was blocked
+            text = response.text
+            result = parse(text, schema)
+        except (ValueError, ValidationError) as e:
+            error = e
+            attempt_prompt = _repair_prompt(text, schema, e)
+            continue
+        _record(method, "ok" if attempt == 0 else "repaired")
+        return result
+
+    _record(method, "fallback")
+    raise StructuredOutputError(f"No valid {schema.__name__} from the model: {error}")
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {method: dict(counts) for method, counts in _outcomes.items()}
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from database.connection import connect_to_mongo, close_mongo_connection, get_ai_usage_collection
+from services.chat_context import estimate_tokens
+from services.metrics import metrics
+
+load_dotenv()
+
+# Token accounting configuration
+AI_USAGE_ENABLED = os.getenv("AI_USAGE_ENABLED", "true").lower() == "true"
+AI_USAGE_FLUSH_SECONDS = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "10"))
+
+
+def _usage_id(user_id: str, method: str, day: datetime) -> Dict[str, Any]:
+    # Key order matters for equality on an embedded-document _id
+    return {"user_id": user_id, "method": method, "day": day}
+
+
+def _response_text(response) -> str:
+    try:
+        return response.text or ""
+    except (AttributeError, ValueError):
+        # Blocked or empty candidates have no text
+        return ""
+
+
+class UsageRecorder:
+    """
+    Counts prompt and output tokens per call, method and user.
+
+    Counts come from Gemini's usage_metadata, or from the prompt and reply
+    text (services.chat_context.estimate_tokens) when the response has none,
+    e.g. streamed replies. Every call updates the ai.<method> token metrics
+    straight away; per-user daily totals are aggregated in memory and
+    upserted into ai_usage every AI_USAGE_FLUSH_SECONDS.
+    """
+
+    def __init__(self, flush_seconds: float = AI_USAGE_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self.pending: Dict[tuple, Dict[str, int]] = {}
+        self.worker: Optional[asyncio.Task] = None
+
+    def record(self, method: str, user_id: Optional[str], prompt: str, response=None,
+               output_text: Optional[str] = None):
+        if not AI_USAGE_ENABLED:
+            return
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        else:
+            prompt_tokens = estimate_tokens(prompt)
+            output_tokens = estimate_tokens(output_text if output_text is not None else _response_text(response))
+            metrics.inc(f"ai.{method}.usage_estimated")
+
+        metrics.inc(f"ai.{method}.prompt_tokens", prompt_tokens)
+        metrics.inc(f"ai.{method}.output_tokens", output_tokens)
+        metrics.observe(f"ai.{method}.prompt_tokens_per_call", prompt_tokens)
+
+        now = datetime.utcnow()
+        key = (str(user_id or "unknown"), method, datetime(now.year, now.month, now.day))
+        delta = self.pending.setdefault(key, {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "estimated_calls": 0})
+        delta["calls"] += 1
+        delta["prompt_tokens"] += prompt_tokens
+        delta["output_tokens"] += output_tokens
+        delta["estimated_calls"] += usage is None
+
+    async def flush(self) -> int:
+        """Upsert the pending totals; returns how many usage documents were touched"""
+        collection = get_ai_usage_collection()
+        if collection is None or not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        now = datetime.utcnow()
+        updates = [
+            UpdateOne(
+                {"_id": _usage_id(*key)},
+                {
+                    "$inc": delta,
+                    "$setOnInsert": {"user_id": key[0], "method": key[1], "day": key[2]},
+                    "$set": {"updated_at": now}
+                },
+                upsert=True
+            )
+            for key, delta in pending.items()
+        ]
+        try:
+            await collection.bulk_write(updates, ordered=False)
+        except Exception as e:
+            # Keep the totals for the next flush rather than losing them
+            for key, delta in pending.items():
+                merged = self.pending.setdefault(key, dict.fromkeys(delta, 0))
+                for field, value in delta.items():
+                    merged[field] += value
+            print(f"⚠️ Failed to write AI usage: {e}")
+            return 0
+        return len(updates)
+
+    def start(self):
+        if self.worker is None:
+            self.worker = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+
+async def usage_summary(days: int = 7, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Token totals per method over the last `days` days, biggest spender first"""
+    collection = get_ai_usage_collection()
+    if collection is None:
+        return []
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    match: Dict[str, Any] = {"day": {"$gte": today - timedelta(days=days - 1)}}
+    if user_id:
+        match["user_id"] = user_id
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$method",
+            "calls": {"$sum": "$calls"},
+            "prompt_tokens": {"$sum": "$prompt_tokens"},
+            "output_tokens": {"$sum": "$output_tokens"},
+            "users": {"$addToSet": "$user_id"}
+        }},
+        {"$project": {
+            "method": "$_id", "_id": 0, "calls": 1, "prompt_tokens": 1, "output_tokens": 1,
+            "users": {"$size": "$users"}
+        }},
+        {"$sort": {"prompt_tokens": -1}}
+    ]
+    return await collection.aggregate(pipeline).to_list(length=None)
+
+
+usage_recorder = UsageRecorder()
+
+
+async def _main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AI token usage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Token totals per method")
+    report_parser.add_argument("--days", type=int, default=7, help="How many days back, today included")
+    report_parser.add_argument("--user", help="Only this user id")
+    args = parser.parse_args(argv)
+
+    await connect_to_mongo()
+    try:
+        for row in await usage_summary(args.days, args.user):
+            print(row)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    # Run from the app directory: python -m services.token_usage report --days 7
+    asyncio.run(_main())
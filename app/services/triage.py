@@ -0,0 +1,271 @@
+import re
+from typing import Dict, Any, List, Optional
+
+# Red-flag concepts and the phrases that express them (matched on normalized text).
+# Phrases must be specific on their own: a generic word ("poisoning", "choking", "fainted")
+# either goes or becomes a concept that only counts together with another one.
+RED_FLAG_PHRASES: Dict[str, List[str]] = {
+    "chest_pain": [
+        "chest pain", "chest pains", "chest tightness", "tight chest", "chest pressure", "pressure in my chest",
+        "crushing chest", "pain in my chest", "heart pain"
+    ],
+    "shortness_of_breath": [
+        "shortness of breath", "short of breath", "breathless", "trouble breathing", "difficulty breathing",
+        "hard to breathe", "out of breath"
+    ],
+    "cannot_breathe": [
+        "cant breathe", "cannot breathe", "unable to breathe", "gasping for air", "blue lips",
+        "lips turning blue", "struggling to breathe"
+    ],
+    # Only counts together with chest pain
+    "radiating_pain": [
+        "left arm pain", "pain in left arm", "pain in my left arm", "pain spreading to my arm",
+        "pain spreading to my jaw", "pain radiating"
+    ],
+    # Only counts together with chest pain
+    "cold_sweat": ["cold sweat", "cold sweats", "sweating profusely", "cold and clammy"],
+    "face_droop": [
+        "face drooping", "facial droop", "face droop", "drooping face", "face is drooping",
+        "one side of my face is drooping", "one side of my face drooping"
+    ],
+    "slurred_speech": ["slurred speech", "slurring my words", "slurring his words", "slurring her words"],
+    "one_sided_weakness": [
+        "one sided weakness", "weakness on one side", "numbness on one side", "sudden numbness",
+        "suddenly cant move my arm", "suddenly cannot move my arm", "suddenly cant move my leg",
+        "suddenly cannot move my leg"
+    ],
+    "thunderclap_headache": [
+        "worst headache of my life", "worst headache ever", "thunderclap headache", "sudden severe headache"
+    ],
+    "stiff_neck": ["stiff neck", "neck stiffness"],
+    "fever": ["fever", "high temperature", "febrile"],
+    "unconscious": [
+        "unconscious", "unresponsive", "loss of consciousness", "wont wake up", "cant wake him", "cant wake her",
+        "cannot wake him", "cannot wake her"
+    ],
+    # A faint is only an emergency when it is happening now; see "onset_now"
+    "fainting": ["fainted", "fainting", "passed out", "blacked out"],
+    "onset_now": ["just now", "right now", "minutes ago", "keeps happening", "keep happening", "again and again"],
+    "seizure": ["seizure", "seizures", "convulsion", "convulsions", "convulsing"],
+    "anaphylaxis": [
+        "throat swelling", "throat closing", "throat is closing", "throat is swelling", "swollen throat", "swollen tongue", "tongue swelling",
+        "lips swelling", "swollen lips", "anaphylaxis", "anaphylactic"
+    ],
+    "severe_bleeding": [
+        "severe bleeding", "heavy bleeding", "bleeding heavily", "wont stop bleeding", "bleeding wont stop",
+        "vomiting blood", "coughing up blood", "blood in vomit"
+    ],
+    "self_harm": [
+        "suicidal", "kill myself", "end my life", "want to die", "self harm", "harm myself",
+        "want to hurt myself", "going to hurt myself", "hurt myself on purpose", "thoughts of suicide",
+        "thinking about suicide", "commit suicide"
+    ],
+    "overdose": [
+        "overdose", "overdosed", "took too many pills", "swallowed too many pills", "swallowed poison",
+        "drank poison", "drank bleach", "swallowed bleach"
+    ],
+}
+
+# Presentations, most serious first: (emergency type, concepts that must all be present, any-of concepts)
+RED_FLAG_RULES: List[tuple] = [
+    ("heart attack", {"chest_pain"}, {"shortness_of_breath", "cannot_breathe", "radiating_pain", "cold_sweat"}),
+    ("stroke", set(), {"face_droop", "slurred_speech", "one_sided_weakness"}),
+    ("severe allergic reaction", {"anaphylaxis"}, set()),
+    ("difficulty breathing", {"cannot_breathe"}, set()),
+    ("unconsciousness", {"unconscious"}, set()),
+    ("unconsciousness", {"fainting", "onset_now"}, set()),
+    ("seizure", {"seizure"}, set()),
+    ("severe bleeding", {"severe_bleeding"}, set()),
+    ("poisoning or overdose", {"overdose"}, set()),
+    ("suicidal thoughts", {"self_harm"}, set()),
+    ("meningitis", {"stiff_neck", "fever"}, set()),
+    ("sudden severe headache", {"thunderclap_headache"}, set()),
+]
+
+# Offline guidance per emergency type, in the generate_emergency_response shape
+EMERGENCY_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "heart attack": {
+        "immediate_actions": [
+            "Call emergency services (911) now", "Stop all activity and sit or lie down",
+            "Chew one regular aspirin unless allergic or told not to by a doctor", "Loosen tight clothing"
+        ],
+        "warning_signs": ["Chest pain or pressure", "Pain spreading to arm, jaw or back", "Shortness of breath", "Cold sweat"],
+        "do_not_do": ["Don't drive yourself to hospital", "Don't wait to see if symptoms pass"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "stroke": {
+        "immediate_actions": [
+            "Call emergency services (911) now", "Note the time symptoms started",
+            "Lie down with head slightly raised", "Stay with the person"
+        ],
+        "warning_signs": ["Face drooping", "Arm weakness", "Speech difficulty", "Sudden confusion or vision loss"],
+        "do_not_do": ["Don't give food, drink or medication", "Don't let the person go to sleep instead of getting help"],
+        "when_to_call_emergency": "Immediately; every minute matters",
+    },
+    "severe allergic reaction": {
+        "immediate_actions": [
+            "Use an epinephrine auto-injector if available", "Call emergency services (911) now",
+            "Lie down with legs raised, or sit up if breathing is hard"
+        ],
+        "warning_signs": ["Swelling of throat, tongue or lips", "Wheezing", "Hives", "Dizziness or fainting"],
+        "do_not_do": ["Don't stand up suddenly", "Don't rely on antihistamines alone"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "difficulty breathing": {
+        "immediate_actions": [
+            "Call emergency services (911) now", "Sit upright and stay as calm as possible",
+            "Use prescribed rescue inhaler if you have one"
+        ],
+        "warning_signs": ["Blue lips or face", "Unable to speak in full sentences", "Confusion or drowsiness"],
+        "do_not_do": ["Don't lie flat", "Don't wait for it to improve"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "unconsciousness": {
+        "immediate_actions": [
+            "Call emergency services (911) now", "Check breathing", "Start CPR if not breathing",
+            "Place in recovery position if breathing"
+        ],
+        "warning_signs": ["No response to voice or touch", "Abnormal or no breathing"],
+        "do_not_do": ["Don't give anything by mouth", "Don't leave the person alone"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "seizure": {
+        "immediate_actions": [
+            "Clear the area of hard or sharp objects", "Cushion the head", "Time the seizure",
+            "Turn on their side once movements stop"
+        ],
+        "warning_signs": ["Seizure longer than 5 minutes", "Repeated seizures", "Injury or trouble breathing afterwards"],
+        "do_not_do": ["Don't hold the person down", "Don't put anything in their mouth"],
+        "when_to_call_emergency": "If it lasts over 5 minutes, repeats, or it is a first seizure",
+    },
+    "severe bleeding": {
+        "immediate_actions": [
+            "Call emergency services (911) now", "Apply firm direct pressure with a clean cloth",
+            "Keep pressure on and add layers if blood soaks through"
+        ],
+        "warning_signs": ["Blood spurting or soaking through dressings", "Pale, cold skin", "Confusion or fainting"],
+        "do_not_do": ["Don't remove embedded objects", "Don't lift the dressing to check"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "poisoning or overdose": {
+        "immediate_actions": [
+            "Call emergency services (911) or Poison Control (1-800-222-1222)",
+            "Keep the container or pills to show responders", "Stay with the person"
+        ],
+        "warning_signs": ["Drowsiness or unresponsiveness", "Slow or irregular breathing", "Seizures"],
+        "do_not_do": ["Don't induce vomiting unless told to", "Don't give food or drink"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "suicidal thoughts": {
+        "immediate_actions": [
+            "Call or text 988 (Suicide & Crisis Lifeline) or emergency services now",
+            "Stay with someone you trust", "Move away from anything you could use to hurt yourself"
+        ],
+        "warning_signs": ["A plan or means to self-harm", "Feeling there is no way out"],
+        "do_not_do": ["Don't stay alone", "Don't use alcohol or drugs"],
+        "when_to_call_emergency": "Now; you don't have to go through this alone",
+    },
+    "meningitis": {
+        "immediate_actions": ["Call emergency services (911) or go to the emergency department now"],
+        "warning_signs": ["Stiff neck with fever", "Rash that doesn't fade under pressure", "Confusion", "Sensitivity to light"],
+        "do_not_do": ["Don't wait for a rash to appear"],
+        "when_to_call_emergency": "Immediately",
+    },
+    "sudden severe headache": {
+        "immediate_actions": ["Call emergency services (911) now", "Rest lying down until help arrives"],
+        "warning_signs": ["Headache peaking within a minute", "Vomiting", "Confusion", "Neck stiffness"],
+        "do_not_do": ["Don't take blood thinners such as aspirin", "Don't drive yourself"],
+        "when_to_call_emergency": "Immediately",
+    },
+}
+
+for _template in EMERGENCY_TEMPLATES.values():
+    _template.setdefault("emergency_contacts", ["911", "Local emergency services"])
+    _template.setdefault("preparation_steps", ["Unlock the door for responders", "Have a list of current medications ready"])
+
+# One alternation over every phrase; each concept is a named group, so a single scan finds them all
+_PATTERN = re.compile(
+    "|".join(
+        f"(?P<{concept}>\\b(?:{'|'.join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))})\\b)"
+        for concept, phrases in RED_FLAG_PHRASES.items()
+    )
+)
+# Before a mention: "no chest pain", "never had a seizure", "history of seizures"
+_NEGATION = re.compile(r"\b(?:no|not|without|denies|denied|never|history of)\s+(?:\w+\s+){0,2}$")
+# After a mention: "stroke ruled out", "seizures as a child", "chest pain that went away"
+# (but "chest pain since last year" is still ongoing)
+_RESOLVED = re.compile(
+    r"^\s+(?:(?!since\b)\w+\s+){0,3}?(?:(?:was|were|has been|have been|been)\s+)?"
+    r"(?:ruled out|excluded|resolved|went away|gone away|is gone|years ago|months ago|last year|as a child|in the past)\b"
+)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop apostrophes ("can't" -> "cant") and collapse punctuation to spaces"""
+    text = text.lower().replace("'", "").replace("’", "")
+    return " ".join(re.sub(r"[^a-z0-9\s]", " ", text).split())
+
+
+def find_red_flags(text: str) -> List[str]:
+    """
+    Red-flag concepts mentioned in text.
+
+    Skips negated mentions ("no chest pain", "history of seizures") and ones
+    described as over ("chest pain that went away", "stroke ruled out").
+    """
+    normalized = normalize(text)
+    found = []
+    for match in _PATTERN.finditer(normalized):
+        if _NEGATION.search(normalized[max(0, match.start() - 30):match.start()]):
+            continue
+        if _RESOLVED.search(normalized[match.end():match.end() + 40]):
+            continue
+        if match.lastgroup not in found:
+            found.append(match.lastgroup)
+    return found
+
+
+def triage(symptoms: str) -> Optional[Dict[str, Any]]:
+    """
+    Classify a complaint as a red-flag emergency without calling the model.
+
+    Returns the matched emergency types (most serious first) and the concepts
+    behind them, or None when nothing needs an immediate response.
+    """
+    flags = set(find_red_flags(symptoms))
+    emergencies = []
+    for emergency_type, required, any_of in RED_FLAG_RULES:
+        if required <= flags and (not any_of or any_of & flags) and emergency_type not in emergencies:
+            emergencies.append(emergency_type)
+    if not emergencies:
+        return None
+    return {"emergency_types": emergencies, "red_flags": sorted(flags)}
+
+
+def emergency_guidance(emergency_type: str) -> Optional[Dict[str, Any]]:
+    """A fresh copy of the offline guidance for an emergency type, or None if there is no template"""
+    template = EMERGENCY_TEMPLATES.get((emergency_type or "").strip().lower())
+    return {key: list(value) if isinstance(value, list) else value for key, value in template.items()} if template else None
+
+
+def triage_response(result: Dict[str, Any], guidance: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """An analyze_symptoms-shaped, high-urgency answer from the given guidance or the emergency templates"""
+    # Model-generated guidance may omit fields; the template fills the gaps
+    guidance = {**emergency_guidance(result["emergency_types"][0]), **(guidance or {})}
+    return {
+        "possible_conditions": [f"Possible {emergency_type}" for emergency_type in result["emergency_types"]],
+        "recommendations": guidance["immediate_actions"],
+        "urgency_level": "high",
+        "suggested_tests": ["Emergency medical evaluation"],
+        "lifestyle_advice": [],
+        "warning_signs": guidance["warning_signs"],
+        "when_to_seek_help": guidance["when_to_call_emergency"],
+        "confidence_level": "rule-based",
+        "emergency_guidance": guidance,
+        "triage": {
+            "source": "red_flag_rules",
+            "emergency_types": result["emergency_types"],
+            "red_flags": result["red_flags"],
+            "detailed_analysis": "pending"
+        }
+    }
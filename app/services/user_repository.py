@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from database.connection import get_users_collection
+from models.user import User
+
+# Never hand the password hash out of the repository except for login
+PUBLIC_PROJECTION = {"hashed_password": 0}
+LOGIN_PROJECTION = {"_id": 1, "email": 1, "username": 1, "hashed_password": 1, "is_active": 1}
+
+
+def _collection():
+    collection = get_users_collection()
+    if collection is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="User storage unavailable")
+    return collection
+
+
+def _with_id(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if doc is None:
+        return None
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+def _subject_query(subject: str) -> Optional[Dict[str, Any]]:
+    # Tokens carry the user's immutable _id; anything else (e.g. a token signed before that) matches nobody
+    return {"_id": ObjectId(subject)} if ObjectId.is_valid(subject) else None
+
+
+async def create_user(fields: Dict[str, Any], hashed_password: str) -> Dict[str, Any]:
+    """Insert a new user and return its public fields; 400 if the email or username is taken"""
+    user = User(**fields, hashed_password=hashed_password)
+    doc = user.dict(by_alias=True)
+    try:
+        await _collection().insert_one(doc)
+    except DuplicateKeyError as e:
+        key = next(iter((e.details or {}).get("keyPattern", {"email": 1})))
+        raise HTTPException(status_code=400, detail=f"{key.capitalize()} already registered")
+    doc.pop("hashed_password")
+    return _with_id(doc)
+
+
+async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    return _with_id(await _collection().find_one({"email": email}, PUBLIC_PROJECTION))
+
+
+async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
+    return _with_id(await _collection().find_one({"username": username}, PUBLIC_PROJECTION))
+
+
+async def get_user_by_subject(subject: str) -> Optional[Dict[str, Any]]:
+    """Public profile for a token subject (the user's id)"""
+    query = _subject_query(subject)
+    if query is None:
+        return None
+    return _with_id(await _collection().find_one(query, PUBLIC_PROJECTION))
+
+
+async def get_login_user(email: str) -> Optional[Dict[str, Any]]:
+    """The minimal document needed to check a login, including the password hash"""
+    return _with_id(await _collection().find_one({"email": email}, LOGIN_PROJECTION))
+
+
+async def update_password_hash(user_id: str, hashed_password: str):
+    await _collection().update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"hashed_password": hashed_password, "updated_at": datetime.utcnow()}}
+    )
+
+
+async def update_user(subject: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Apply profile changes and return the updated public profile"""
+    query = _subject_query(subject)
+    if query is None:
+        return None
+    doc = await _collection().find_one_and_update(
+        query,
+        {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        projection=PUBLIC_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    return _with_id(doc)
@@ -0,0 +1,52 @@
+import pytest
+
+from services import adaptive_limit
+from services.adaptive_limit import AIMDLimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(adaptive_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_fast_calls_at_the_limit_grow_it_by_about_one_per_limit(clock):
+    changes = []
+    limit = AIMDLimit("test_aimd_grow", initial=4, min_limit=2, max_limit=10, latency_target=1.0,
+                      on_change=changes.append)
+    for _ in range(4):
+        limit.on_sample(0.1, True, in_flight=4)
+    assert changes == []
+    limit.on_sample(0.1, True, in_flight=4)
+    assert changes == [5]
+
+
+def test_fast_calls_below_the_limit_leave_it_alone(clock):
+    limit = AIMDLimit("test_aimd_idle", initial=4, min_limit=2, max_limit=10, latency_target=1.0)
+    for _ in range(100):
+        limit.on_sample(0.1, True, in_flight=1)
+    assert int(limit.limit) == 4
+
+
+def test_slow_or_failed_calls_back_off_once_per_cooldown(clock):
+    changes = []
+    limit = AIMDLimit("test_aimd_backoff", initial=16, min_limit=2, max_limit=32, latency_target=1.0,
+                      backoff=0.5, on_change=changes.append)
+    limit.on_sample(5.0, True, in_flight=16)
+    limit.on_sample(0.1, False, in_flight=16)
+    assert changes == [8]
+    clock[0] += adaptive_limit.AI_ADAPTIVE_DECREASE_COOLDOWN_SECONDS
+    limit.on_sample(0.1, False, in_flight=8)
+    assert changes == [8, 4]
+
+
+def test_limit_stays_within_bounds(clock):
+    limit = AIMDLimit("test_aimd_bounds", initial=3, min_limit=2, max_limit=3, latency_target=1.0, backoff=0.1)
+    for _ in range(50):
+        limit.on_sample(0.1, True, in_flight=3)
+    assert limit.limit == 3
+    for _ in range(5):
+        clock[0] += 60
+        limit.on_sample(0.1, False, in_flight=3)
+    assert limit.limit == 2
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+import numpy as np
+from services.anomaly_detection import detect, ewma_zscores, rolling_zscores, ANOMALY_MIN_HISTORY
+
+
+def _readings(heart_rates):
+    start = datetime(2024, 1, 1)
+    return [
+        {"date_recorded": start + timedelta(hours=i), "vital_signs": {"heart_rate": hr}}
+        for i, hr in enumerate(heart_rates)
+    ]
+
+
+def _brute_force_zscores(values, weights):
+    """Reference: weights[i][j] is how much reading j counts towards reading i's baseline"""
+    z = np.full(len(values), np.nan)
+    for i in range(len(values)):
+        w = np.array([weights(i, j) if not np.isnan(values[j]) else 0.0 for j in range(len(values))])
+        if np.count_nonzero(w) < ANOMALY_MIN_HISTORY:
+            continue
+        x = np.nan_to_num(values)
+        mean = (w @ x) / w.sum()
+        std = np.sqrt(max((w @ (x * x)) / w.sum() - mean * mean, 0))
+        if std > 0 and not np.isnan(values[i]):
+            z[i] = (values[i] - mean) / std
+    return z
+
+
+def test_rolling_and_ewma_match_the_weighted_definition():
+    rng = np.random.default_rng(1)
+    values = rng.normal(70, 4, 60)
+    values[rng.random(60) < 0.2] = np.nan
+    rolling = rolling_zscores(values[:, None], window=10)[:, 0]
+    ewma = ewma_zscores(values[:, None], alpha=0.3)[:, 0]
+    assert np.allclose(rolling, _brute_force_zscores(values, lambda i, j: 1.0 if 1 <= i - j <= 10 else 0.0),
+                       equal_nan=True)
+    assert np.allclose(ewma, _brute_force_zscores(values, lambda i, j: 0.7 ** (i - j - 1) if j < i else 0.0),
+                       equal_nan=True)
+
+
+def test_no_baseline_until_min_history():
+    z = rolling_zscores(np.array([[70.0], [72.0], [200.0]]))
+    assert np.isnan(z).all()
+
+
+def test_detect_flags_statistical_spike_in_new_readings_only():
+    readings = _readings([70, 72, 71, 69, 70, 73, 71, 70, 72, 95])
+    alerts = detect(readings, check_from=9)
+    assert [a["vital_sign"] for a in alerts] == ["heart_rate"]
+    assert alerts[0]["value"] == 95 and alerts[0]["status"] == "warning"
+    assert alerts[0]["date_recorded"] == readings[9]["date_recorded"]
+
+
+def test_detect_prefers_the_most_severe_then_most_recent():
+    readings = _readings([70, 71, 150, 110, 105])
+    alerts = detect(readings)
+    assert alerts[0]["status"] == "critical" and alerts[0]["value"] == 150
+
+
+def test_detect_ignores_baseline_rows_and_quiet_series():
+    assert detect(_readings([70, 150, 71, 72]), check_from=2) == []
+    assert detect(_readings([70, 71, 72, 71, 70, 72]), check_from=3) == []
+
+
+def test_detect_skips_readings_already_alerted_on():
+    readings = _readings([70, 72, 71, 69, 70, 73, 150, 71, 110])
+    assert detect(readings, check_from=6)[0]["value"] == 150
+    alerts = detect(readings, check_from=6, alerted_through={"heart_rate": readings[6]["date_recorded"]})
+    assert alerts[0]["value"] == 110
+    assert detect(readings, check_from=6, alerted_through={"heart_rate": readings[8]["date_recorded"]}) == []
+
+
+def test_ewma_long_series_with_strong_decay():
+    # Long enough that the decay powers are split into several blocks
+    rng = np.random.default_rng(2)
+    values = rng.normal(70, 4, 1500)
+    values[rng.random(1500) < 0.1] = np.nan
+    values[700] = 140.0
+    expected = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    x = np.nan_to_num(values)
+    weight_sum = weighted_x = weighted_x2 = 0.0
+    history = 0
+    for i in range(len(values)):
+        if history >= ANOMALY_MIN_HISTORY and valid[i]:
+            mean = weighted_x / weight_sum
+            variance = weighted_x2 / weight_sum - mean * mean
+            if variance > 0:
+                expected[i] = (values[i] - mean) / np.sqrt(variance)
+        weight_sum = 0.1 * weight_sum + valid[i]
+        weighted_x = 0.1 * weighted_x + x[i]
+        weighted_x2 = 0.1 * weighted_x2 + x[i] * x[i]
+        history += valid[i]
+    z = ewma_zscores(values[:, None], alpha=0.9)[:, 0]
+    assert np.allclose(z, expected, equal_nan=True, rtol=1e-6, atol=1e-6)
+    assert z[700] > 3
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from services.chat_sessions import _after, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(stamp, "6630f0c2a1b2c3d4e5f60718")) == (stamp, "6630f0c2a1b2c3d4e5f60718")
+
+
+def test_timestamp_only_cursor_is_still_accepted():
+    assert decode_cursor("2024-05-01T12:30:15") == (datetime(2024, 5, 1, 12, 30, 15), None)
+    assert _after("timestamp", (datetime(2024, 5, 1), None)) == {"timestamp": {"$lt": datetime(2024, 5, 1)}}
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor("yesterday_abc")
+    assert excinfo.value.status_code == 400
+
+
+def test_after_breaks_ties_on_id():
+    stamp = datetime(2024, 5, 1)
+    assert _after("last_activity", (stamp, "b")) == {
+        "$or": [{"last_activity": {"$lt": stamp}}, {"last_activity": stamp, "_id": {"$lt": "b"}}]
+    }
@@ -0,0 +1,73 @@
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from services.model_scheduler import OverloadedError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _breaker(name):
+    return CircuitBreaker(name, window_seconds=30, min_calls=4, error_rate=0.5, open_seconds=10, half_open_calls=1)
+
+
+def test_opens_once_the_window_error_rate_is_reached(clock):
+    breaker = _breaker("test_breaker_open")
+    for ok in (True, False, True):
+        breaker.before_call()
+        breaker.record(ok)
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert issubclass(CircuitOpenError, OverloadedError)
+
+
+def test_old_results_leave_the_window(clock):
+    breaker = _breaker("test_breaker_window")
+    for _ in range(3):
+        breaker.record(False)
+    clock[0] += 31
+    for _ in range(3):
+        breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 4
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = _breaker("test_breaker_half_open")
+    for _ in range(4):
+        breaker.record(False)
+    clock[0] += 10
+    breaker.check()  # check() never takes the probe
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_abandoned_probe_frees_its_slot(clock):
+    breaker = _breaker("test_breaker_abandoned")
+    for _ in range(4):
+        breaker.record(False)
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record(None)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import pytest
+
+from services import health_data_ingest
+from services.health_data_ingest import IngestError, iter_json_array, iter_ndjson
+
+
+async def _chunks(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def _collect(parser, body: bytes, size: int):
+    async def run():
+        return [result async for result in parser(_chunks(body, size))]
+    return asyncio.run(run())
+
+
+READINGS = [{"vital_signs": {"heart_rate": 60 + i}, "notes": "café ☕"} for i in range(25)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100000])
+def test_json_array_any_chunking(size):
+    body = (" [\n" + " ,\n".join(json.dumps(r, ensure_ascii=False) for r in READINGS) + "\n] ").encode()
+    assert _collect(iter_json_array, body, size) == [(r, None) for r in READINGS]
+
+
+@pytest.mark.parametrize("body", [b"", b"[", b'[{"a": 1}', b'[{"a": 1}] x', b'{"a": 1}'])
+def test_json_array_malformed(body):
+    with pytest.raises(IngestError):
+        _collect(iter_json_array, body, 3)
+
+
+def test_json_array_empty():
+    assert _collect(iter_json_array, b"  [ ]  ", 2) == []
+
+
+def test_json_array_element_too_long(monkeypatch):
+    monkeypatch.setattr(health_data_ingest, "HEALTH_DATA_MAX_ITEM_BYTES", 50)
+    with pytest.raises(IngestError):
+        _collect(iter_json_array, b'[{"notes": "' + b"x" * 200 + b'"}]', 16)
+
+
+@pytest.mark.parametrize("size", [1, 5, 100000])
+def test_ndjson_any_chunking(size):
+    body = "\n".join(json.dumps(r, ensure_ascii=False) for r in READINGS).encode() + b"\n\n{bad\n"
+    results = _collect(iter_ndjson, body, size)
+    assert results[:-1] == [(r, None) for r in READINGS]
+    item, error = results[-1]
+    assert item is None and error.startswith("Invalid JSON")
+
+
+def test_ndjson_last_line_without_newline():
+    assert _collect(iter_ndjson, b'{"a": 1}\n{"a": 2}', 4) == [({"a": 1}, None), ({"a": 2}, None)]
+
+
+def test_ndjson_line_too_long(monkeypatch):
+    monkeypatch.setattr(health_data_ingest, "HEALTH_DATA_MAX_ITEM_BYTES", 50)
+    with pytest.raises(IngestError):
+        _collect(iter_ndjson, b"x" * 200, 16)
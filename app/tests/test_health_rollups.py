@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.health_rollups import as_utc, period_start
+
+
+@pytest.mark.parametrize("moment, granularity, expected", [
+    (datetime(2024, 5, 8, 17, 45), "day", datetime(2024, 5, 8)),
+    (datetime(2024, 5, 8, 17, 45), "week", datetime(2024, 5, 6)),
+    (datetime(2024, 5, 6, 0, 0), "week", datetime(2024, 5, 6)),
+    (datetime(2024, 5, 5, 23, 59), "week", datetime(2024, 4, 29)),
+])
+def test_period_start_naive_utc(moment, granularity, expected):
+    assert period_start(moment, granularity) == expected
+
+
+def test_period_start_converts_aware_datetimes_to_utc():
+    # 01:30 on Monday in UTC+3 is still Sunday in UTC
+    moment = datetime(2024, 5, 6, 1, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert period_start(moment, "day") == datetime(2024, 5, 5)
+    assert period_start(moment, "week") == datetime(2024, 4, 29)
+    assert period_start(moment, "day").tzinfo is None
+
+
+def test_as_utc_leaves_naive_datetimes_alone():
+    moment = datetime(2024, 5, 6, 1, 30)
+    assert as_utc(moment) is moment
+    assert as_utc(datetime(2024, 5, 6, 1, 30, tzinfo=timezone.utc)) == moment
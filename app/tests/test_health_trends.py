@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from services import health_trends
+
+
+class _Collection:
+    """Just enough of a motor collection to answer find_one over date_recorded"""
+
+    def __init__(self, readings):
+        self.readings = readings
+
+    async def find_one(self, query, projection=None):
+        bounds = query["date_recorded"]
+        for recorded in self.readings:
+            if bounds["$gte"] <= recorded < bounds["$lt"]:
+                return {"_id": ObjectId()}
+        return None
+
+
+@pytest.fixture
+def trends(monkeypatch):
+    """Records which path compute_trends took and the window it used"""
+    calls = {"rollups": [], "raw": []}
+    state = {"rollups": [], "readings": []}
+
+    async def read_rollups(user_id, granularity, start, end):
+        calls["rollups"].append((start, end))
+        return state["rollups"]
+
+    async def from_readings(user_id, period, bucket=None, window=None):
+        calls["raw"].append(window)
+        return {"source": "raw"}
+
+    monkeypatch.setattr(health_trends, "read_rollups", read_rollups)
+    monkeypatch.setattr(health_trends, "compute_trends_from_readings", from_readings)
+    monkeypatch.setattr(health_trends, "get_health_data_collection", lambda: _Collection(state["readings"]))
+    return calls, state
+
+
+def _rollup(start):
+    return {"period_start": start, "count": 1, "stats": {}, "moods": {}}
+
+
+def test_trend_window_starts_on_a_bucket_boundary():
+    window = health_trends.trend_window("quarter", "week")
+    assert window["start"].weekday() == 0
+    assert window["start"].time() == datetime.min.time()
+    assert window["end"] - window["start"] >= timedelta(days=90)
+
+
+def test_no_rollups_falls_back_to_raw_readings_over_the_same_window(trends):
+    calls, _ = trends
+    assert asyncio.run(health_trends.compute_trends(str(ObjectId()), "month", "day")) == {"source": "raw"}
+    assert calls["raw"][0]["start"] == calls["rollups"][0][0]
+
+
+def test_readings_before_the_first_rollup_fall_back_to_raw_readings(trends):
+    calls, state = trends
+    start = health_trends.trend_window("month", "day")["start"]
+    state["rollups"] = [_rollup(start + timedelta(days=10))]
+    state["readings"] = [start + timedelta(days=2, hours=3)]
+    assert asyncio.run(health_trends.compute_trends(str(ObjectId()), "month", "day")) == {"source": "raw"}
+
+
+def test_rollups_covering_the_window_are_used(trends):
+    calls, state = trends
+    start = health_trends.trend_window("month", "day")["start"]
+    state["rollups"] = [_rollup(start + timedelta(days=10))]
+    # The only reading falls inside the first rollup, so the rollups cover the window
+    state["readings"] = [start + timedelta(days=10, hours=3)]
+    asyncio.run(health_trends.compute_trends(str(ObjectId()), "month", "day"))
+    assert calls["raw"] == []
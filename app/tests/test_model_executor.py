@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.metrics import metrics
+from services.model_executor import ModelExecutor
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _SlowBlockingModel:
+    """Blocking client whose stream stalls after the first chunk"""
+
+    def __init__(self):
+        self.chunks_produced = 0
+        self.done = threading.Event()
+
+    def generate_content(self, prompt, stream=False):
+        try:
+            for i in range(50):
+                self.chunks_produced += 1
+                yield _Chunk(f"part {i}")
+                time.sleep(0.05)
+        finally:
+            self.done.set()
+
+
+def test_hedge_delay_is_per_tier():
+    fast = ModelExecutor("test_hedge_fast", hedge_methods=["method_a"])
+    large = ModelExecutor("test_hedge_large", hedge_methods=["method_a"])
+
+    async def calls():
+        for _ in range(30):
+            await fast._run("method_a", lambda: asyncio.sleep(0))
+
+    asyncio.run(calls())
+    assert fast.hedge_delay("method_a") is not None
+    assert large.hedge_delay("method_a") is None
+
+
+def test_stream_idle_timeout_stops_the_worker_thread():
+    model = _SlowBlockingModel()
+    executor = ModelExecutor("test_stream_timeout", timeout=0.01, use_async_api=False)
+
+    async def consume():
+        return [text async for text in executor.stream("test_stream_method", model, "prompt")]
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(consume())
+    try:
+        assert model.done.wait(timeout=2)
+        assert model.chunks_produced < 50
+        assert executor.scheduler.in_flight == 0
+        assert metrics.counters.get("ai.test_stream_method.timeouts") == 1
+    finally:
+        executor.shutdown()
+
+
+def test_adaptive_limit_never_exceeds_the_configured_capacity():
+    executor = ModelExecutor("test_capacity_ceiling", capacity=4)
+    assert executor.limiter is not None
+    for _ in range(200):
+        executor.limiter.on_sample(0.01, True, in_flight=executor.scheduler.capacity)
+    assert executor.scheduler.capacity == 4
+
+
+def test_timed_out_blocking_call_keeps_its_slot_until_the_thread_finishes():
+    finished = threading.Event()
+
+    class _SlowModel:
+        def generate_content(self, prompt):
+            time.sleep(0.2)
+            finished.set()
+            return _Chunk("late")
+
+    executor = ModelExecutor("test_blocking_timeout", capacity=1, timeout=0.01, use_async_api=False)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.generate("test_blocking_method", _SlowModel(), "prompt")
+        assert executor.scheduler.in_flight == 1
+        for _ in range(100):
+            if executor.scheduler.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert finished.is_set()
+        assert executor.scheduler.in_flight == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
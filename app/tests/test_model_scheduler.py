@@ -0,0 +1,110 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from services.model_scheduler import ModelScheduler, OverloadedError, QueueFullError
+
+
+@pytest.fixture
+def no_shedding(monkeypatch):
+    monkeypatch.setattr("services.model_scheduler.AI_SHED_QUEUE_RATIO", 1000)
+
+
+def test_slots_are_shared_in_proportion_to_weight(no_shedding):
+    async def scenario():
+        scheduler = ModelScheduler(capacity=1, weights={"high": 3, "low": 1}, name="test_fairness")
+        order = []
+
+        async def call(priority):
+            await scheduler.acquire(priority)
+            order.append(priority)
+            await asyncio.sleep(0)
+            scheduler.release()
+
+        # Hold the only slot so both classes queue up behind it
+        await scheduler.acquire("low")
+        tasks = [asyncio.create_task(call(p)) for p in ["high"] * 30 + ["low"] * 30]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # While both classes are waiting, every window of 4 grants holds 3 high and 1 low
+    counts = Counter(order[:40])
+    assert counts["high"] == 30 and counts["low"] == 10
+
+
+def test_idle_class_does_not_bank_credit(no_shedding):
+    async def scenario():
+        scheduler = ModelScheduler(capacity=1, weights={"a": 1, "b": 1}, name="test_banking")
+        order = []
+
+        async def call(priority):
+            await scheduler.acquire(priority)
+            order.append(priority)
+            await asyncio.sleep(0)
+            scheduler.release()
+
+        # "a" runs alone for a while, advancing its pass; "b" stays idle
+        for _ in range(10):
+            await call("a")
+        await scheduler.acquire("a")
+        tasks = [asyncio.create_task(call(p)) for p in ["a"] * 5 + ["b"] * 5]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order[10:]
+
+    order = asyncio.run(scenario())
+    # "b" joining late alternates with "a" instead of taking all its slots first
+    assert order[:4].count("b") <= 2
+
+
+def test_queue_limits_and_shedding(monkeypatch):
+    monkeypatch.setenv("AI_QUEUE_MAX_CHAT", "1")
+    monkeypatch.setattr("services.model_scheduler.AI_SHED_QUEUE_RATIO", 2)
+
+    async def scenario():
+        scheduler = ModelScheduler(capacity=1, name="test_shedding")
+        await scheduler.acquire("chat")
+        waiter = asyncio.create_task(scheduler.acquire("chat"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire("chat")
+
+        second = asyncio.create_task(scheduler.acquire("symptoms"))
+        await asyncio.sleep(0)
+        # Backlog is now 2 = capacity * ratio: everything but emergencies is shed
+        with pytest.raises(OverloadedError):
+            await scheduler.acquire("symptoms")
+        emergency = asyncio.create_task(scheduler.acquire("emergency"))
+        await asyncio.sleep(0)
+
+        # The emergency queued last is still served first
+        scheduler.release()
+        await asyncio.sleep(0)
+        assert emergency.done() and not waiter.done() and not second.done()
+        for task in (waiter, second):
+            task.cancel()
+        await asyncio.gather(waiter, second, return_exceptions=True)
+        assert scheduler.queue_depth() == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    async def scenario():
+        scheduler = ModelScheduler(capacity=1, name="test_cancel")
+        await scheduler.acquire("chat")
+        cancelled = asyncio.create_task(scheduler.acquire("chat"))
+        served = asyncio.create_task(scheduler.acquire("chat"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        scheduler.release()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await asyncio.wait_for(served, timeout=1)
+        assert scheduler.in_flight == 1
+
+    asyncio.run(scenario())
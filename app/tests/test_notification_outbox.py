@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from services.notification_outbox import DEAD, PENDING, FileOutboxStore, OutboxLockedError
+
+
+def test_file_store_compacts_to_undelivered_records(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+
+    async def scenario():
+        store = FileOutboxStore(path)
+        delivered, pending = await store.add([{"event": "a"}, {"event": "b"}])
+        await store.mark_delivered([delivered])
+        await store.mark_failed([pending], "HTTP 500")
+        store.close()
+
+        reopened = FileOutboxStore(path)
+        assert await reopened.counts() == {PENDING: 1}
+        reopened.close()
+        return pending["_id"]
+
+    pending_id = asyncio.run(scenario())
+    with open(path) as f:
+        ops = [json.loads(line) for line in f]
+    assert [op["record"]["_id"] for op in ops] == [pending_id]
+    assert ops[0]["record"]["attempts"] == 1
+    assert not (tmp_path / "outbox.jsonl.tmp").exists()
+
+
+def test_file_store_replays_dead_records(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.notification_outbox.N8N_MAX_ATTEMPTS", 1)
+
+    async def scenario():
+        store = FileOutboxStore(str(tmp_path / "outbox.jsonl"))
+        records = await store.add([{"event": "a"}])
+        await store.mark_failed(records, "timeout")
+        assert await store.counts() == {DEAD: 1}
+        assert await store.replay() == 1
+        assert len(await store.claim_due(10)) == 1
+        assert await store.claim_due(10) == []
+
+    asyncio.run(scenario())
+
+
+def test_file_store_is_locked_to_one_owner(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+
+    async def scenario():
+        owner = FileOutboxStore(path)
+        await owner.add([{"event": "a"}])
+        intruder = FileOutboxStore(path)
+        with pytest.raises(OutboxLockedError):
+            await intruder.replay()
+        owner.close()
+        assert await intruder.counts() == {PENDING: 1}
+        intruder.close()
+
+    asyncio.run(scenario())
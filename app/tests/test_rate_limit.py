@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services import rate_limit
+from services.rate_limit import InMemoryBucketBackend, RateLimit, RateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_refills_evenly(clock):
+    backend = InMemoryBucketBackend()
+    limit = RateLimit(3, 60)
+
+    async def scenario():
+        assert [await backend.take("key", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert await backend.take("key", limit) == pytest.approx(20.0)
+        clock.now += 20
+        assert await backend.take("key", limit) == 0.0
+        assert await backend.take("key", limit) == pytest.approx(20.0)
+
+    asyncio.run(scenario())
+
+
+def test_bucket_never_banks_more_than_capacity(clock):
+    backend = InMemoryBucketBackend()
+    limit = RateLimit(2, 10)
+
+    async def scenario():
+        await backend.take("key", limit)
+        clock.now += 3600
+        assert [await backend.take("key", limit) for _ in range(2)] == [0.0, 0.0]
+        assert await backend.take("key", limit) > 0
+
+    asyncio.run(scenario())
+
+
+def test_limit_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST", "7/30")
+    limit = RateLimit.from_env("RATE_LIMIT_TEST", (1, 1))
+    assert (limit.capacity, limit.per_seconds) == (7, 30)
+    assert RateLimit.from_env("RATE_LIMIT_UNSET", (5, 60)).rate == pytest.approx(5 / 60)
+
+
+def test_limiter_rejects_per_user_before_touching_the_global_bucket(clock):
+    limiter = RateLimiter(InMemoryBucketBackend())
+    limiter.limits["analyze_symptoms"] = (RateLimit(1, 60), RateLimit(10, 60))
+
+    async def scenario():
+        await limiter.check("analyze_symptoms", "alice")
+        with pytest.raises(HTTPException) as excinfo:
+            await limiter.check("analyze_symptoms", "alice")
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.headers["Retry-After"] == "60"
+        # Another user still has their own bucket, and the rejection above took nothing globally
+        await limiter.check("analyze_symptoms", "bob")
+        assert await limiter.backend.take("global:analyze_symptoms", RateLimit(10, 60)) == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_global_rejection_refunds_the_user_token(clock):
+    limiter = RateLimiter(InMemoryBucketBackend())
+    limiter.limits["chat_with_ai"] = (RateLimit(2, 60), RateLimit(1, 60))
+
+    async def scenario():
+        await limiter.check("chat_with_ai", "bob")
+        for _ in range(3):
+            with pytest.raises(HTTPException):
+                await limiter.check("chat_with_ai", "alice")
+        # Alice was never admitted, so her own bucket is still full
+        assert await limiter.backend.take("user:chat_with_ai:alice", RateLimit(2, 60)) == 0.0
+        assert await limiter.backend.take("user:chat_with_ai:alice", RateLimit(2, 60)) == 0.0
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def scenario():
+        flight = SingleFlight("test_share")
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+        assert flight.in_flight() == 0
+        return results
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight("test_leader_cancel")
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "result"
+
+        leader = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await follower == "result"
+        assert leader.cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_call_is_cancelled_when_every_caller_gives_up():
+    async def scenario():
+        flight = SingleFlight("test_all_cancel")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("key", call)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = SingleFlight("test_errors")
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("key", call) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.do("key", call)
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import pytest
+from services.triage import find_red_flags, triage, triage_response
+
+
+@pytest.mark.parametrize("symptoms, emergency_type", [
+    ("Crushing chest pain and my left arm pain started an hour ago", "heart attack"),
+    ("chest tightness, I'm short of breath and in a cold sweat", "heart attack"),
+    ("My dad's face is drooping and he has slurred speech", "stroke"),
+    ("sudden numbness in my leg", "stroke"),
+    ("my throat is closing after eating peanuts", "severe allergic reaction"),
+    ("I can't breathe", "difficulty breathing"),
+    ("her lips turning blue", "difficulty breathing"),
+    ("My mother is unresponsive", "unconsciousness"),
+    ("he passed out just now", "unconsciousness"),
+    ("my son is having a seizure", "seizure"),
+    ("cut my hand and it won't stop bleeding", "severe bleeding"),
+    ("my toddler swallowed bleach", "poisoning or overdose"),
+    ("I took too many pills", "poisoning or overdose"),
+    ("I want to kill myself", "suicidal thoughts"),
+    ("I want to hurt myself", "suicidal thoughts"),
+    ("stiff neck and a high temperature", "meningitis"),
+    ("worst headache of my life", "sudden severe headache"),
+    ("chest pain since last year and now I'm short of breath", "heart attack"),
+])
+def test_red_flag_presentations(symptoms, emergency_type):
+    result = triage(symptoms)
+    assert result is not None
+    assert emergency_type in result["emergency_types"]
+
+
+@pytest.mark.parametrize("symptoms", [
+    "food poisoning since last night",
+    "I hurt myself playing football",
+    "I get sleep paralysis sometimes",
+    "a choking feeling from acid reflux",
+    "I fainted yesterday",
+    "my jaw pain is from grinding my teeth",
+    "arm pain after the gym",
+    "I feel clammy after a run",
+    "I'm slurring a bit after two beers",
+    "this dress is fitting badly and I have a headache",
+    "no chest pain, just a cough",
+    "history of seizures, none this year",
+    "stroke was ruled out last week, still a bit dizzy",
+    "had chest pain that went away, now just tired",
+    "mild fever and a runny nose",
+    "out of breath after climbing stairs",
+    "I can't speak much, my throat is sore",
+])
+def test_harmless_complaints_are_not_red_flags(symptoms):
+    assert triage(symptoms) is None
+
+
+def test_negated_mentions_are_skipped():
+    assert find_red_flags("no chest pain but I am short of breath") == ["shortness_of_breath"]
+
+
+def test_duplicate_rules_report_an_emergency_once():
+    result = triage("he is unconscious, he passed out right now")
+    assert result["emergency_types"] == ["unconsciousness"]
+
+
+def test_triage_response_is_high_urgency_with_template_guidance():
+    response = triage_response(triage("I can't breathe"))
+    assert response["urgency_level"] == "high"
+    assert response["triage"]["emergency_types"] == ["difficulty breathing"]
+    assert response["emergency_guidance"]["emergency_contacts"]
@@ -2,6 +2,36 @@ import React, { useState, useRef, useEffect } from 'react';
 // import ChatBubble from '../components/ChatBubble';
 import UploadSection from '../upload/UploadSection.jsx';
 import ChatBubble from '../chatbubble/ChatBubble';
+
+const API_URL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
+
+const authHeaders = () => ({
+  'Content-Type': 'application/json',
+  Authorization: `Bearer ${localStorage.getItem('token') || ''}`,
+});
+
+// History lives server-side; we only keep the session id
+const createSession = async (firstMessage) => {
+  const response = await fetch(`${API_URL}/chat/sessions`, {
+    method: 'POST',
+    headers: authHeaders(),
+    body: JSON.stringify({ session_name: firstMessage.slice(0, 50) }),
+  });
+  if (!response.ok) throw new Error(`Could not start a chat session (${response.status})`);
+  const session = await response.json();
+  return session.id;
+};
+
+const parseSseEvent = (rawEvent) => {
+  let event = 'message';
+  let data = '';
+  for (const line of rawEvent.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data += line.slice(5).trim();
+  }
+  return { event, data: data ? JSON.parse(data) : null };
+};
+
 const Chat = () => {
   const [messages, setMessages] = useState([
 
@@ -9,6 +39,8 @@ const Chat = () => {
   ]);
   const [selectedFile, setSelectedFile] = useState(null);
   const [input, setInput] = useState('');
+  const [isStreaming, setIsStreaming] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const chatEndRef = useRef(null);
 
   const scrollToBottom = () => {
@@ -19,16 +51,65 @@ const Chat = () => {
     scrollToBottom();
   }, [messages]);
 
-  const handleSend = () => {
-    if (!input.trim()) return;
-    
-    const newMessages = [
-      ...messages,
-      { role: 'user', content: input },
-      { role: 'assistant', content: 'Thanks! Based on that, I need to ask a few more questions.' } // Placeholder
-    ];
-    setMessages(newMessages);
+  const handleSend = async () => {
+    if (!input.trim() || isStreaming) return;
+
+    const message = input;
+    setMessages((prev) => [
+      ...prev,
+      { role: 'user', content: message },
+      { role: 'assistant', content: '' },
+    ]);
     setInput('');
+    setIsStreaming(true);
+
+    // Append streamed text to the last (assistant) bubble
+    const appendToReply = (text) => {
+      setMessages((prev) => {
+        const updated = [...prev];
+        const last = updated[updated.length - 1];
+        updated[updated.length - 1] = { ...last, content: last.content + text };
+        return updated;
+      });
+    };
+
+    try {
+      let activeSessionId = sessionId;
+      if (!activeSessionId) {
+        activeSessionId = await createSession(message);
+        setSessionId(activeSessionId);
+      }
+
+      const response = await fetch(`${API_URL}/chat/ask/stream`, {
+        method: 'POST',
+        headers: { ...authHeaders(), Accept: 'text/event-stream' },
+        body: JSON.stringify({ message, session_id: activeSessionId }),
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const { event, data } = parseSseEvent(rawEvent);
+          if (event === 'chunk' && data) appendToReply(data.text);
+        }
+      }
+    } catch (err) {
+      appendToReply("Sorry, I couldn't reach HeaLLMe right now. Please try again.");
+    } finally {
+      setIsStreaming(false);
+    }
   };
 
   return (
@@ -59,6 +140,7 @@ const Chat = () => {
           />
         <button
           onClick={handleSend}
+          disabled={isStreaming}
           className="bg-blue-600 text-white px-6 py-2 rounded-lg hover:bg-blue-700"
         >
           Send